@@ -0,0 +1,40 @@
+"""Shared bootstrap for the benchmark scripts in this folder.
+
+Each benchmark runs against a throw-away SQLite file (or whatever ``DATABASE_URL``
+points at, e.g. a scratch PostgreSQL database) so it never touches ``db.sqlite3``.
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup(migrate=True):
+    """Configure Django for a benchmark run and return the temp dir in use (if any)."""
+    sys.path.insert(0, str(PROJECT_DIR))
+    tmpdir = None
+    if "DATABASE_URL" not in os.environ:
+        tmpdir = tempfile.mkdtemp(prefix="natursur-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.sqlite3"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tienda_virtual.settings")
+
+    import django
+    django.setup()
+    if migrate:
+        from django.core.management import call_command
+        call_command("migrate", verbosity=0)
+    return tmpdir
+
+
+def timeit(fn, repeat=20):
+    """Run ``fn`` ``repeat`` times and return (best, median) wall time in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return samples[0], samples[len(samples) // 2]
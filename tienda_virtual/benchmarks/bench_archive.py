@@ -0,0 +1,75 @@
+"""Hot-path reservation queries with years of history, before and after archiving.
+
+    python benchmarks/bench_archive.py
+    python benchmarks/bench_archive.py --years 10 --per-day 20
+
+Fills ``--years`` of past reservations plus the coming month, then times the
+booking-page queries of the coming month (``booked_by_day`` and
+``availability.free_slots``) and a full export, with the history in
+``Reservation`` and again after ``archive.archive(today)`` moved it to
+``ReservationArchive``. Also prints how long archiving took.
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import _django
+
+
+def fill(Reservation, start, end, per_day, rng):
+    batch = []
+    day = start
+    while day < end:
+        if day.weekday() < 5:
+            for _ in range(per_day):
+                batch.append(Reservation(nombre="Cliente", fecha=day, hora=f"{rng.randint(9, 16):02d}:{rng.choice((0, 30)):02d}"))
+        day += timedelta(days=1)
+    Reservation.objects.bulk_create(batch, batch_size=5000)
+    return len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--per-day", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    _django.setup()
+    from home.models import Reservation
+    from home.utils import archive, availability, exports
+    from home.utils.reservations import booked_by_day
+
+    today = date.today()
+    rng = random.Random(0)
+    history = fill(Reservation, today.replace(year=today.year - args.years), today, args.per_day, rng)
+    upcoming = fill(Reservation, today, today + timedelta(days=31), args.per_day, rng)
+    availability.rebuild()
+    print(f"{history} reservas pasadas, {upcoming} en el próximo mes")
+
+    window = (today, today + timedelta(days=30))
+    current = datetime.combine(today, datetime.min.time())
+    queries = {
+        "booked_by_day (mes)": lambda: booked_by_day(*window),
+        "free_slots (mes)": lambda: availability.free_slots(*window, "Masaje relajante", current),
+        "export completo": lambda: sum(1 for _ in exports.reservation_rows()),
+    }
+
+    def measure():
+        return {label: _django.timeit(fn, args.repeat if "export" not in label else 3) for label, fn in queries.items()}
+
+    before = measure()
+    t0 = time.perf_counter()
+    moved = sum(archive.archive(today, batch_size=5000))
+    print(f"archivadas {moved} en {(time.perf_counter() - t0):.1f} s")
+    after = measure()
+
+    print(f"{'consulta':<22} {'sin archivar best/med (ms)':>28} {'archivado best/med (ms)':>26}")
+    for label in queries:
+        (bb, bm), (ab, am) = before[label], after[label]
+        print(f"{label:<22} {bb:>13.2f} / {bm:<12.2f} {ab:>11.2f} / {am:<12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Free-slot computation: precomputed day occupancy vs. grouping the raw reservations.
+
+    python benchmarks/bench_availability.py
+    python benchmarks/bench_availability.py --capacity 4 --step 30
+
+Fills a year of dense bookings (every open start time of every weekday gets
+between 0 and ``--capacity`` reservations of mixed durations) and times the
+availability of one month and of the whole year, both through
+``availability.free_slots`` (one indexed query on ``DayOccupancy``) and through
+the approach it replaces: load every reservation of the range and count the
+overlaps in Python. Also prints how long a full ``availability.rebuild()`` takes.
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import _django
+
+DURATIONS = (30, 60, 60, 90)
+
+
+def fill(Reservation, year, capacity, step, rng):
+    from home.utils import availability
+
+    batch = []
+    day = date(year, 1, 1)
+    while day.year == year:
+        for opens, closes in availability.opening_intervals(day):
+            for start in range(opens, closes - 60 + 1, step):
+                for _ in range(rng.randint(0, capacity)):
+                    batch.append(Reservation(
+                        nombre="Cliente", fecha=day, hora=availability.to_hhmm(start),
+                        duracion=rng.choice(DURATIONS),
+                    ))
+        day += timedelta(days=1)
+    Reservation.objects.bulk_create(batch, batch_size=2000)
+    return len(batch)
+
+
+def from_reservations(Reservation, date_from, date_to, servicio, current):
+    """The old way: every reservation of the range, occupancy counted per request."""
+    from home.utils import availability
+
+    by_day = {}
+    for fecha, hora, duracion in Reservation.objects.filter(fecha__range=(date_from, date_to)).values_list(
+        "fecha", "hora", "duracion"
+    ):
+        by_day.setdefault(fecha, []).append((hora, duracion))
+    duration, cap = availability.service_duration(servicio), availability.capacity()
+    result = {}
+    day = date_from
+    while day <= date_to:
+        counts = availability.occupancy_counts(by_day.get(day, ()))
+        result[day.isoformat()] = availability.day_slots(day, counts, duration, cap, current)
+        day += timedelta(days=1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--year", type=int, default=2030)
+    parser.add_argument("--capacity", type=int, default=3, help="Terapeutas (RESERVATION_CAPACITY).")
+    parser.add_argument("--step", type=int, default=30, help="Minutos entre horas de inicio.")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    _django.setup()
+    from django.conf import settings
+    from home.models import Reservation
+    from home.utils import availability
+
+    settings.RESERVATION_CAPACITY = args.capacity
+    settings.RESERVATION_SLOT_STEP = args.step
+    rows = fill(Reservation, args.year, args.capacity, args.step, random.Random(args.year))
+    t0 = time.perf_counter()
+    days = availability.rebuild()
+    print(f"{rows} reservas en {days} días; rebuild() completo: {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    current = datetime(args.year, 1, 1)  # every day of the year is still bookable
+    ranges = {
+        "un mes": (date(args.year, 3, 1), date(args.year, 3, 31)),
+        "un año": (date(args.year, 1, 1), date(args.year, 12, 31)),
+    }
+    servicio = "Masaje relajante"
+    print(f"{'rango':<8} {'reservas best/med (ms)':>24} {'ocupación best/med (ms)':>26}")
+    for label, (date_from, date_to) in ranges.items():
+        old = lambda: from_reservations(Reservation, date_from, date_to, servicio, current)
+        new = lambda: availability.free_slots(date_from, date_to, servicio, current)
+        assert old() == new()
+        ob, om = _django.timeit(old, args.repeat)
+        nb, nm = _django.timeit(new, args.repeat)
+        print(f"{label:<8} {ob:>11.2f} / {om:<10.2f} {nb:>12.2f} / {nm:<10.2f}")
+
+
+if __name__ == "__main__":
+    main()
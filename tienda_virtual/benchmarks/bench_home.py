@@ -0,0 +1,113 @@
+"""Home page latency on a cold cache against a slow Instagram Graph API.
+
+    python benchmarks/bench_home.py
+    python benchmarks/bench_home.py --delays 0.1 0.5 3 --deadline 1
+
+Starts a local fake Graph API that answers every request after ``--delay``
+seconds and, for each delay, times with an empty cache:
+
+- the sequential path the home page used to follow: the carousel query, then
+  the feed, then the profile (``fetch_posts`` and ``fetch_profile`` one after
+  the other);
+- the async ``index`` view through the WSGI handler (Django runs it in its own
+  event loop) and through the ASGI application.
+
+The async view overlaps the three and never waits longer than ``HOME_DEADLINE``
+(``--deadline``): past it the page is rendered without the feed and the fetch
+finishes in the background.
+"""
+import argparse
+import asyncio
+import http.server
+import json
+import statistics
+import threading
+import time
+import urllib.parse
+
+import _django
+
+
+class SlowGraphHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        path = urllib.parse.urlsplit(self.path).path
+        if path == "/me/media":
+            payload = {"data": [
+                {"id": str(i), "media_type": "IMAGE", "media_url": f"https://cdn.test/{i}.jpg", "permalink": f"p{i}"}
+                for i in range(6)
+            ]}
+        else:
+            payload = {"id": "1", "username": "natursur"}
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def sequential():
+    from django.conf import settings
+    from home.models import Articulo
+    from home.utils import instagram
+
+    list(Articulo.objects.all())
+    instagram.fetch_posts(settings.INSTAGRAM_ACCESS_TOKEN, limit=6)
+    instagram.fetch_profile(settings.INSTAGRAM_ACCESS_TOKEN)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delays", type=float, nargs="+", default=[0.2, 0.5, 3.0], help="Segundos por llamada a la API.")
+    parser.add_argument("--deadline", type=float, default=1.5, help="HOME_DEADLINE.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    _django.setup()
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.test import AsyncClient, Client
+    from home.models import Articulo
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SlowGraphHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    settings.INSTAGRAM_GRAPH_URL = f"http://127.0.0.1:{server.server_port}"
+    settings.INSTAGRAM_ACCESS_TOKEN = "token"
+    settings.INSTAGRAM_MEDIA_MIRROR = False
+    settings.HOME_DEADLINE = args.deadline
+    settings.ALLOWED_HOSTS = ["*"]
+    Articulo.objects.bulk_create([Articulo(nombre=f"Producto {i}", descripcion="d") for i in range(50)])
+
+    wsgi, asgi = Client(), AsyncClient()
+    paths = {
+        "secuencial": sequential,
+        "async (WSGI)": lambda: wsgi.get("/"),
+        "async (ASGI)": lambda: asyncio.run(asgi.get("/")),
+    }
+    print(f"HOME_DEADLINE={args.deadline}s, {args.repeat} peticiones con la caché vacía (mediana en ms)")
+    print(f"{'retardo API':>12} " + " ".join(f"{label:>14}" for label in paths))
+    for delay in args.delays:
+        server.delay = delay
+        row = []
+        for run in paths.values():
+            samples = []
+            for _ in range(args.repeat):
+                # Que termine el refresco en segundo plano de la vuelta anterior antes de vaciar la caché
+                time.sleep(delay + 0.05)
+                cache.clear()
+                t0 = time.perf_counter()
+                run()
+                samples.append((time.perf_counter() - t0) * 1000)
+            row.append(statistics.median(samples))
+        print(f"{delay:>11.1f}s " + " ".join(f"{ms:>14.0f}" for ms in row))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Compare the Herbalife search-page parser with the previous BeautifulSoup one.
+
+    python benchmarks/bench_scraping.py
+    python benchmarks/bench_scraping.py --pages guardada1.html guardada2.html --name "Fórmula 1"
+
+By default it runs on synthetic pages shaped like a herbalife.com search result
+(head full of scripts, big inline JSON, mega-menu, product grid, footer) in three
+sizes, with the wanted product in the middle of the grid. Pass ``--pages`` to use
+pages saved from the real site (``curl -o page.html 'https://www.herbalife.com/search?q=...'``).
+
+For each page and implementation it prints pyperf-style mean ± stdev over
+``--runs`` timed runs (after ``--warmup`` runs) and the peak Python heap during
+one parse (tracemalloc). tracemalloc doesn't see libxml2's own buffers; with the
+target parser no tree is built, so those stay around one feed chunk (64 KiB).
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+import _django
+
+DEFAULT_NAME = "Fórmula 1 Batido Vainilla"
+
+
+def synthetic_page(products, seed=0, name=DEFAULT_NAME):
+    rng = random.Random(seed)
+    parts = ['<!doctype html><html lang="es"><head><meta charset="utf-8"><title>Resultados</title>']
+    parts += [f'<link rel="stylesheet" href="/static/css/{i}.css"><script src="/static/js/{i}.js"></script>' for i in range(30)]
+    parts.append('<script type="application/json">{"state":"' + "x" * 60000 + '"}</script></head><body>')
+    parts.append("<nav>" + "".join(f'<ul><li><a href="/es/menu/{i}">Menú {i}</a></li></ul>' for i in range(150)) + "</nav>")
+    parts.append('<main><div class="grid">')
+    target = products // 2
+    for i in range(products):
+        label = name if i == target else f"Producto {i} {rng.choice(['Té', 'Aloe', 'Barrita', 'Crema'])}"
+        parts.append(
+            f'<div class="card"><a href="/es/p/{i}"><img src="/img/{i}.jpg" alt=""></a>'
+            f'<div class="info"><a href="/es/p/{i}">{label}</a><span class="price">{i}.95 €</span>'
+            f'<p>{"Descripción del producto " * 20}</p></div></div>'
+        )
+    parts.append("</div></main><footer>" + "".join(f'<a href="/es/f/{i}">Enlace {i}</a>' for i in range(200)))
+    parts.append("</footer></body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def baseline(content, name):
+    """The implementation this replaces: full html.parser tree, lower() per node."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content.decode("utf-8"), "html.parser")
+    link = soup.find("a", href=True, string=lambda t: t and name.lower() in t.lower())
+    return link["href"] if link else None
+
+
+def current(content, name):
+    from home.utils.scraping import find_product_link
+    return find_product_link(content, name)
+
+
+IMPLEMENTATIONS = {"bs4 html.parser (antes)": baseline, "lxml target (ahora)": current}
+
+
+def bench(fn, content, name, warmup, runs):
+    for _ in range(warmup):
+        fn(content, name)
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn(content, name)
+        samples.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    fn(content, name)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.mean(samples), statistics.stdev(samples) if runs > 1 else 0.0, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", nargs="+", type=Path, help="Páginas guardadas (por defecto, sintéticas).")
+    parser.add_argument("--name", default=DEFAULT_NAME, help="Producto a buscar en las páginas.")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    args = parser.parse_args()
+
+    _django.setup(migrate=False)
+    if args.pages:
+        pages = [(p.name, p.read_bytes()) for p in args.pages]
+    else:
+        pages = [
+            (label, synthetic_page(products, name=args.name))
+            for label, products in (("pequeña", 12), ("media", 48), ("grande", 240))
+        ]
+
+    print(f"{'página':<16} {'KiB':>6}  {'implementación':<24} {'tiempo (ms)':>16} {'heap pico':>12}")
+    for label, content in pages:
+        for impl, fn in IMPLEMENTATIONS.items():
+            mean, stdev, peak = bench(fn, content, args.name, args.warmup, args.runs)
+            print(
+                f"{label:<16} {len(content) / 1024:>6.0f}  {impl:<24} {mean:>8.2f} ± {stdev:<5.2f} "
+                f"{peak / 1024:>8.0f} KiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compare the indexed full-text search with the old ``nombre__icontains`` scan.
+
+    python benchmarks/bench_search.py --sizes 1000 10000 100000
+
+Prints best/median latency per query for each catalog size. The icontains path
+scans the table until it fills a page, so selective terms ("ginseng") grow
+linearly with the catalog; the indexed path stays flat for them. Ranked results
+cost is proportional to the number of *matches* (every match is scored), which is
+why very common terms in this synthetic 16-word vocabulary still grow.
+"""
+import argparse
+import random
+
+import _django
+
+
+WORDS = [
+    "batido", "proteína", "té", "infusión", "vainilla", "fresa", "chocolate", "aloe",
+    "crema", "hidratante", "colágeno", "fibra", "energía", "barrita", "cacao", "menta",
+]
+# "ginseng" is rare (about 1 row in 5000): icontains has to scan the whole table to fill a page.
+RARE = "ginseng"
+QUERIES = ["aloe", "proteina", "te verde", "choco", RARE]
+
+
+def fill(Articulo, target):
+    rng = random.Random(target)
+    missing = target - Articulo.objects.count()
+    batch = []
+    for i in range(missing):
+        nombre = " ".join(rng.sample(WORDS, 2))[:30]
+        if rng.randrange(5000) == 0:
+            nombre = f"{RARE} {nombre}"[:30]
+        descripcion = " ".join(rng.sample(WORDS, 6))[:100]
+        batch.append(Articulo(nombre=nombre, descripcion=descripcion, price=rng.randint(1, 90)))
+        if len(batch) == 5000:
+            Articulo.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Articulo.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--per-page", type=int, default=12)
+    args = parser.parse_args()
+
+    _django.setup()
+    from home.models import Articulo
+    from home.utils.search import search_articulos
+
+    print(f"{'rows':>8}  {'query':<12} {'icontains best/med (ms)':>24} {'indexed best/med (ms)':>24}")
+    for size in sorted(args.sizes):
+        fill(Articulo, size)
+        for q in QUERIES:
+            old = lambda: list(Articulo.objects.filter(nombre__icontains=q).order_by("id")[:args.per_page])
+            new = lambda: list(
+                search_articulos(Articulo.objects.all(), q).order_by("-search_rank", "id")[:args.per_page]
+            )
+            ob, om = _django.timeit(old, args.repeat)
+            nb, nm = _django.timeit(new, args.repeat)
+            print(f"{size:>8}  {q:<12} {ob:>11.2f} / {om:<10.2f} {nb:>11.2f} / {nm:<10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Live slot updates: memory of idle SSE connections and fan-out latency.
+
+    python benchmarks/bench_sse.py
+    python benchmarks/bench_sse.py --connections 1000 --events 500
+
+Opens ``--connections`` streams to ``/reservas/events/`` by calling the ASGI
+application directly (no server or sockets, so only the per-connection cost of
+the app is measured) and reports:
+
+- the memory held per idle connection (``tracemalloc``, after they are all open);
+- how long one published event takes to reach every connection;
+- what happens with stalled clients (a ``send`` that never returns, like a full
+  socket buffer): while ``--events`` more events reach the healthy connections,
+  theirs stop at ``LIVE_QUEUE_SIZE`` pending events and they leave the hub, so
+  memory doesn't grow with the backlog.
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+import _django
+
+
+def scope(month):
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/reservas/events/", "query_string": f"month={month}".encode(),
+        "headers": [], "server": ("localhost", 80), "client": ("127.0.0.1", 50000),
+    }
+
+
+class Connection:
+    """One client: counts the SSE messages it gets; a stalled one never finishes a send."""
+
+    def __init__(self, app, month, stalled=False):
+        self.incoming = asyncio.Queue()
+        self.incoming.put_nowait({"type": "http.request", "body": b""})
+        self.events = 0
+        self.stalled = stalled
+        self.task = asyncio.create_task(app(scope(month), self.incoming.get, self.send))
+
+    async def send(self, message):
+        body = message.get("body", b"")
+        if body.startswith(b"event:"):
+            if self.stalled:
+                await asyncio.Event().wait()
+            self.events += 1
+
+    async def close(self):
+        await self.incoming.put({"type": "http.disconnect"})
+        await self.task
+
+
+async def wait_for(condition, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.001)
+
+
+async def run(args):
+    from django.core.handlers.asgi import ASGIHandler
+    from home.utils import live
+
+    app = ASGIHandler()
+    event = live.slot_event(live.SLOT_TAKEN, "2030-03-04", "10:00", 60)
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    connections = [Connection(app, "2030-03") for _ in range(args.connections)]
+    await wait_for(lambda: len(live.hub) == args.connections)
+    await asyncio.sleep(0.1)
+    idle = tracemalloc.get_traced_memory()[0] - base
+    print(f"{args.connections} conexiones inactivas: {idle / 1024:.0f} KiB, {idle / args.connections:.0f} B por conexión")
+    tracemalloc.stop()  # tracemalloc ralentiza mucho: la latencia se mide sin él
+
+    t0 = time.perf_counter()
+    live.publish(event)
+    await wait_for(lambda: all(c.events == 1 for c in connections))
+    print(f"un evento a {args.connections} conexiones: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    stalled = [Connection(app, "2030-03", stalled=True) for _ in range(args.stalled)]
+    await wait_for(lambda: len(live.hub) == args.connections + args.stalled)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for n in range(2, args.events + 2):
+        # Al ritmo de las reservas: cada evento llega a los clientes sanos antes del siguiente
+        live.publish(event)
+        await wait_for(lambda: all(c.events == n for c in connections))
+    await wait_for(lambda: len(live.hub) == args.connections)
+    grown = tracemalloc.get_traced_memory()[0] - before
+    print(
+        f"{args.events} eventos más con {args.stalled} clientes atascados: todos fuera del hub "
+        f"(cola de {args.queue} eventos), memoria {grown / 1024:+.0f} KiB"
+    )
+
+    await asyncio.gather(*(c.close() for c in connections))
+    for c in stalled:
+        c.task.cancel()
+    await asyncio.gather(*(c.task for c in stalled), return_exceptions=True)
+    tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--stalled", type=int, default=50, help="Clientes que dejan de leer.")
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--queue", type=int, default=64, help="LIVE_QUEUE_SIZE.")
+    args = parser.parse_args()
+
+    _django.setup(migrate=False)
+    from django.conf import settings
+
+    settings.LIVE_SLOTS_BACKEND = "home.utils.live.MemoryBackend"
+    settings.LIVE_QUEUE_SIZE = args.queue
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
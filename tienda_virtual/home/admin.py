@@ -1,12 +1,116 @@
-from django.contrib import admin
-from .models import Articulo, Escaparate, Reservation
+from django import forms
+from django.contrib import admin, messages
+from django.urls import reverse
+from django.utils.html import format_html
+from .models import Articulo, CalendarFeed, Escaparate, Job, Reservation, ReservationArchive, new_feed_token
+from . import tasks
+from .utils import images, jobs
+
+
+class ArticuloAdminForm(forms.ModelForm):
+	imagen = forms.ImageField(
+		required=False,
+		help_text="Opcional: sube la imagen original; se generan miniaturas WebP/JPEG.",
+	)
+
+	class Meta:
+		model = Articulo
+		fields = "__all__"
 
 
 @admin.register(Articulo)
 class ArticuloAdmin(admin.ModelAdmin):
-	list_display = ("nombre", "price")
+	form = ArticuloAdminForm
+	list_display = ("nombre", "price", "herbalife_status", "herbalife_checked_at")
+	list_filter = ("herbalife_status",)
 	search_fields = ("nombre",)
+	readonly_fields = (
+		"image_hash", "image_width",
+		"herbalife_status", "herbalife_checked_at", "herbalife_recheck_after", "herbalife_failures",
+	)
+	actions = ["refresh_herbalife"]
+
+	@admin.action(description="Volver a comprobar en Herbalife")
+	def refresh_herbalife(self, request, queryset):
+		# force=True: se comprueba aunque el último resultado siga vigente; supersede: aunque ya haya
+		# una comprobación sin forzar en cola o en marcha para ese producto.
+		for pk in queryset.values_list("id", flat=True):
+			jobs.enqueue(
+				tasks.lookup_herbalife, key=tasks.herbalife_lookup_key(pk), supersede=True, articulo_id=pk, force=True
+			)
+		self.message_user(request, f"{queryset.count()} productos en cola para comprobar en Herbalife.")
+
+	def save_model(self, request, obj, form, change):
+		# Las miniaturas se generan una vez: al subir una imagen o al cambiar image_url.
+		try:
+			upload = form.cleaned_data.get("imagen")
+			if upload:
+				obj.image_hash, obj.image_width = images.store_derivatives(upload.read())
+			elif obj.image_url and "image_url" in form.changed_data:
+				obj.image_hash, obj.image_width = images.ingest_url(obj.image_url)
+			elif not obj.image_url and "image_url" in form.changed_data:
+				obj.image_hash, obj.image_width = None, None
+		except images.ImageError as e:
+			self.message_user(request, f"No se pudieron generar las miniaturas: {e}", messages.WARNING)
+		if "herbalife_url" in form.changed_data:
+			# URL puesta a mano: deja de ser resultado de una búsqueda y no se sobrescribe sola.
+			obj.herbalife_status = ""
+			obj.herbalife_recheck_after = None
+			obj.herbalife_failures = 0
+		super().save_model(request, obj, form, change)
+
+
+@admin.register(Escaparate)
+class EscaparateAdmin(admin.ModelAdmin):
+	list_display = ("articulo", "posicion", "activo_desde", "activo_hasta")
+	list_editable = ("posicion", "activo_desde", "activo_hasta")
+	list_select_related = ("articulo",)
+	# El catálogo puede ser grande: buscador por id en vez de un desplegable con todos los artículos
+	raw_id_fields = ("articulo",)
+admin.site.register(Reservation)
+
+
+@admin.register(ReservationArchive)
+class ReservationArchiveAdmin(admin.ModelAdmin):
+	# Solo consulta: se rellena con manage.py archive_reservations
+	list_display = ("nombre", "fecha", "hora", "servicio", "archived_at")
+	date_hierarchy = "fecha"
+	search_fields = ("nombre",)
+
+	def has_add_permission(self, request):
+		return False
+
+	def has_change_permission(self, request, obj=None):
+		return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+	list_display = ("task", "status", "attempts", "run_after", "created_at")
+	list_filter = ("status", "queue", "task")
+	search_fields = ("key",)
+	readonly_fields = ("lock_token", "locked_until", "result", "last_error", "created_at", "finished_at")
+
+
+@admin.register(CalendarFeed)
+class CalendarFeedAdmin(admin.ModelAdmin):
+	list_display = ("user", "feed_url", "created_at")
+	readonly_fields = ("token", "feed_url", "created_at")
+	actions = ["regenerate_token"]
+
+	list_select_related = ("user",)
 
+	@admin.display(description="URL de suscripción")
+	def feed_url(self, obj):
+		# El enlace abierto en el navegador da la URL completa para Google Calendar, Outlook...
+		if not obj.pk:
+			return "-"
+		url = reverse("reservations_feed", args=[obj.token])
+		return format_html('<a href="{}">{}</a>', url, url)
 
-admin.site.register(Escaparate)
-admin.site.register(Reservation)
\ No newline at end of file
+	@admin.action(description="Regenerar token (la URL anterior deja de funcionar)")
+	def regenerate_token(self, request, queryset):
+		for feed in queryset:
+			feed.token = new_feed_token()
+			feed.save(update_fields=["token"])
+		self.message_user(request, f"{queryset.count()} calendarios con URL nueva.")
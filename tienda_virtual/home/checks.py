@@ -0,0 +1,19 @@
+from django.core.checks import Tags, Warning, register
+
+from .utils import versioning
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Warn when the version counters would live in a per-process cache."""
+    if versioning.is_shared():
+        return []
+    return [
+        Warning(
+            "La caché de los contadores de versión es local a cada proceso: los cambios hechos por "
+            "el worker o los comandos no invalidan las páginas ni los ETag de los procesos web.",
+            hint="Define CACHE_BACKEND con una caché compartida (BD, Redis) o quita CACHE_BACKEND "
+            "para usar la tabla de caché de la BD (python manage.py createcachetable).",
+            id="home.W001",
+        )
+    ]
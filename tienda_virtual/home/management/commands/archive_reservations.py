@@ -0,0 +1,55 @@
+"""Move past reservations to ``ReservationArchive`` (see home/utils/archive.py).
+
+    python manage.py archive_reservations --before 2025-01-01
+    python manage.py archive_reservations --before 2025-01-01 --batch-size 500 --pause 0.1
+    python manage.py archive_reservations --before 2025-01-01 --dry-run
+
+Rows move in batches of ``--batch-size``, each its own short transaction, so
+bookings are never held up for long; ``--pause`` sleeps between batches to
+spread the load further. Only past days can be archived.
+"""
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from home.models import Reservation
+from home.utils import archive
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Fecha inválida {value!r}, usa AAAA-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Mueve las reservas anteriores a una fecha a la tabla de archivo, por lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", required=True, type=_date, help="Archiva las reservas anteriores a este día.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--pause", type=float, default=0, help="Segundos de espera entre lotes.")
+        parser.add_argument("--dry-run", action="store_true", help="Solo cuenta lo que se archivaría.")
+
+    def handle(self, *args, **options):
+        before = options["before"]
+        if before > timezone.localdate():
+            raise CommandError("--before no puede ser posterior a hoy: solo se archivan días pasados")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size debe ser al menos 1")
+
+        if options["dry_run"]:
+            count = Reservation.objects.filter(fecha__lt=before).count()
+            self.stdout.write(f"Se archivarían {count} reservas anteriores al {before}")
+            return
+
+        moved = 0
+        for batch in archive.archive(before, options["batch_size"]):
+            moved += batch
+            self.stdout.write(f"{moved} reservas archivadas")
+            if options["pause"]:
+                time.sleep(options["pause"])
+        self.stdout.write(self.style.SUCCESS(f"Archivadas {moved} reservas anteriores al {before}"))
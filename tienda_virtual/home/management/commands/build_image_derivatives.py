@@ -0,0 +1,74 @@
+"""Backfill responsive image derivatives for existing products.
+
+    python manage.py build_image_derivatives --workers 4
+    python manage.py build_image_derivatives --force   # también los que ya tienen
+
+Downloads and resizing run in a process pool (Pillow work is CPU-bound); only the
+parent process touches the database, writing results back with ``bulk_update``.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from home.models import Articulo
+from home.utils import catalog_cache, images
+
+
+def _build(pk, url, root):
+    """Runs in a worker process: no ORM access, just bytes in and files out."""
+    try:
+        digest, width = images.ingest_url(url, root=root)
+        return pk, digest, width, None
+    except images.ImageError as e:
+        return pk, None, None, str(e)
+
+
+class Command(BaseCommand):
+    help = "Genera miniaturas WebP/JPEG de Articulo.image_url para los productos existentes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=200, help="Filas por bulk_update.")
+        parser.add_argument("--force", action="store_true", help="Regenera también los que ya tienen miniaturas.")
+
+    def handle(self, *args, **options):
+        qs = Articulo.objects.exclude(image_url__isnull=True).exclude(image_url="")
+        if not options["force"]:
+            qs = qs.filter(image_hash__isnull=True)
+        pending = list(qs.values_list("id", "image_url"))
+        if not pending:
+            self.stdout.write("No hay imágenes pendientes.")
+            return
+
+        root = str(images.store_root())
+        start = time.monotonic()
+        done, failed, batch = 0, 0, []
+
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = [pool.submit(_build, pk, url, root) for pk, url in pending]
+            for future in as_completed(futures):
+                pk, digest, width, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f"Articulo {pk}: {error}")
+                    continue
+                batch.append(Articulo(id=pk, image_hash=digest, image_width=width))
+                if len(batch) >= options["batch_size"]:
+                    done += self._flush(batch)
+                    batch = []
+        done += self._flush(batch)
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{done} imágenes procesadas, {failed} fallidas en {elapsed:.1f}s "
+            f"({done / elapsed if elapsed else 0:.1f} img/s)."
+        ))
+
+    def _flush(self, batch):
+        if not batch:
+            return 0
+        Articulo.objects.bulk_update(batch, ["image_hash", "image_width"])
+        # bulk_update no envía post_save: invalidamos las páginas cacheadas a mano.
+        catalog_cache.bump_version()
+        return len(batch)
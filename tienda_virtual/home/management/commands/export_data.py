@@ -0,0 +1,64 @@
+"""Streaming export of the catalog or the reservations to a file or stdout.
+
+    python manage.py export_data articulos --format jsonl --search aloe -o catalogo.jsonl
+    python manage.py export_data reservations --format ics --from 2025-01-01 -o reservas.ics.gz --gzip
+
+Uses the same generators as the ``/exports/`` views, so memory stays bounded
+whatever the size of the tables.
+"""
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from home.utils import exports
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Fecha inválida {value!r}, usa AAAA-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Exporta Articulo o Reservation en CSV, JSONL o ICS (solo reservas) sin cargarlo todo en memoria."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(exports.FORMATS))
+        parser.add_argument("--format", default="csv", choices=["csv", "jsonl", "ics"])
+        parser.add_argument("-o", "--output", help="Fichero de salida; por defecto stdout.")
+        parser.add_argument("--gzip", action="store_true", help="Comprime la salida con gzip.")
+        parser.add_argument("--search", default="", help="Filtro de texto (solo articulos).")
+        parser.add_argument("--from", dest="date_from", type=_date, help="Fecha mínima (solo reservations).")
+        parser.add_argument("--to", dest="date_to", type=_date, help="Fecha máxima (solo reservations).")
+
+    def handle(self, *args, **options):
+        kind, fmt = options["kind"], options["format"]
+        if fmt not in exports.FORMATS[kind]:
+            raise CommandError(f"El formato {fmt} no está disponible para {kind}")
+
+        lines = exports.export_lines(
+            kind, fmt,
+            search=options["search"].strip(),
+            date_from=options["date_from"],
+            date_to=options["date_to"],
+        )
+        chunks = exports.encoded_chunks(lines)
+        if options["gzip"]:
+            chunks = exports.gzip_chunks(chunks)
+
+        if options["output"]:
+            with open(options["output"], "wb") as out:
+                written = self._write(out, chunks)
+            self.stderr.write(f"{written} bytes escritos en {options['output']}")
+        else:
+            self._write(sys.stdout.buffer, chunks)
+
+    def _write(self, out, chunks):
+        written = 0
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+        out.flush()
+        return written
@@ -0,0 +1,245 @@
+"""Bulk import of supplier catalogs into ``Articulo``.
+
+    python manage.py import_catalog proveedor.csv
+    python manage.py import_catalog proveedor.jsonl --batch-size 5000
+    python manage.py import_catalog proveedor.csv --dry-run
+    python manage.py import_catalog proveedor.csv --resume-from 120001
+
+The input is streamed through a generator pipeline (read -> validate -> batch),
+so memory use depends on ``--batch-size`` and not on the size of the file. Each
+batch is upserted on ``referencia`` with ``bulk_create(update_conflicts=True)``
+inside its own transaction; after an interruption, rerun with ``--resume-from``
+set to the record printed in the last progress line + 1.
+
+Expected columns / keys: ``referencia``, ``nombre``, ``descripcion``, ``price``,
+``image_url`` and ``herbalife_url`` (the last two optional). Without a
+``herbalife_url`` column/key the stored URL and its lookup state are kept.
+"""
+import csv
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import URLValidator
+from django.db import transaction
+
+from home.models import Articulo
+from home.utils import catalog_cache, herbalife
+
+# image_hash/image_width are written too: cleared when image_url changes so that
+# build_image_derivatives (which only picks rows without a hash) derives the new image.
+# Likewise the Herbalife lookup state is reset when herbalife_url changes.
+UPDATE_FIELDS = ["nombre", "descripcion", "price", "image_url", "image_hash", "image_width", *herbalife.STATE_FIELDS]
+# Lookup state carried over from the stored row while herbalife_url stays the same.
+_LOOKUP_STATE = [f for f in herbalife.STATE_FIELDS if f != "herbalife_url"]
+# Errors printed in full; after that they are only counted, to keep memory flat.
+MAX_REPORTED_ERRORS = 20
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_records(stream, fmt):
+    """Yield ``(record_number, dict)`` from a CSV or JSONL stream, 1-based."""
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(stream), start=1):
+            yield number, row
+        return
+
+    number = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, RowError(f"JSON inválido: {e}")
+
+
+def _field(model_field_name):
+    return Articulo._meta.get_field(model_field_name)
+
+
+_MAX_NOMBRE = _field("nombre").max_length
+_MAX_DESCRIPCION = _field("descripcion").max_length
+_MAX_REFERENCIA = _field("referencia").max_length
+_PRICE_FIELD = _field("price")
+_MAX_PRICE = Decimal(10) ** (_PRICE_FIELD.max_digits - _PRICE_FIELD.decimal_places)
+_CENT = Decimal(1).scaleb(-_PRICE_FIELD.decimal_places)
+_validate_url = URLValidator()
+
+
+def _text(raw, key, max_length, required):
+    value = (raw.get(key) or "").strip()
+    if required and not value:
+        raise RowError(f"falta '{key}'")
+    if len(value) > max_length:
+        raise RowError(f"'{key}' supera {max_length} caracteres")
+    return value
+
+
+def _url(raw, key):
+    value = (raw.get(key) or "").strip()
+    if not value:
+        return None
+    try:
+        _validate_url(value)
+    except ValidationError:
+        raise RowError(f"'{key}' no es una URL válida: {value!r}")
+    return value
+
+
+def _price(raw):
+    value = raw.get("price")
+    if value in (None, ""):
+        raise RowError("falta 'price'")
+    try:
+        # str() first so JSON floats don't carry binary rounding noise into the Decimal.
+        price = Decimal(str(value).strip().replace(",", "."))
+    except InvalidOperation:
+        raise RowError(f"'price' no es un número: {value!r}")
+    if not price.is_finite() or price < 0 or price >= _MAX_PRICE:
+        raise RowError(f"'price' fuera de rango: {value!r}")
+    return price.quantize(_CENT)
+
+
+def build_articulo(raw):
+    """Validate one input record and turn it into an unsaved ``Articulo``."""
+    if isinstance(raw, RowError):
+        raise raw
+    if not isinstance(raw, dict):
+        raise RowError("el registro no es un objeto")
+    articulo = Articulo(
+        referencia=_text(raw, "referencia", _MAX_REFERENCIA, required=True),
+        nombre=_text(raw, "nombre", _MAX_NOMBRE, required=True),
+        descripcion=_text(raw, "descripcion", _MAX_DESCRIPCION, required=False),
+        price=_price(raw),
+        image_url=_url(raw, "image_url"),
+        herbalife_url=_url(raw, "herbalife_url"),
+    )
+    # Read by upsert(): a missing column means "unknown", not "no URL".
+    articulo.has_herbalife_url = "herbalife_url" in raw
+    return articulo
+
+
+def validate(records, on_error):
+    """Yield ``(record_number, Articulo)``; invalid records go to ``on_error``."""
+    for number, raw in records:
+        try:
+            yield number, build_articulo(raw)
+        except RowError as e:
+            on_error(number, str(e))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def upsert(articulos):
+    """Insert or update a batch keyed on ``referencia``.
+
+    A row whose ``image_url`` changes loses its ``image_hash``/``image_width``;
+    one whose ``herbalife_url`` changes loses its lookup state. Records without
+    ``herbalife_url`` keep the stored one.
+    """
+    # Postgres refuses to touch the same row twice in one INSERT ... ON CONFLICT,
+    # so repeated referencias inside a batch keep only their last occurrence.
+    unique = {a.referencia: a for a in articulos}
+    with transaction.atomic():
+        existing = (
+            Articulo.objects.select_for_update()
+            .filter(referencia__in=unique)
+            .values("referencia", "image_url", "image_hash", "image_width", *herbalife.STATE_FIELDS)
+        )
+        for row in existing:
+            articulo = unique[row["referencia"]]
+            if articulo.image_url == row["image_url"]:
+                # Same image: keep its derivatives instead of rebuilding them.
+                articulo.image_hash, articulo.image_width = row["image_hash"], row["image_width"]
+            if not getattr(articulo, "has_herbalife_url", True):
+                articulo.herbalife_url = row["herbalife_url"]
+            if articulo.herbalife_url == row["herbalife_url"]:
+                # Same URL: keep the lookup outcome and its recheck deadline.
+                for field in _LOOKUP_STATE:
+                    setattr(articulo, field, row[field])
+        Articulo.objects.bulk_create(
+            unique.values(),
+            update_conflicts=True,
+            unique_fields=["referencia"],
+            update_fields=UPDATE_FIELDS,
+        )
+    return len(unique)
+
+
+class Command(BaseCommand):
+    help = "Importa un catálogo de proveedor (CSV o JSONL) en Articulo con upserts por lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichero CSV/JSONL, o '-' para leer de stdin.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Por defecto se deduce de la extensión.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--dry-run", action="store_true", help="Valida sin escribir en la base de datos.")
+        parser.add_argument(
+            "--resume-from", type=int, default=1, metavar="N",
+            help="Número de registro (1 = primero, sin contar la cabecera) desde el que continuar.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size debe ser mayor que 0")
+        resume_from = options["resume_from"]
+        dry_run = options["dry_run"]
+
+        self.errors = 0
+
+        if path == "-":
+            return self._run(sys.stdin, fmt, batch_size, resume_from, dry_run)
+        try:
+            with open(path, newline="", encoding="utf-8-sig") as stream:
+                return self._run(stream, fmt, batch_size, resume_from, dry_run)
+        except FileNotFoundError:
+            raise CommandError(f"No existe el fichero {path}")
+
+    def _on_error(self, number, message):
+        self.errors += 1
+        if self.errors <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f"registro {number}: {message}")
+        elif self.errors == MAX_REPORTED_ERRORS + 1:
+            self.stderr.write("(más errores omitidos; solo se contarán)")
+
+    def _run(self, stream, fmt, batch_size, resume_from, dry_run):
+        records = ((n, raw) for n, raw in read_records(stream, fmt) if n >= resume_from)
+        start = time.monotonic()
+        written = 0
+        last = resume_from - 1
+
+        for batch in batched(validate(records, self._on_error), batch_size):
+            last = batch[-1][0]
+            if not dry_run:
+                written += upsert(a for _, a in batch)
+                # bulk_create doesn't send post_save, so invalidate cached pages by hand.
+                catalog_cache.bump_version()
+            else:
+                written += len(batch)
+            elapsed = time.monotonic() - start
+            self.stdout.write(
+                f"registro {last}: {written} filas {'validadas' if dry_run else 'guardadas'}, "
+                f"{self.errors} errores, {written / elapsed if elapsed else 0:.0f} filas/s"
+            )
+
+        elapsed = time.monotonic() - start
+        verb = "validadas (dry-run, sin escribir)" if dry_run else "importadas"
+        self.stdout.write(self.style.SUCCESS(
+            f"{written} filas {verb} en {elapsed:.1f}s, {self.errors} errores."
+        ))
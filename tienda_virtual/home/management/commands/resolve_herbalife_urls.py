@@ -0,0 +1,172 @@
+"""Precompute ``Articulo.herbalife_url`` for the whole catalog (or part of it).
+
+    python manage.py resolve_herbalife_urls
+    python manage.py resolve_herbalife_urls --workers 8 --rate 4
+    python manage.py resolve_herbalife_urls --ids 12 15 --force
+    python manage.py resolve_herbalife_urls --search batido --limit 100
+
+Lookups run in a bounded thread pool (they are I/O-bound), all sharing one
+per-host token bucket so the catalog size never turns into a burst against
+herbalife.com. Transient errors (network, 429, 5xx) are retried with jittered
+exponential backoff; once the Herbalife circuit breaker opens the remaining
+products fail fast and are recorded as errors. Only the main thread touches the database: outcomes
+(found / not found / error, see home/utils/herbalife.py) are written back with
+``bulk_update`` every ``--batch-size`` rows. Products whose last outcome is still
+fresh are skipped unless ``--force`` is given.
+
+Products are streamed (``.iterator()``) and submitted as lookups finish, with at
+most ``IN_FLIGHT_PER_WORKER`` per worker pending, so memory stays flat whatever
+the catalog size.
+"""
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from home.models import Articulo
+from home.utils import catalog_cache, herbalife, scraping
+from home.utils.ratelimit import HostRateLimiter
+from home.utils.resilience import CircuitOpenError
+from home.utils.search import search_articulos
+
+# Lookups submitted and not yet collected, per worker: enough to keep every thread busy.
+IN_FLIGHT_PER_WORKER = 4
+
+
+def is_retryable(error):
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, requests.RequestException)
+
+
+class Resolver:
+    """Thread-safe lookup of one product name, with rate limiting and retries."""
+
+    def __init__(self, base_url, limiter, retries, retry_delay, sleep=time.sleep):
+        self.base_url = base_url
+        self.limiter = limiter
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.sleep = sleep
+        self._local = threading.local()
+
+    def _session(self):
+        # requests.Session isn't guaranteed thread-safe: one per worker thread.
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def __call__(self, pk, nombre):
+        """Returns ``(pk, url_or_None, error_or_None, attempts)``."""
+        for attempt in range(1, self.retries + 2):
+            self.limiter.acquire(scraping.search_url(nombre, self.base_url))
+            try:
+                return pk, scraping.lookup_herbalife_product(nombre, self.base_url, self._session()), None, attempt
+            except Exception as e:
+                if attempt > self.retries or not is_retryable(e):
+                    return pk, None, str(e) or type(e).__name__, attempt
+                # Full jitter: retries from many threads don't line up into new bursts.
+                self.sleep(random.uniform(0, self.retry_delay * 2 ** (attempt - 1)))
+
+
+class Command(BaseCommand):
+    help = "Busca en Herbalife la URL de los productos del catálogo y la guarda en herbalife_url."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Peticiones simultáneas.")
+        parser.add_argument("--rate", type=float, default=2.0, help="Peticiones por segundo por host.")
+        parser.add_argument("--burst", type=int, default=1)
+        parser.add_argument("--retries", type=int, default=3, help="Reintentos ante errores transitorios.")
+        parser.add_argument("--retry-delay", type=float, default=1.0, help="Base en segundos del backoff.")
+        parser.add_argument("--batch-size", type=int, default=200, help="Filas por bulk_update.")
+        parser.add_argument("--base-url", default=scraping.BASE_URL)
+        parser.add_argument("--ids", type=int, nargs="+", help="Solo estos productos.")
+        parser.add_argument("--search", help="Solo los productos que coinciden con la búsqueda.")
+        parser.add_argument("--limit", type=int)
+        parser.add_argument("--force", action="store_true", help="Incluye los comprobados hace poco y las URL puestas a mano.")
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["rate"] <= 0 or options["batch_size"] < 1:
+            raise CommandError("--workers, --rate y --batch-size deben ser positivos")
+
+        qs = Articulo.objects.all()
+        if not options["force"]:
+            qs = qs.filter(herbalife.due_q())
+        if options["ids"]:
+            qs = qs.filter(id__in=options["ids"])
+        if options["search"]:
+            qs = search_articulos(qs, options["search"])
+        pending = (
+            qs.order_by("id")
+            .only("id", "nombre", *herbalife.STATE_FIELDS)[:options["limit"]]
+            .iterator(chunk_size=options["batch_size"])
+        )
+
+        resolver = Resolver(
+            base_url=options["base_url"].rstrip("/"),
+            limiter=HostRateLimiter(options["rate"], options["burst"]),
+            retries=options["retries"],
+            retry_delay=options["retry_delay"],
+        )
+        start = time.monotonic()
+        self.stats = Counter()
+        self.batch = []
+        self.batch_size = options["batch_size"]
+        in_flight = {}
+        max_in_flight = options["workers"] * IN_FLIGHT_PER_WORKER
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            for articulo in pending:
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._collect(in_flight.pop(future), future.result())
+                in_flight[pool.submit(resolver, articulo.id, articulo.nombre)] = articulo
+            for future in wait(in_flight).done:
+                self._collect(in_flight[future], future.result())
+        self.stats["saved"] += self._flush(self.batch)
+
+        stats = self.stats
+        total = stats["found"] + stats["not_found"] + stats["failed"]
+        if not total:
+            self.stdout.write("No hay productos pendientes.")
+            return
+        elapsed = time.monotonic() - start
+        checked = stats["found"] + stats["not_found"]
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} productos en {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f}/s): "
+            f"{stats['found']} encontrados, {stats['not_found']} no encontrados, {stats['failed']} fallidos, "
+            f"{stats['retried']} reintentos; acierto {stats['found'] / checked if checked else 0:.0%}, "
+            f"{stats['saved']} guardados."
+        ))
+
+    def _collect(self, articulo, outcome):
+        pk, url, error, attempts = outcome
+        self.stats["retried"] += attempts - 1
+        if error:
+            self.stats["failed"] += 1
+            self.stderr.write(f"Articulo {pk}: {error}")
+        elif url:
+            self.stats["found"] += 1
+        else:
+            self.stats["not_found"] += 1
+        self.batch.append(herbalife.record(articulo, url=url, error=bool(error)))
+        if len(self.batch) >= self.batch_size:
+            self.stats["saved"] += self._flush(self.batch)
+            self.batch = []
+
+    def _flush(self, batch):
+        if not batch:
+            return 0
+        Articulo.objects.bulk_update(batch, herbalife.STATE_FIELDS)
+        # bulk_update no envía post_save: invalidamos las páginas cacheadas a mano.
+        catalog_cache.bump_version()
+        return len(batch)
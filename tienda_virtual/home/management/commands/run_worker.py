@@ -0,0 +1,95 @@
+"""Run background jobs from the database queue (home/utils/jobs.py).
+
+    python manage.py run_worker                       # 1 hilo, cola "default"
+    python manage.py run_worker --concurrency 4
+    python manage.py run_worker --queue herbalife --visibility-timeout 60
+    python manage.py run_worker --once                # vacía la cola y termina (cron)
+
+Each thread polls the queue on its own DB connection. SIGINT/SIGTERM stop the
+worker after the jobs in progress finish; a worker killed harder than that just
+lets its jobs' visibility timeout expire so another worker retries them.
+"""
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from home.utils import jobs
+
+
+class Command(BaseCommand):
+    help = "Ejecuta los trabajos en segundo plano de la cola en base de datos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", default="default")
+        parser.add_argument("--concurrency", type=int, default=1, help="Hilos ejecutando trabajos a la vez.")
+        parser.add_argument(
+            "--visibility-timeout", type=int, default=None, metavar="SEGUNDOS",
+            help="Tiempo tras el cual un trabajo sin terminar se considera abandonado (JOBS_VISIBILITY_TIMEOUT).",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Espera entre consultas con la cola vacía.")
+        parser.add_argument("--once", action="store_true", help="Procesa lo pendiente y termina.")
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency debe ser mayor que 0")
+        self.queue = options["queue"]
+        self.timeout = options["visibility_timeout"]
+        self.poll_interval = options["poll_interval"]
+        self.once = options["once"]
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.done = self.failed = 0
+
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                previous[sig] = signal.signal(sig, self._request_stop)
+
+        concurrency = options["concurrency"]
+        self.stdout.write(f"Worker en la cola '{self.queue}' con {concurrency} hilo(s).")
+        try:
+            if concurrency == 1:
+                self._loop()
+            else:
+                threads = [threading.Thread(target=self._thread_loop, daemon=True) for _ in range(concurrency)]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+        self.stdout.write(self.style.SUCCESS(f"{self.done} trabajos completados, {self.failed} con error."))
+
+    def _request_stop(self, signum, frame):
+        self.stdout.write("Parando tras los trabajos en curso...")
+        self.stop.set()
+
+    def _thread_loop(self):
+        try:
+            self._loop()
+        finally:
+            connection.close()
+
+    def _loop(self):
+        while not self.stop.is_set():
+            # Never inside a transaction (call_command from a test): it would drop it.
+            if not connection.in_atomic_block:
+                close_old_connections()
+            job = jobs.claim(self.queue, self.timeout)
+            if job is None:
+                if self.once:
+                    return
+                self.stop.wait(self.poll_interval)
+                continue
+            ok = jobs.run(job)
+            with self.lock:
+                if ok:
+                    self.done += 1
+                else:
+                    self.failed += 1
+            if not ok:
+                self.stderr.write(f"{job.task} #{job.pk} intento {job.attempts}/{job.max_attempts} falló")
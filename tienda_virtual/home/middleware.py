@@ -0,0 +1,55 @@
+import os
+
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.responders import MissingFileError
+
+
+class ContentAddressedWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that also serves the content-addressed media stores.
+
+    Files in those stores (image derivatives, ...) are written while the site is
+    running, so unlike STATIC_ROOT they cannot be indexed once at startup: they are
+    looked up on disk on first request and remembered afterwards. Their names are
+    content hashes, so they are always served as immutable (far-future max-age).
+    """
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        # Same normalisation as WhiteNoise.add_files: absolute root with a trailing separator.
+        self.content_addressed = [
+            (os.path.abspath(root).rstrip(os.path.sep) + os.path.sep, prefix)
+            for prefix, root in getattr(settings, "CONTENT_ADDRESSED_STORES", {}).items()
+        ]
+
+    def __call__(self, request):
+        url = request.path_info
+        for root, prefix in self.content_addressed:
+            if url.startswith(prefix):
+                static_file = self.files.get(url) or self._find_content_addressed(url, root, prefix)
+                if static_file is not None:
+                    try:
+                        return self.serve(static_file, request)
+                    except FileNotFoundError:
+                        # Garbage-collected since it was remembered (e.g. old Instagram media).
+                        self.files.pop(url, None)
+                break
+        return super().__call__(request)
+
+    def _find_content_addressed(self, url, root, prefix):
+        if not self.url_is_canonical(url):
+            return None
+        path = os.path.join(root, url[len(prefix):])
+        if not self.path_is_child_of(path, root):
+            return None
+        try:
+            static_file = self.get_static_file(path, url)
+        except MissingFileError:
+            return None
+        self.files[url] = static_file
+        return static_file
+
+    def immutable_file_test(self, path, url):
+        if any(url.startswith(prefix) for _, prefix in self.content_addressed):
+            return True
+        return super().immutable_file_test(path, url)
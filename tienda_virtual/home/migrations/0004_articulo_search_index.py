@@ -0,0 +1,98 @@
+from django.db import migrations
+
+# Copia de home/utils/search.py al escribir esta migración: si esa lógica
+# cambia, la migración debe seguir creando el índice igual que entonces.
+# unaccent() is only STABLE, so it cannot be used in an index expression directly.
+# The IMMUTABLE wrapper pins the dictionary, which is what makes it safe to index.
+PG_INSTALL_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION natursur_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS home_articulo_search_gin ON home_articulo
+    USING GIN (to_tsvector('spanish', natursur_unaccent(nombre || ' ' || descripcion)))
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS home_articulo_nombre_trgm ON home_articulo
+    USING GIN (natursur_unaccent(lower(nombre)) gin_trgm_ops)
+    """,
+]
+
+PG_UNINSTALL_SQL = [
+    "DROP INDEX IF EXISTS home_articulo_nombre_trgm",
+    "DROP INDEX IF EXISTS home_articulo_search_gin",
+    "DROP FUNCTION IF EXISTS natursur_unaccent(text)",
+]
+
+FTS_TABLE = "home_articulo_fts"
+
+# "CREATE ... IF NOT EXISTS" everywhere: SQLite drops triggers when Django remakes
+# the table during a migration, so any such migration must install them again.
+SQLITE_INSTALL_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        nombre, descripcion,
+        content='home_articulo', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON home_articulo BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON home_articulo BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, nombre, descripcion) VALUES ('delete', old.id, old.nombre, old.descripcion);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON home_articulo BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, nombre, descripcion) VALUES ('delete', old.id, old.nombre, old.descripcion);
+        INSERT INTO {FTS_TABLE}(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def _run(schema_editor, pg_statements, sqlite_statements):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        statements = pg_statements
+    elif vendor == "sqlite":
+        statements = sqlite_statements
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def forwards(apps, schema_editor):
+    _run(schema_editor, PG_INSTALL_SQL, SQLITE_INSTALL_SQL)
+
+
+def backwards(apps, schema_editor):
+    _run(schema_editor, PG_UNINSTALL_SQL, SQLITE_UNINSTALL_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0003_rename_date_reservation_fecha_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+# Copia de home/utils/search.py al escribir esta migración: si esa lógica
+# cambia, la migración debe seguir creando el índice igual que entonces.
+# Solo SQLite: en PostgreSQL añadir columnas no toca los índices de búsqueda.
+FTS_TABLE = "home_articulo_fts"
+
+# "CREATE ... IF NOT EXISTS" everywhere: only the dropped triggers are really recreated.
+SQLITE_INSTALL_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        nombre, descripcion,
+        content='home_articulo', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON home_articulo BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON home_articulo BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, nombre, descripcion) VALUES ('delete', old.id, old.nombre, old.descripcion);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON home_articulo BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, nombre, descripcion) VALUES ('delete', old.id, old.nombre, old.descripcion);
+        INSERT INTO {FTS_TABLE}(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def reinstall_search_index(apps, schema_editor):
+    # On SQLite adding a unique column rebuilds home_articulo, which drops the FTS triggers.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in SQLITE_INSTALL_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0004_articulo_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articulo',
+            name='referencia',
+            field=models.CharField(blank=True, help_text='Código del proveedor; clave para las importaciones masivas.', max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0005_articulo_referencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articulo',
+            name='image_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 de la imagen original; localiza sus miniaturas.', max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='articulo',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
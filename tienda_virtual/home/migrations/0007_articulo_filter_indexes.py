@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0006_articulo_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='articulo',
+            index=models.Index(fields=['price', 'id'], name='articulo_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='articulo',
+            index=models.Index(fields=['nombre', 'id'], name='articulo_nombre_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='articulo',
+            index=models.Index(condition=models.Q(('herbalife_url__gt', '')), fields=['price', 'id'], name='articulo_herbalife_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='articulo',
+            index=models.Index(condition=models.Q(('herbalife_url__gt', '')), fields=['id'], name='articulo_herbalife_id_idx'),
+        ),
+    ]
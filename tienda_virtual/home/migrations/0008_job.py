@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0007_articulo_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(help_text="Ruta importable de la función, p. ej. 'home.tasks.lookup_herbalife'.", max_length=200)),
+                ('kwargs', models.JSONField(blank=True, default=dict)),
+                ('queue', models.CharField(default='default', max_length=50)),
+                ('key', models.CharField(blank=True, help_text='Evita encolar dos veces el mismo trabajo mientras está pendiente.', max_length=200, null=True)),
+                ('status', models.CharField(choices=[('queued', 'En cola'), ('running', 'En ejecución'), ('done', 'Terminado'), ('failed', 'Fallido')], default='queued', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_after', models.DateTimeField(help_text='No se ejecuta antes de esta hora (reintentos con backoff).')),
+                ('locked_until', models.DateTimeField(blank=True, help_text='Fin del plazo de visibilidad del worker que lo ejecuta.', null=True)),
+                ('lock_token', models.CharField(blank=True, default='', max_length=32)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['queue', 'status', 'run_after'], name='job_ready_idx'), models.Index(fields=['key', '-created_at'], name='job_key_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('key',), name='job_unique_active_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0009_articulo_herbalife_lookup_state'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['fecha', 'hora'], name='reservation_fecha_hora_idx'),
+        ),
+    ]
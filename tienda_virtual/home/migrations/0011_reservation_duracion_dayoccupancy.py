@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:14
+
+import re
+from itertools import groupby
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Copia de home/utils/availability.py al escribir esta migración: si esa lógica
+# cambia, la migración debe seguir rellenando los datos igual que entonces.
+GRID_MINUTES = 15
+_DURATION_SUFFIX = re.compile(r"\s*\((\d+)\s*min\)\s*$")
+
+
+def service_duration(servicio):
+    default = getattr(settings, "RESERVATION_DEFAULT_DURATION", 60)
+    if not servicio:
+        return default
+    services = getattr(settings, "RESERVATION_SERVICES", {})
+    suffix = _DURATION_SUFFIX.search(servicio)
+    name = _DURATION_SUFFIX.sub("", servicio)
+    if name in services:
+        return services[name]
+    return int(suffix.group(1)) if suffix else default
+
+
+def occupancy_counts(reservations):
+    counts = {}
+    for hora, duracion in reservations:
+        start = hora.hour * 60 + hora.minute
+        end = start + -(-(duracion or 0) // GRID_MINUTES) * GRID_MINUTES
+        for cell in range(start - start % GRID_MINUTES, end, GRID_MINUTES):
+            key = f"{cell // 60:02d}:{cell % 60:02d}"
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def fill_occupancy(apps, schema_editor):
+    Reservation = apps.get_model("home", "Reservation")
+    DayOccupancy = apps.get_model("home", "DayOccupancy")
+    for reservation in Reservation.objects.only("servicio", "duracion").iterator():
+        duracion = service_duration(reservation.servicio)
+        if duracion != reservation.duracion:
+            Reservation.objects.filter(pk=reservation.pk).update(duracion=duracion)
+    rows = Reservation.objects.order_by("fecha").values_list("fecha", "hora", "duracion").iterator()
+    DayOccupancy.objects.bulk_create(
+        [
+            DayOccupancy(fecha=fecha, counts=occupancy_counts((hora, duracion) for _, hora, duracion in group))
+            for fecha, group in groupby(rows, key=lambda row: row[0])
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0010_reservation_fecha_hora_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DayOccupancy',
+            fields=[
+                ('fecha', models.DateField(primary_key=True, serialize=False)),
+                ('counts', models.JSONField(default=dict, help_text='Reservas que ocupan cada tramo: {"HH:MM": n}.')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='duracion',
+            field=models.PositiveSmallIntegerField(default=60, help_text='Duración en minutos.'),
+        ),
+        migrations.RunPython(fill_occupancy, migrations.RunPython.noop),
+    ]
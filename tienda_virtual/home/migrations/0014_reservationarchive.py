@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0013_calendarfeed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservationArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('nombre', models.CharField(max_length=100)),
+                ('fecha', models.DateField()),
+                ('hora', models.TimeField()),
+                ('servicio', models.CharField(default='Masaje relajante', max_length=100)),
+                ('duracion', models.PositiveSmallIntegerField(default=60, help_text='Duración en minutos.')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha', 'hora'], name='reservation_archive_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0014_reservationarchive'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='escaparate',
+            options={'ordering': ['posicion', 'id']},
+        ),
+        migrations.AddField(
+            model_name='escaparate',
+            name='activo_desde',
+            field=models.DateTimeField(blank=True, help_text='Vacío: desde ya.', null=True),
+        ),
+        migrations.AddField(
+            model_name='escaparate',
+            name='activo_hasta',
+            field=models.DateTimeField(blank=True, help_text='Vacío: sin fecha de fin.', null=True),
+        ),
+        migrations.AddField(
+            model_name='escaparate',
+            name='posicion',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Orden en el carrusel (menor primero).'),
+        ),
+        migrations.AddIndex(
+            model_name='escaparate',
+            index=models.Index(fields=['posicion', 'id'], name='escaparate_posicion_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0015_escaparate_posicion_ventana'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='articulo',
+            index=models.Index(condition=models.Q(('herbalife_url__isnull', True), ('herbalife_url', ''), _connector='OR'), fields=['price', 'id'], name='articulo_noherbalife_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='articulo',
+            index=models.Index(condition=models.Q(('herbalife_url__isnull', True), ('herbalife_url', ''), _connector='OR'), fields=['id'], name='articulo_noherbalife_id_idx'),
+        ),
+    ]
@@ -1,17 +1,92 @@
+import secrets
+
+from django.conf import settings
 from django.db import models
 
+from .utils import images
+
 class Articulo(models.Model):
     nombre = models.CharField(max_length=30)
     descripcion = models.CharField(max_length=100)
     image_url = models.URLField(blank=True, null=True)
     price = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
     herbalife_url = models.URLField(blank=True, null=True, help_text="URL del producto en Herbalife, si existe.")
+    referencia = models.CharField(max_length=64, unique=True, blank=True, null=True, help_text="Código del proveedor; clave para las importaciones masivas.")
+    image_hash = models.CharField(max_length=64, blank=True, null=True, editable=False, help_text="SHA-256 de la imagen original; localiza sus miniaturas.")
+    image_width = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    # Estado de la última búsqueda en Herbalife (home/utils/herbalife.py): evita repetirla en cada visita.
+    HERBALIFE_FOUND = "found"
+    HERBALIFE_NOT_FOUND = "not_found"
+    HERBALIFE_ERROR = "error"
+    HERBALIFE_STATUS_CHOICES = [
+        (HERBALIFE_FOUND, "Encontrado"),
+        (HERBALIFE_NOT_FOUND, "No disponible"),
+        (HERBALIFE_ERROR, "Error al comprobar"),
+    ]
+    herbalife_status = models.CharField(max_length=10, choices=HERBALIFE_STATUS_CHOICES, blank=True, default="", editable=False)
+    herbalife_checked_at = models.DateTimeField(blank=True, null=True, editable=False)
+    herbalife_recheck_after = models.DateTimeField(blank=True, null=True, editable=False, help_text="Antes de esta hora se reutiliza el último resultado.")
+    herbalife_failures = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Errores seguidos; alarga el tiempo hasta el siguiente intento.")
+
+    class Meta:
+        # Cada forma de consulta admitida de products_api (rango de precio con sort=price|-price,
+        # sort=price|-price|nombre, herbalife=1|0 con o sin sort=price|-price) es un recorrido de
+        # rango o un recorrido ordenado sin filtro residual sobre uno de estos índices, sin ordenar
+        # en memoria. Un rango de precio con el orden por defecto o sort=nombre, y herbalife con
+        # sort=nombre, funcionan pero no tienen índice: ninguno ordena por una columna y filtra por otra.
+        indexes = [
+            models.Index(fields=["price", "id"], name="articulo_price_id_idx"),
+            models.Index(fields=["nombre", "id"], name="articulo_nombre_id_idx"),
+            models.Index(
+                fields=["price", "id"],
+                name="articulo_herbalife_price_idx",
+                condition=models.Q(herbalife_url__gt=""),
+            ),
+            models.Index(
+                fields=["id"],
+                name="articulo_herbalife_id_idx",
+                condition=models.Q(herbalife_url__gt=""),
+            ),
+            # herbalife=0: misma condición que el filtro de _products_queryset, para que el planner la reconozca.
+            models.Index(
+                fields=["price", "id"],
+                name="articulo_noherbalife_price_idx",
+                condition=models.Q(herbalife_url__isnull=True) | models.Q(herbalife_url=""),
+            ),
+            models.Index(
+                fields=["id"],
+                name="articulo_noherbalife_id_idx",
+                condition=models.Q(herbalife_url__isnull=True) | models.Q(herbalife_url=""),
+            ),
+        ]
 
     def __str__(self):
         return self.nombre
+
+    @property
+    def image_srcset(self):
+        return images.srcset(self.image_hash, self.image_width, "jpeg")
+
+    @property
+    def image_srcset_webp(self):
+        return images.srcset(self.image_hash, self.image_width, "webp")
+
+    @property
+    def image_src(self):
+        """Best single URL for the card image: a local derivative if there is one."""
+        return images.fallback_url(self.image_hash, self.image_width) or self.image_url or ""
     
 class Escaparate(models.Model):
+    """A product in the home page showcase (see home/utils/showcase.py)."""
+
     articulo = models.ForeignKey(Articulo, on_delete=models.CASCADE)
+    posicion = models.PositiveSmallIntegerField(default=0, help_text="Orden en el carrusel (menor primero).")
+    activo_desde = models.DateTimeField(blank=True, null=True, help_text="Vacío: desde ya.")
+    activo_hasta = models.DateTimeField(blank=True, null=True, help_text="Vacío: sin fecha de fin.")
+
+    class Meta:
+        ordering = ["posicion", "id"]
+        indexes = [models.Index(fields=["posicion", "id"], name="escaparate_posicion_idx")]
 
     def __str__(self):
         return str(self.articulo.id)
@@ -22,7 +97,118 @@ class Reservation(models.Model):
     fecha = models.DateField()
     hora = models.TimeField()
     servicio = models.CharField(max_length=100, default="Masaje relajante")
+    duracion = models.PositiveSmallIntegerField(default=60, help_text="Duración en minutos.")
+
+    class Meta:
+        # El calendario siempre consulta un intervalo de fechas y agrupa por día.
+        indexes = [models.Index(fields=["fecha", "hora"], name="reservation_fecha_hora_idx")]
+
+    def __str__(self):
+        return f"{self.nombre} - {self.fecha} {self.hora}"
+
+
+class ReservationArchive(models.Model):
+    """Past reservations moved out of ``Reservation`` by ``manage.py archive_reservations``.
+
+    Same columns and the same ``id`` as the original row (calendar UIDs and
+    exports don't change when a reservation is archived).
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    nombre = models.CharField(max_length=100)
+    fecha = models.DateField()
+    hora = models.TimeField()
+    servicio = models.CharField(max_length=100, default="Masaje relajante")
+    duracion = models.PositiveSmallIntegerField(default=60, help_text="Duración en minutos.")
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["fecha", "hora"], name="reservation_archive_fecha_idx")]
+
+    def __str__(self):
+        return f"{self.nombre} - {self.fecha} {self.hora} (archivada)"
+
+
+class DayOccupancy(models.Model):
+    """Precomputed occupancy of a day, kept up to date by home/signals.py (see home/utils/availability.py)."""
+
+    fecha = models.DateField(primary_key=True)
+    counts = models.JSONField(default=dict, help_text='Reservas que ocupan cada tramo: {"HH:MM": n}.')
+
+    def __str__(self):
+        return f"Ocupación {self.fecha}"
+
+
+def new_feed_token():
+    return secrets.token_urlsafe(32)
+
+
+class CalendarFeed(models.Model):
+    """Secret URL of a staff member's reservations calendar subscription (home/utils/calendar_feed.py)."""
+
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="calendar_feed")
+    token = models.CharField(max_length=64, unique=True, default=new_feed_token, help_text="Parte secreta de la URL; regenérala si se filtra.")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Calendario de {self.user}"
+
+
+class IdempotencyKey(models.Model):
+    """Stored response of a POST sent with an ``Idempotency-Key`` header (see home/utils/booking.py)."""
+
+    key = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=64, help_text="Hash de la petición: la misma clave con otros datos es un error.")
+    status_code = models.PositiveSmallIntegerField()
+    body = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class Job(models.Model):
+    """A unit of background work, run by ``manage.py run_worker`` (see home/utils/jobs.py)."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "En cola"),
+        (RUNNING, "En ejecución"),
+        (DONE, "Terminado"),
+        (FAILED, "Fallido"),
+    ]
+
+    task = models.CharField(max_length=200, help_text="Ruta importable de la función, p. ej. 'home.tasks.lookup_herbalife'.")
+    kwargs = models.JSONField(default=dict, blank=True)
+    queue = models.CharField(max_length=50, default="default")
+    key = models.CharField(max_length=200, blank=True, null=True, help_text="Evita encolar dos veces el mismo trabajo mientras está pendiente.")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(help_text="No se ejecuta antes de esta hora (reintentos con backoff).")
+    locked_until = models.DateTimeField(blank=True, null=True, help_text="Fin del plazo de visibilidad del worker que lo ejecuta.")
+    lock_token = models.CharField(max_length=32, blank=True, default="")
+    result = models.JSONField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Lo que consulta el worker en cada vuelta: trabajos de su cola listos para ejecutarse.
+            models.Index(fields=["queue", "status", "run_after"], name="job_ready_idx"),
+            models.Index(fields=["key", "-created_at"], name="job_key_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["key"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="job_unique_active_key",
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.nombre} - {self.fecha} {self.hora}"
\ No newline at end of file
+        return f"{self.task} #{self.pk} ({self.status})"
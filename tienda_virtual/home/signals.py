@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Articulo, Escaparate, Reservation
+from .utils import availability, calendar_feed, catalog_cache, live, showcase, versioning
+
+
+@receiver(post_save, sender=Articulo)
+@receiver(post_delete, sender=Articulo)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Any change to the catalog makes every cached product page stale.
+
+    After commit: a page rebuilt in between would hold the old rows under the
+    new version and be served for the whole ``CATALOG_CACHE_TTL``.
+    """
+    transaction.on_commit(catalog_cache.bump_version)
+
+
+@receiver(post_save, sender=Escaparate)
+@receiver(post_delete, sender=Escaparate)
+def invalidate_showcase_cache(sender, **kwargs):
+    """A new, moved or rescheduled showcase entry rebuilds the home page carousel (after commit)."""
+    transaction.on_commit(showcase.bump_version)
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def bump_reservations_version(sender, **kwargs):
+    """Changes the ETag of the reservation APIs so pollers get the new data.
+
+    After commit: a GET in between would read the old rows under the new ETag,
+    and revalidating with it would keep them until the next change.
+    """
+    transaction.on_commit(lambda: versioning.bump_version("reservations"))
+
+
+@receiver(pre_save, sender=Reservation)
+def remember_reservation_day(sender, instance, **kwargs):
+    """Keeps the stored slot of an edited reservation, whose occupancy changes too if it moves."""
+    instance._previous_slot = instance._previous_fecha = None
+    if instance.pk:
+        instance._previous_slot = (
+            Reservation.objects.filter(pk=instance.pk).values_list("fecha", "hora", "duracion").first()
+        )
+        if instance._previous_slot:
+            instance._previous_fecha = instance._previous_slot[0]
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def refresh_occupancy(sender, instance, **kwargs):
+    """Recomputes the precomputed occupancy of the reservation's day(s)."""
+    availability.refresh_day(instance.fecha)
+    previous = getattr(instance, "_previous_fecha", None)
+    if previous and str(previous) != str(instance.fecha):
+        availability.refresh_day(previous)
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def bump_calendar_months(sender, instance, **kwargs):
+    """Invalidates the cached calendar feed months of the reservation's day(s).
+
+    After commit: a feed built before that would otherwise cache the old rows
+    under the new version.
+    """
+    days = {str(instance.fecha)}
+    previous = getattr(instance, "_previous_fecha", None)
+    if previous:
+        days.add(str(previous))
+    for day in days:
+        transaction.on_commit(lambda day=day: calendar_feed.bump_month(day))
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def publish_slot_changes(sender, instance, created=False, **kwargs):
+    """Pushes slot_taken/slot_freed deltas to the open booking pages once committed."""
+    current = (instance.fecha, instance.hora, instance.duracion)
+    previous = getattr(instance, "_previous_slot", None)
+    events = []
+    if kwargs["signal"] is post_delete:
+        events.append(live.slot_event(live.SLOT_FREED, *current))
+    elif created or not previous:
+        events.append(live.slot_event(live.SLOT_TAKEN, *current))
+    else:
+        freed, taken = live.slot_event(live.SLOT_FREED, *previous), live.slot_event(live.SLOT_TAKEN, *current)
+        if {**freed, "type": None} != {**taken, "type": None}:
+            events += [freed, taken]
+    for event in events:
+        transaction.on_commit(lambda event=event: live.publish(event))
@@ -0,0 +1,36 @@
+"""Background tasks run by ``manage.py run_worker`` (see home/utils/jobs.py)."""
+import requests
+
+from .models import Articulo
+from .utils import herbalife
+from .utils.scraping import lookup_herbalife_product
+
+
+def herbalife_lookup_key(articulo_id):
+    return f"herbalife:{articulo_id}"
+
+
+def lookup_herbalife(articulo_id, force=False):
+    """Look a product up on Herbalife and record the outcome on the ``Articulo``.
+
+    Skipped while the last outcome is still fresh unless ``force`` is set. Network
+    errors are recorded as an "error" outcome, which backs off exponentially
+    (see home/utils/herbalife.py) instead of failing the job.
+    """
+    articulo = Articulo.objects.filter(id=articulo_id).first()
+    if articulo is None:
+        return {"herbalife_url": None}
+    if not force and not herbalife.is_due(articulo):
+        return {"herbalife_url": articulo.herbalife_url, "status": articulo.herbalife_status}
+
+    try:
+        url = lookup_herbalife_product(articulo.nombre)
+    except requests.RequestException as e:
+        herbalife.record(articulo, error=True)
+        outcome = {"herbalife_url": articulo.herbalife_url, "status": articulo.herbalife_status, "error": str(e)}
+    else:
+        herbalife.record(articulo, url=url)
+        outcome = {"herbalife_url": url, "status": articulo.herbalife_status}
+    # save() (not update()) so post_save invalidates the cached catalog pages.
+    articulo.save(update_fields=herbalife.STATE_FIELDS)
+    return outcome
@@ -1,10 +1,43 @@
-from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, transaction
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from unittest.mock import patch
-from home.models import Articulo, Reservation
+from home import checks, tasks, views
+from home.models import Articulo, CalendarFeed, DayOccupancy, Escaparate, Job, Reservation, ReservationArchive
+import asyncio
+import csv
+import functools
+import http.server
+import shutil
+import sys
+import threading
+import time
+import gzip
+import json
+import os
+import re
+import requests
+import tempfile
 import unittest
+import urllib.parse
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from PIL import Image
+from lxml import etree
 from unittest.mock import patch, Mock
-from home.utils.scraping import scrape_herbalife_product
+from home.utils.scraping import find_product_link, scrape_herbalife_product
+from home.utils import archive, availability, calendar_feed, catalog_cache, exports, herbalife, images, instagram, jobs, live, showcase
+from home.utils import resilience, versioning
+from home.utils.ratelimit import RateLimiter
+from home.utils.resilience import CircuitBreaker, CircuitOpenError, SingleFlight
+from home.utils.search import search_articulos
 
 # ===========================
 
@@ -33,14 +66,265 @@ class IndexViewTests(TestCase):
         self.client = Client()
         Articulo.objects.create(nombre="Test", descripcion="Desc")
 
-    @patch("home.views._fetch_instagram_posts", return_value=[])
-    @patch("home.views._fetch_instagram_profile", return_value=None)
+    @patch("home.utils.instagram.fetch_posts", return_value=[])
+    @patch("home.utils.instagram.fetch_profile", return_value=None)
     def test_index_view_loads(self, mock_profile, mock_posts):
         response = self.client.get(reverse("home"))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Test")  # nombre del artículo en el template
 
 
+# ===========================
+
+# Tests del feed de Instagram (caché compartida)
+
+# ===========================
+
+@override_settings(INSTAGRAM_FEED_TTL=300, INSTAGRAM_PROFILE_TTL=3600, INSTAGRAM_RETRY_AFTER=30,
+                   INSTAGRAM_MEDIA_MIRROR=False)
+class InstagramCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.spawned = []
+        patcher = patch("home.utils.instagram._spawn", side_effect=self.spawned.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.key = f"{instagram.POSTS_KEY}:6"
+
+    def _post(self, n):
+        return {"media_url": f"https://cdn.test/{n}.jpg", "permalink": f"https://instagram.test/p/{n}"}
+
+    def test_fetched_once_for_every_worker(self):
+        with patch("home.utils.instagram.fetch_posts", return_value=[self._post(1)]) as fetch:
+            posts, ts = instagram.get_posts("token")
+            self.assertEqual(instagram.get_posts("token"), (posts, ts))
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(posts, [self._post(1)])
+        # Vive en la caché de Django, no en memoria del proceso
+        self.assertEqual(cache.get(self.key)["value"], posts)
+
+    def test_stale_feed_is_served_and_refreshed_once_in_background(self):
+        cache.set(self.key, {"value": [self._post(1)], "ts": time.time() - 301})
+        with patch("home.utils.instagram.fetch_posts", return_value=[self._post(2)]) as fetch:
+            self.assertEqual(instagram.get_posts("token")[0], [self._post(1)])
+            self.assertEqual(instagram.get_posts("token")[0], [self._post(1)])
+            fetch.assert_not_called()
+            self.assertEqual(len(self.spawned), 1)  # un solo refresco pese a dos peticiones
+            self.spawned[0]()
+        posts, ts = instagram.get_posts("token")
+        self.assertEqual(posts, [self._post(2)])
+        self.assertAlmostEqual(ts, time.time(), delta=5)
+
+    def test_failed_refresh_keeps_stale_copy_and_backs_off(self):
+        cache.set(self.key, {"value": [self._post(1)], "ts": time.time() - 301})
+        with patch("home.utils.instagram.fetch_posts", side_effect=instagram.InstagramError("caído")):
+            instagram.get_posts("token")
+            self.spawned.pop()()
+        self.assertEqual(instagram.get_posts("token")[0], [self._post(1)])
+        self.assertEqual(self.spawned, [])  # no se reintenta hasta INSTAGRAM_RETRY_AFTER
+
+    def test_cold_cache_does_not_pile_onto_the_api(self):
+        cache.add(f"{self.key}:refresh", 1)  # otro worker ya lo está pidiendo
+        with patch("home.utils.instagram.fetch_posts") as fetch:
+            self.assertEqual(instagram.get_posts("token"), ([], 0))
+        fetch.assert_not_called()
+
+    def test_profile_has_its_own_ttl_and_timestamp(self):
+        with patch("home.utils.instagram.fetch_posts", return_value=[]), \
+                patch("home.utils.instagram.fetch_profile", return_value={"id": "1", "username": "natursur"}) as fetch_profile:
+            _, posts_ts = instagram.get_posts("token")
+            profile, profile_ts = instagram.get_profile("token")
+            self.assertEqual(profile["username"], "natursur")
+            # Caduca el feed pero no el perfil
+            cache.set(self.key, {"value": [], "ts": time.time() - 301})
+            instagram.get_posts("token")
+            instagram.get_profile("token")
+        self.assertEqual(len(self.spawned), 1)
+        self.assertEqual(fetch_profile.call_count, 1)
+        self.assertEqual(cache.get(instagram.PROFILE_KEY)["ts"], profile_ts)
+
+    def test_no_token_means_no_calls(self):
+        with patch("home.utils.instagram.fetch_posts") as fetch:
+            self.assertEqual(instagram.get_posts(None), ([], 0))
+            self.assertEqual(instagram.get_profile(""), (None, 0))
+        fetch.assert_not_called()
+
+
+class _QuietHTTPServer(http.server.ThreadingHTTPServer):
+    """Test server that ignores clients hanging up early (timeouts, deadlines) instead
+    of printing a BrokenPipe traceback for each; other errors are still reported."""
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class _FakeGraphHandler(http.server.BaseHTTPRequestHandler):
+    """Mimics graph.instagram.com: ``server.media`` is the /me/media payload and
+    ``server.children`` maps carousel ids to their children (served after ``server.child_delay``)."""
+
+    def do_GET(self):
+        parts = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(parts.query)
+        server = self.server
+        with server.lock:
+            server.requests.append(parts.path)
+        if parts.path == "/me/media":
+            payload = {"data": [
+                m if "children" in query["fields"][0] else {k: v for k, v in m.items() if k != "children"}
+                for m in server.media
+            ]}
+        else:
+            time.sleep(server.child_delay)
+            payload = {"children": {"data": server.children.get(parts.path.strip("/"), [])}}
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class InstagramFetchTests(TestCase):
+
+    def setUp(self):
+        server = _QuietHTTPServer(("127.0.0.1", 0), _FakeGraphHandler)
+        server.daemon_threads = True
+        server.lock = threading.Lock()
+        server.requests = []
+        server.child_delay = 0
+        server.children = {}
+        server.media = [{"id": "img", "media_type": "IMAGE", "media_url": "https://cdn.test/img.jpg", "permalink": "p0"}]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        graph = override_settings(INSTAGRAM_GRAPH_URL=f"http://127.0.0.1:{server.server_port}")
+        graph.enable()
+        self.addCleanup(graph.disable)
+
+    def _carousels(self, n, expanded):
+        for i in range(n):
+            child = [{"media_type": "IMAGE", "media_url": f"https://cdn.test/c{i}.jpg"}]
+            post = {"id": f"c{i}", "media_type": "CAROUSEL_ALBUM", "permalink": f"p{i}"}
+            if expanded:
+                post["children"] = {"data": child}
+            self.server.media.append(post)
+            self.server.children[f"c{i}"] = child
+
+    def test_carousel_children_come_in_one_request(self):
+        self._carousels(5, expanded=True)
+        posts = instagram.fetch_posts("token", limit=6)
+        self.assertEqual(self.server.requests, ["/me/media"])
+        self.assertEqual([p["media_url"] for p in posts[1:]], [f"https://cdn.test/c{i}.jpg" for i in range(5)])
+
+    def test_missing_children_are_fetched_concurrently(self):
+        self._carousels(4, expanded=False)
+        self.server.child_delay = 0.3
+        start = time.monotonic()
+        posts = instagram.fetch_posts("token", limit=6)
+        elapsed = time.monotonic() - start
+        self.assertEqual([p["media_url"] for p in posts[1:]], [f"https://cdn.test/c{i}.jpg" for i in range(4)])
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertLess(elapsed, 0.3 * 4)  # en serie serían 1.2 s
+
+    def test_total_latency_is_bounded_by_budget(self):
+        self._carousels(3, expanded=False)
+        self.server.child_delay = 1
+        start = time.monotonic()
+        posts = instagram.fetch_posts("token", limit=6, budget=0.3)
+        self.assertLess(time.monotonic() - start, 0.8)
+        self.assertEqual(posts[0]["media_url"], "https://cdn.test/img.jpg")
+        self.assertEqual([p["media_url"] for p in posts[1:]], [None, None, None])
+
+    def test_videos_use_their_thumbnail(self):
+        self.server.media = [
+            {"id": "v", "media_type": "VIDEO", "media_url": "https://cdn.test/v.mp4",
+             "thumbnail_url": "https://cdn.test/v.jpg", "permalink": "p0"},
+            {"id": "c", "media_type": "CAROUSEL_ALBUM", "permalink": "p1", "children": {"data": [
+                {"media_type": "VIDEO", "media_url": "https://cdn.test/c.mp4", "thumbnail_url": "https://cdn.test/c.jpg"},
+            ]}},
+        ]
+        posts = instagram.fetch_posts("token")
+        self.assertEqual([p["media_url"] for p in posts], ["https://cdn.test/v.jpg", "https://cdn.test/c.jpg"])
+
+    def test_unreachable_api_raises(self):
+        with override_settings(INSTAGRAM_GRAPH_URL="http://127.0.0.1:9"):
+            with self.assertRaises(instagram.InstagramError):
+                instagram.fetch_posts("token", budget=1)
+
+
+@override_settings(INSTAGRAM_ACCESS_TOKEN="token", INSTAGRAM_MEDIA_MIRROR=False, HOME_DEADLINE=0.2)
+class HomeDeadlineTests(TestCase):
+    """Slow Graph API on a cold cache: the home page doesn't wait past HOME_DEADLINE."""
+
+    def setUp(self):
+        cache.clear()
+        Articulo.objects.create(nombre="Aloe", descripcion="d")
+        self.release = threading.Event()
+        self.threads = []
+
+        def spawn(func):
+            thread = threading.Thread(target=func, daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+        def slow(value):
+            def fetch(*args, **kwargs):
+                self.release.wait(5)
+                return value
+            return fetch
+
+        patchers = [
+            patch("home.utils.instagram._spawn", side_effect=spawn),
+            patch("home.utils.instagram.fetch_posts", slow([{"media_url": "https://cdn.test/1.jpg", "permalink": "p1"}])),
+            patch("home.utils.instagram.fetch_profile", slow({"id": "1", "username": "natursur"})),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(cache.clear)
+        self.addCleanup(lambda: [thread.join(5) for thread in self.threads])
+        self.addCleanup(self.release.set)
+
+    def test_page_renders_within_deadline_and_cache_fills_afterwards(self):
+        start = time.monotonic()
+        response = self.client.get(reverse("home"))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertContains(response, "Aloe")
+        self.assertNotContains(response, "https://cdn.test/1.jpg")
+
+        self.release.set()
+        for thread in self.threads:
+            thread.join(5)
+        self.assertEqual(instagram.get_posts("token")[0][0]["permalink"], "p1")
+        self.assertContains(self.client.get(reverse("home")), "https://cdn.test/1.jpg")
+
+    async def test_feed_and_profile_are_fetched_concurrently(self):
+        start = time.monotonic()
+        response = await self.async_client.get(reverse("home"))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.threads), 2)  # feed y perfil a la vez
+
+    async def test_fresh_entries_are_read_without_threads(self):
+        await cache.aset(f"{instagram.POSTS_KEY}:6", {"value": [{"permalink": "p0"}], "ts": time.time()})
+        self.assertEqual((await instagram.aget_posts("token", timeout=0.1))[0], [{"permalink": "p0"}])
+        self.assertEqual(self.threads, [])
+
+    async def test_stale_copy_is_served_without_waiting(self):
+        await cache.aset(instagram.PROFILE_KEY, {"value": {"username": "viejo"}, "ts": 0})
+        start = time.monotonic()
+        profile, _ = await instagram.aget_profile("token", timeout=1)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(profile, {"username": "viejo"})
+
+
 # ===========================
 
 # Tests de vista: catálogo y API
@@ -51,6 +335,7 @@ class CatalogViewTests(TestCase):
 
 
     def setUp(self):
+        cache.clear()
         self.client = Client()
         for i in range(15):
             Articulo.objects.create(nombre=f"Prod {i}", descripcion="d")
@@ -68,6 +353,553 @@ class CatalogViewTests(TestCase):
         self.assertFalse(data["has_next"])
         self.assertEqual(len(data["products"]), 3)  # los 3 restantes
 
+    def test_products_api_cursor_walks_all_products(self):
+        """El modo cursor recorre todo el catálogo sin repetir ni saltar productos."""
+        seen = []
+        cursor = ""
+        while True:
+            response = self.client.get(reverse("products_api"), {"cursor": cursor, "per_page": 5})
+            data = response.json()
+            seen.extend(p["nombre"] for p in data["products"])
+            if not data["has_next"]:
+                self.assertIsNone(data["next_cursor"])
+                break
+            cursor = data["next_cursor"]
+        self.assertEqual(seen, [f"Prod {i}" for i in range(15)])
+
+    def test_products_api_cursor_skips_count_query(self):
+        """Una página en modo cursor es una única consulta (sin COUNT)."""
+        first = Articulo.objects.order_by("id").first()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("products_api"), {"after_id": first.id, "per_page": 3})
+        data = response.json()
+        self.assertEqual([p["nombre"] for p in data["products"]], ["Prod 1", "Prod 2", "Prod 3"])
+        self.assertTrue(data["has_next"])
+
+    def test_products_api_cursor_with_search(self):
+        response = self.client.get(reverse("products_api"), {"cursor": "", "search": "Prod 1", "per_page": 4})
+        data = response.json()
+        self.assertEqual([p["nombre"] for p in data["products"]], ["Prod 1", "Prod 10", "Prod 11", "Prod 12"])
+        response = self.client.get(reverse("products_api"), {"cursor": data["next_cursor"], "search": "Prod 1", "per_page": 4})
+        data = response.json()
+        self.assertEqual([p["nombre"] for p in data["products"]], ["Prod 13", "Prod 14"])
+        self.assertFalse(data["has_next"])
+
+    def test_products_api_invalid_cursor(self):
+        response = self.client.get(reverse("products_api"), {"cursor": "@@@"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_products_api_rejects_non_integer_paging(self):
+        for params in ({"per_page": "doce"}, {"per_page": "1.5"}, {"page": "x"}, {"cursor": "", "per_page": "x"}):
+            with self.subTest(params):
+                response = self.client.get(reverse("products_api"), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("entero", response.json()["error"])
+
+    def test_products_api_clamps_paging(self):
+        def count(**params):
+            return len(self.client.get(reverse("products_api"), params).json()["products"])
+
+        self.assertEqual(count(per_page=0), 1)
+        self.assertEqual(count(per_page=-5, cursor=""), 1)
+        with patch("home.views.MAX_PER_PAGE", 4):
+            self.assertEqual(count(per_page=1000), 4)
+            self.assertEqual(count(per_page=1000, cursor=""), 4)
+        data = self.client.get(reverse("products_api"), {"page": -1}).json()
+        self.assertEqual(data["products"][0]["nombre"], "Prod 0")
+
+
+# ===========================
+
+# Tests de filtros de precio y ordenación
+
+# ===========================
+
+class ProductFilterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        data = [("Crema", "12.00", None), ("Aloe", "5.50", "https://herbalife.test/aloe"),
+                ("Batido", "30.00", "https://herbalife.test/batido"), ("Té", "5.50", ""), ("Barrita", "2.00", None)]
+        for nombre, price, url in data:
+            Articulo.objects.create(nombre=nombre, descripcion="d", price=price, herbalife_url=url)
+
+    def _names(self, **params):
+        response = self.client.get(reverse("products_api"), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [p["nombre"] for p in response.json()["products"]]
+
+    def test_price_range(self):
+        self.assertEqual(self._names(min_price="5", max_price="12"), ["Crema", "Aloe", "Té"])
+
+    def test_sorts(self):
+        self.assertEqual(self._names(sort="price"), ["Barrita", "Aloe", "Té", "Crema", "Batido"])
+        self.assertEqual(self._names(sort="-price"), ["Batido", "Crema", "Té", "Aloe", "Barrita"])
+        self.assertEqual(self._names(sort="nombre"), ["Aloe", "Barrita", "Batido", "Crema", "Té"])
+
+    def test_herbalife_flag(self):
+        self.assertEqual(self._names(herbalife="1"), ["Aloe", "Batido"])
+        self.assertEqual(self._names(herbalife="0"), ["Crema", "Té", "Barrita"])
+
+    def test_cursor_pagination_follows_sort_with_ties(self):
+        for sort, expected in [("price", ["Barrita", "Aloe", "Té", "Crema", "Batido"]),
+                               ("-price", ["Batido", "Crema", "Té", "Aloe", "Barrita"]),
+                               ("nombre", ["Aloe", "Barrita", "Batido", "Crema", "Té"])]:
+            seen, cursor = [], ""
+            while cursor is not None:
+                data = self.client.get(reverse("products_api"), {"cursor": cursor, "sort": sort, "per_page": 2}).json()
+                seen.extend(p["nombre"] for p in data["products"])
+                cursor = data["next_cursor"]
+            self.assertEqual(seen, expected, sort)
+
+    def test_cursor_from_other_sort_is_rejected(self):
+        data = self.client.get(reverse("products_api"), {"cursor": "", "sort": "price", "per_page": 1}).json()
+        response = self.client.get(reverse("products_api"), {"cursor": data["next_cursor"], "sort": "nombre"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_parameters(self):
+        for params in ({"min_price": "barato"}, {"sort": "descripcion"}, {"herbalife": "si"}):
+            self.assertEqual(self.client.get(reverse("products_api"), params).status_code, 400)
+
+
+class ProductQueryPlanTests(TestCase):
+    """EXPLAIN de cada forma de consulta admitida (ver Articulo.Meta).
+
+    Ninguna recorre la tabla, ordena en memoria ni recorre un índice entero
+    descartando filas: o hay rango sobre el índice o el índice solo contiene
+    (índice parcial) las filas pedidas y el LIMIT corta el recorrido.
+    """
+
+    SHAPES = {
+        "rango + sort=price": (Decimal("1"), Decimal("5"), None, "price"),
+        "rango + sort=-price": (Decimal("1"), None, None, "-price"),
+        "sort=price": (None, None, None, "price"),
+        "sort=-price": (None, None, None, "-price"),
+        "sort=nombre": (None, None, None, "nombre"),
+        "herbalife": (None, None, "1", None),
+        "herbalife + sort=price": (None, None, "1", "price"),
+        "herbalife + rango + sort=price": (Decimal("1"), Decimal("5"), "1", "price"),
+        "sin herbalife": (None, None, "0", None),
+        "sin herbalife + sort=price": (None, None, "0", "price"),
+        "sin herbalife + rango + sort=-price": (Decimal("1"), Decimal("5"), "0", "-price"),
+    }
+    # Índices parciales que ya contienen solo las filas de cada valor de herbalife
+    PARTIAL_INDEXES = {
+        "1": {"articulo_herbalife_price_idx", "articulo_herbalife_id_idx"},
+        "0": {"articulo_noherbalife_price_idx", "articulo_noherbalife_id_idx"},
+    }
+
+    def setUp(self):
+        for i in range(50):
+            Articulo.objects.create(nombre=f"P{i}", descripcion="d", price=i,
+                                    herbalife_url=f"https://h.test/{i}" if i % 3 else None)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE home_articulo")
+                # con tablas diminutas el planner siempre prefiere Seq Scan; solo queremos ver si puede evitarlo
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertIndexed(self, qs, filters, label):
+        min_price, max_price, herbalife, _ = filters
+        plan = qs.explain()
+        message = f"{label}: {plan}"
+        if connection.vendor == "postgresql":
+            self.assertNotIn("Seq Scan", plan, message)
+            self.assertNotRegex(plan, r"\bSort\b", message)
+            # Un Index Scan sin "Index Cond" que descarta filas con "Filter" recorre el índice entero
+            if "Index Cond" not in plan:
+                self.assertNotIn("Filter:", plan, message)
+            return
+        # SQLite: "SCAN home_articulo" a secas es un recorrido de la tabla, "TEMP B-TREE" una ordenación
+        self.assertNotRegex(plan, r"SCAN home_articulo(?! USING)", message)
+        self.assertNotIn("TEMP B-TREE", plan, message)
+        # "SCAN ... USING INDEX" recorre el índice sin rango: solo vale si no hay filas que descartar
+        walk = re.search(r"SCAN home_articulo USING (?:COVERING )?INDEX (\w+)", plan)
+        if walk:
+            self.assertTrue(min_price is None and max_price is None, message)
+            if herbalife is not None:
+                self.assertIn(walk.group(1), self.PARTIAL_INDEXES[herbalife], message)
+
+    def test_supported_shapes_use_indexes(self):
+        for label, filters in self.SHAPES.items():
+            with self.subTest(label):
+                qs = views._products_queryset("", filters)[:13]
+                self.assertIndexed(qs, filters, label)
+
+    def test_keyset_seek_uses_indexes(self):
+        for label, filters in self.SHAPES.items():
+            sort = filters[3] or "id"
+            key = "P3" if sort == "nombre" else Decimal("3")
+            with self.subTest(label):
+                qs = views._products_queryset("", filters).filter(views._seek(sort, key, 10))[:13]
+                self.assertIndexed(qs, filters, label)
+
+
+# ===========================
+
+# Tests de búsqueda de texto completo
+
+# ===========================
+
+class ProductSearchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.te = Articulo.objects.create(nombre="Té verde", descripcion="Infusión de hierbas")
+        self.batido = Articulo.objects.create(nombre="Batido", descripcion="Sabor té chai")
+        Articulo.objects.create(nombre="Crema", descripcion="Hidratante")
+
+    def _search(self, q):
+        response = self.client.get(reverse("products_api"), {"search": q})
+        return [p["nombre"] for p in response.json()["products"]]
+
+    def test_search_matches_descripcion(self):
+        self.assertEqual(self._search("hierbas"), ["Té verde"])
+
+    def test_search_is_accent_insensitive(self):
+        self.assertEqual(set(self._search("te")), {"Té verde", "Batido"})
+        self.assertEqual(self._search("infusion"), ["Té verde"])
+
+    def test_search_ranks_name_and_description_matches(self):
+        Articulo.objects.create(nombre="Té té", descripcion="té")
+        self.assertEqual(self._search("te")[0], "Té té")
+
+    def test_search_index_follows_updates_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.te.nombre = "Café"
+            self.te.descripcion = "Tostado"
+            self.te.save()
+        self.assertEqual(self._search("cafe"), ["Café"])
+        self.assertEqual(self._search("hierbas"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batido.delete()
+        self.assertEqual(self._search("chai"), [])
+
+    def test_search_without_tokens_returns_nothing(self):
+        self.assertEqual(self._search("!!!"), [])
+
+
+# ===========================
+
+# Tests de caché del catálogo
+
+# ===========================
+
+class CatalogCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.articulo = Articulo.objects.create(nombre="Aloe", descripcion="Bebida")
+
+    def test_second_request_is_served_from_cache(self):
+        url = reverse("products_api") + "?page=1"
+        first = self.client.get(url)
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(first.json(), second.json())
+
+    def test_save_and_delete_invalidate_cached_pages(self):
+        url = reverse("products_api") + "?cursor="
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.articulo.nombre = "Aloe Max"
+            self.articulo.save()
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["products"][0]["nombre"], "Aloe Max")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.articulo.delete()
+        self.assertEqual(self.client.get(url).json()["products"], [])
+
+    def test_catalog_page_shares_cache_with_api(self):
+        self.client.get(reverse("catalog"))
+        response = self.client.get(reverse("products_api") + "?cursor=&per_page=12")
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_stats_count_hits_and_misses(self):
+        url = reverse("products_api") + "?page=1"
+        self.client.get(url)
+        self.client.get(url)
+        self.client.get(url)
+        stats = catalog_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    @override_settings(CATALOG_CACHE_TTL=0)
+    def test_ttl_zero_disables_cache(self):
+        url = reverse("products_api") + "?page=1"
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+    def test_version_survives_eviction_without_reuse(self):
+        bumped = catalog_cache.bump_version()
+        cache.delete(catalog_cache.VERSION_KEY)
+        self.assertGreater(catalog_cache.get_version(), bumped)
+
+
+# ===========================
+
+# Tests de caché de fragmentos de plantilla
+
+# ===========================
+
+class FragmentCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        for i in range(3):
+            Articulo.objects.create(nombre=f"Prod {i}", descripcion="d")
+
+    def test_index_hit_runs_no_queries(self):
+        self.client.get(reverse("home"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("home"))
+        self.assertContains(response, "Prod 2")
+
+    def test_catalog_hit_runs_no_queries(self):
+        self.client.get(reverse("catalog"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("catalog"))
+        self.assertContains(response, "Prod 1")
+
+    def test_catalog_change_refreshes_fragments(self):
+        self.client.get(reverse("home"))
+        self.client.get(reverse("catalog"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Articulo.objects.create(nombre="Nuevo", descripcion="d")
+        self.assertContains(self.client.get(reverse("home")), "Nuevo")
+        self.assertContains(self.client.get(reverse("catalog")), "Nuevo")
+
+    @override_settings(INSTAGRAM_ACCESS_TOKEN="token", INSTAGRAM_MEDIA_MIRROR=False)
+    def test_instagram_fragment_follows_refresh_timestamp(self):
+        post = {"media_url": "https://cdn.test/1.jpg", "permalink": "https://instagram.test/p/1", "caption": "Hola"}
+        with patch("home.utils.instagram.fetch_profile", return_value=None), \
+                patch("home.utils.instagram.fetch_posts", return_value=[post]) as fetch:
+            self.assertContains(self.client.get(reverse("home")), "cdn.test/1.jpg")
+            self.client.get(reverse("home"))
+            self.assertEqual(fetch.call_count, 1)  # segunda visita servida desde el fragmento
+
+            # Un refresco del feed cambia su marca de tiempo y con ella la clave del fragmento
+            new_post = dict(post, media_url="https://cdn.test/2.jpg")
+            cache.set(f"{instagram.POSTS_KEY}:6", {"value": [new_post], "ts": time.time() + 1})
+            self.assertContains(self.client.get(reverse("home")), "cdn.test/2.jpg")
+
+    @override_settings(CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "fragments": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+    })
+    def test_fragment_cache_can_be_disabled(self):
+        self.client.get(reverse("home"))
+        # Sin fragmentos se vuelve a renderizar, pero el escaparate sigue en su propia caché
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("home"))
+        self.assertContains(response, "Prod 2")
+
+
+@override_settings(SHOWCASE_SIZE=3)
+class ShowcaseTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.articulos = [Articulo.objects.create(nombre=f"Prod {i}", descripcion="d") for i in range(6)]
+
+    def _carousel(self):
+        return re.findall(r"<h3>(.*?)</h3>", self.client.get(reverse("home")).content.decode())
+
+    def test_ordered_by_position_and_capped(self):
+        for posicion, i in enumerate([4, 1, 5, 2]):
+            Escaparate.objects.create(articulo=self.articulos[i], posicion=posicion)
+        self.assertEqual(self._carousel(), ["Prod 4", "Prod 1", "Prod 5"])
+
+    def test_without_showcase_the_first_products_stand_in(self):
+        self.assertEqual(self._carousel(), ["Prod 0", "Prod 1", "Prod 2"])
+
+    def test_bounded_queries_whatever_the_catalog_size(self):
+        Escaparate.objects.create(articulo=self.articulos[0])
+        with self.assertNumQueries(2):  # escaparate con select_related + próximo cambio de ventana
+            showcase.build()
+        Articulo.objects.bulk_create([Articulo(nombre=f"Extra {i}", descripcion="d") for i in range(200)])
+        with self.assertNumQueries(2):
+            articulos, _ = showcase.build()
+        self.assertEqual(articulos, [self.articulos[0]])
+
+    def test_active_window(self):
+        now = timezone.now()
+        Escaparate.objects.create(articulo=self.articulos[0], activo_hasta=now - timedelta(hours=1))
+        Escaparate.objects.create(articulo=self.articulos[1], activo_desde=now - timedelta(days=1))
+        Escaparate.objects.create(articulo=self.articulos[2], activo_desde=now + timedelta(hours=2))
+        Escaparate.objects.create(articulo=self.articulos[3], activo_hasta=now + timedelta(hours=1))
+        articulos, seconds_valid = showcase.build(now)
+        self.assertEqual([a.nombre for a in articulos], ["Prod 1", "Prod 3"])
+        # La caché caduca cuando termina la ventana más próxima (Prod 3 dentro de una hora)
+        self.assertAlmostEqual(seconds_valid, 3600, delta=1)
+        self.assertEqual([a.nombre for a in showcase.build(now + timedelta(hours=3))[0]], ["Prod 1", "Prod 2"])
+
+    def test_cached_and_invalidated_by_showcase_and_article_changes(self):
+        entry = Escaparate.objects.create(articulo=self.articulos[0])
+        self.assertEqual(self._carousel(), ["Prod 0"])
+        with self.assertNumQueries(0):
+            self.assertEqual(showcase.get_items()[0], [self.articulos[0]])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.articulo = self.articulos[1]
+            entry.save()
+        self.assertEqual(self._carousel(), ["Prod 1"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.articulos[1].nombre = "Renombrado"
+            self.articulos[1].save()
+        self.assertEqual(self._carousel(), ["Renombrado"])
+
+
+# ===========================
+
+# Tests de peticiones condicionales (ETag / 304)
+
+# ===========================
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        with self.captureOnCommitCallbacks(execute=True):
+            Articulo.objects.create(nombre="Aloe", descripcion="Bebida")
+            Reservation.objects.create(nombre="Ana", fecha="2025-01-05", hora="10:00")
+
+    def test_products_api_returns_304_without_queries(self):
+        url = reverse("products_api") + "?page=1"
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('"'))  # ETag fuerte
+        self.assertIn("no-cache", response["Cache-Control"])
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_products_api_etag_changes_with_catalog(self):
+        url = reverse("products_api") + "?page=1"
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Articulo.objects.create(nombre="Té", descripcion="Verde")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_reservations_api_revalidates(self):
+        url = reverse("get_reservations") + "?month=2025-01"
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Reservation.objects.create(nombre="Luis", fecha="2025-01-05", hora="11:00")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("11:00", response.json()["2025-01-05"])
+
+    def test_available_slots_revalidates(self):
+        url = reverse("available_slots") + "?date=2025-01-05"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_available_slots_etag_changes_when_a_slot_starts(self):
+        url = reverse("available_slots") + "?date=2030-03-04"
+        with patch("home.utils.availability.now", return_value=datetime(2030, 3, 4, 9, 40)):
+            first = self.client.get(url)
+            self.assertEqual(first.json()["days"]["2030-03-04"][0]["hora"], "10:00")
+        with patch("home.utils.availability.now", return_value=datetime(2030, 3, 4, 9, 59)):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+        with patch("home.utils.availability.now", return_value=datetime(2030, 3, 4, 10, 0)):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["days"]["2030-03-04"][0]["hora"], "11:00")
+            # Solo con If-Modified-Since tampoco se queda con la lista vieja
+            since = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+            self.assertEqual(since.status_code, 200)
+
+    @override_settings(CACHE_LOCAL_ALLOWED=False)
+    def test_no_validators_from_a_per_process_cache(self):
+        # Una versión incrementada por el worker no llegaría a esta caché: nada de 304 eternos
+        url = reverse("products_api") + "?page=1"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+        self.assertIn("no-cache", response["Cache-Control"])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"%s"' % versioning.get_version("catalog"))
+        self.assertEqual(response.status_code, 200)
+
+
+class VersionAfterCommitTests(TransactionTestCase):
+    """A reader that runs while a write is still uncommitted must not get the new version."""
+
+    def setUp(self):
+        cache.clear()
+
+    def _get_from_other_connection(self, url, **headers):
+        result = {}
+
+        def run():
+            try:
+                result["response"] = Client().get(url, **headers)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        return result["response"]
+
+    def test_reservations_etag_changes_after_commit(self):
+        url = reverse("get_reservations") + "?month=2030-03"
+        with transaction.atomic():
+            Reservation.objects.create(nombre="Ana", fecha=date(2030, 3, 4), hora="10:00")
+            during = self._get_from_other_connection(url)
+        self.assertEqual(during.json(), {})
+
+        after = self._get_from_other_connection(url, HTTP_IF_NONE_MATCH=during["ETag"])
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual(after.json(), {"2030-03-04": ["10:00"]})
+
+    def test_catalog_page_built_before_commit_is_not_kept(self):
+        url = reverse("products_api") + "?page=1"
+        with transaction.atomic():
+            Articulo.objects.create(nombre="Nuevo", descripcion="d")
+            during = self._get_from_other_connection(url)
+        self.assertEqual(during.json()["products"], [])
+
+        after = self._get_from_other_connection(url)
+        self.assertEqual([p["nombre"] for p in after.json()["products"]], ["Nuevo"])
+
+
+class SharedCacheCheckTests(TestCase):
+    """Outside development the version counters must live in a cache every process sees."""
+
+    def test_local_cache_warns_outside_development(self):
+        with override_settings(CACHE_LOCAL_ALLOWED=False):
+            self.assertFalse(versioning.is_shared())
+            self.assertEqual([w.id for w in checks.check_shared_cache(None)], ["home.W001"])
+
+    def test_shared_backend_passes(self):
+        shared = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "natursur_cache"}}
+        with override_settings(CACHE_LOCAL_ALLOWED=False, CACHES=shared):
+            self.assertTrue(versioning.is_shared())
+            self.assertEqual(checks.check_shared_cache(None), [])
+
+    def test_development_allows_local_cache(self):
+        with override_settings(CACHE_LOCAL_ALLOWED=True):
+            self.assertEqual(checks.check_shared_cache(None), [])
+
 
 # ===========================
 
@@ -84,20 +916,246 @@ class ProductDetailTests(TestCase):
             nombre="Producto Herbalife",
             descripcion="d"
         )
+        self.url = reverse("product_detail", args=[self.articulo.id])
+        self.status_url = reverse("herbalife_status", args=[self.articulo.id])
 
-    @patch("home.views.scrape_herbalife_product", return_value="https://herbalife.test/producto")
-    def test_redirects_to_herbalife(self, mock_scrape):
-        url = reverse("product_detail", args=[self.articulo.id])
-        response = self.client.get(url)
+    def test_known_url_redirects_without_lookup(self):
+        self.articulo.herbalife_url = "https://herbalife.test/producto"
+        self.articulo.save()
+        with patch("home.tasks.lookup_herbalife_product") as mock_find:
+            response = self.client.get(self.url)
         self.assertEqual(response.status_code, 302)
         self.assertIn("herbalife.test", response["Location"])
+        mock_find.assert_not_called()
+        self.assertFalse(Job.objects.exists())
 
-    @patch("home.views.scrape_herbalife_product", return_value=None)
-    def test_herbalife_not_found(self, mock_scrape):
-        url = reverse("product_detail", args=[self.articulo.id])
-        response = self.client.get(url)
+    def test_unknown_url_enqueues_lookup_instead_of_blocking(self):
+        with patch("home.tasks.lookup_herbalife_product") as mock_find:
+            response = self.client.get(self.url)
+            self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Comprobando disponibilidad")
+        self.assertContains(response, self.status_url)
+        mock_find.assert_not_called()
+        # Dos visitas, un único trabajo en cola
+        self.assertEqual(Job.objects.filter(key=f"herbalife:{self.articulo.id}").count(), 1)
+
+    @patch("home.tasks.lookup_herbalife_product", return_value="https://herbalife.test/producto")
+    def test_redirects_to_herbalife(self, mock_find):
+        self.client.get(self.url)
+        self.assertEqual(self.client.get(self.status_url).json()["status"], "pending")
+        jobs.drain()
+
+        data = self.client.get(self.status_url).json()
+        self.assertEqual(data, {"status": "found", "herbalife_url": "https://herbalife.test/producto"})
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("herbalife.test", response["Location"])
+        self.articulo.refresh_from_db()
+        self.assertEqual(self.articulo.herbalife_url, "https://herbalife.test/producto")
+
+    @patch("home.tasks.lookup_herbalife_product", return_value=None)
+    def test_herbalife_not_found(self, mock_find):
+        self.client.get(self.url)
+        jobs.drain()
+        response = self.client.get(self.url)
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Oops, este Herbalife no vende este producto")
+        self.assertEqual(self.client.get(self.status_url).json()["status"], "not_found")
+        self.assertEqual(mock_find.call_count, 1)
+
+
+class HerbalifeLookupStateTests(TestCase):
+
+    def setUp(self):
+        self.articulo = Articulo.objects.create(nombre="Producto Herbalife", descripcion="d")
+        self.url = reverse("product_detail", args=[self.articulo.id])
+
+    def _lookup(self, **kwargs):
+        with patch("home.tasks.lookup_herbalife_product", **kwargs) as mock_find:
+            self.client.get(self.url)
+            jobs.drain()
+        self.articulo.refresh_from_db()
+        return mock_find
+
+    def test_not_found_short_circuits_until_ttl(self):
+        self._lookup(return_value=None)
+        self.assertEqual(self.articulo.herbalife_status, Articulo.HERBALIFE_NOT_FOUND)
+        self.assertIsNotNone(self.articulo.herbalife_checked_at)
+
+        mock_find = self._lookup(return_value=None)
+        mock_find.assert_not_called()
+        self.assertFalse(Job.objects.filter(status=Job.QUEUED).exists())
+
+        # Caducado el resultado negativo se vuelve a comprobar
+        Articulo.objects.filter(pk=self.articulo.pk).update(herbalife_recheck_after=timezone.now() - timedelta(seconds=1))
+        mock_find = self._lookup(return_value="https://herbalife.test/p")
+        mock_find.assert_called_once()
+        self.assertEqual(self.articulo.herbalife_status, Articulo.HERBALIFE_FOUND)
+
+    @override_settings(HERBALIFE_ERROR_TTL=60, HERBALIFE_ERROR_MAX_TTL=150)
+    def test_errors_back_off_exponentially(self):
+        delays = []
+        for _ in range(3):
+            Articulo.objects.filter(pk=self.articulo.pk).update(herbalife_recheck_after=None)
+            self._lookup(side_effect=requests.ConnectionError("caído"))
+            delays.append((self.articulo.herbalife_recheck_after - self.articulo.herbalife_checked_at).total_seconds())
+        self.assertEqual(delays, [60, 120, 150])
+        self.assertEqual(self.articulo.herbalife_failures, 3)
+        self.assertEqual(self.articulo.herbalife_status, Articulo.HERBALIFE_ERROR)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.client.get(reverse("herbalife_status", args=[self.articulo.id])).json()["status"], "error")
+
+    def test_error_keeps_previously_found_url(self):
+        self._lookup(return_value="https://herbalife.test/p")
+        Articulo.objects.filter(pk=self.articulo.pk).update(herbalife_recheck_after=timezone.now())
+        # Sigue redirigiendo mientras se re-verifica en segundo plano
+        with patch("home.tasks.lookup_herbalife_product", side_effect=requests.Timeout()):
+            response = self.client.get(self.url)
+            jobs.drain()
+        self.assertEqual(response.status_code, 302)
+        self.articulo.refresh_from_db()
+        self.assertEqual(self.articulo.herbalife_url, "https://herbalife.test/p")
+        self.assertEqual(self.articulo.herbalife_status, Articulo.HERBALIFE_ERROR)
+
+    def test_admin_force_refresh(self):
+        self._lookup(return_value=None)
+        staff = User.objects.create_superuser("admin", "a@example.com", "pw")
+        self.client.force_login(staff)
+        with patch("home.tasks.lookup_herbalife_product", return_value="https://herbalife.test/p") as mock_find:
+            response = self.client.post(reverse("admin:home_articulo_changelist"), {
+                "action": "refresh_herbalife",
+                "_selected_action": [self.articulo.id],
+            })
+            jobs.drain()
+        self.assertEqual(response.status_code, 302)
+        mock_find.assert_called_once()
+        self.articulo.refresh_from_db()
+        self.assertEqual(self.articulo.herbalife_url, "https://herbalife.test/p")
+
+    def test_admin_force_refresh_is_not_swallowed_by_a_queued_lookup(self):
+        self._lookup(return_value=None)
+        # Una visita deja en cola una comprobación sin forzar, que se saltaría el resultado vigente
+        jobs.enqueue(tasks.lookup_herbalife, key=tasks.herbalife_lookup_key(self.articulo.id), articulo_id=self.articulo.id)
+        staff = User.objects.create_superuser("admin", "a@example.com", "pw")
+        self.client.force_login(staff)
+        with patch("home.tasks.lookup_herbalife_product", return_value="https://herbalife.test/p") as mock_find:
+            self.client.post(reverse("admin:home_articulo_changelist"), {
+                "action": "refresh_herbalife",
+                "_selected_action": [self.articulo.id],
+            })
+            jobs.drain()
+        mock_find.assert_called_once()
+        self.articulo.refresh_from_db()
+        self.assertEqual(self.articulo.herbalife_url, "https://herbalife.test/p")
+
+    def test_manual_url_is_not_rechecked(self):
+        self.articulo.herbalife_url = "https://herbalife.test/manual"
+        self.articulo.save()
+        self.assertFalse(herbalife.is_due(self.articulo))
+        self.assertFalse(Articulo.objects.filter(herbalife.due_q(), pk=self.articulo.pk).exists())
+
+
+# ===========================
+
+# Tests de la cola de trabajos
+
+# ===========================
+
+def _job_ok(value):
+    return {"value": value}
+
+
+def _job_boom():
+    raise RuntimeError("boom")
+
+
+class JobQueueTests(TestCase):
+
+    def test_enqueue_and_run(self):
+        job = jobs.enqueue(_job_ok, value=3)
+        self.assertEqual(job.task, "home.tests._job_ok")
+        self.assertEqual(jobs.drain(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.result, {"value": 3})
+        self.assertEqual(job.attempts, 1)
+
+    def test_key_dedupes_only_while_active(self):
+        first = jobs.enqueue(_job_ok, key="k", value=1)
+        self.assertEqual(jobs.enqueue(_job_ok, key="k", value=2).pk, first.pk)
+        jobs.drain()
+        self.assertNotEqual(jobs.enqueue(_job_ok, key="k", value=3).pk, first.pk)
+
+    def test_supersede_updates_a_queued_job(self):
+        first = jobs.enqueue(_job_ok, key="k", delay=600, value=1)
+        second = jobs.enqueue(_job_ok, key="k", supersede=True, value=2)
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(second.kwargs, {"value": 2})
+        self.assertEqual(jobs.drain(), 1)  # sin esperar al delay del primero
+        self.assertEqual(Job.objects.get(pk=first.pk).result, {"value": 2})
+
+    def test_supersede_follows_a_running_job(self):
+        first = jobs.enqueue(_job_ok, key="k", value=1)
+        running = jobs.claim()
+        follow_up = jobs.enqueue(_job_ok, key="k", supersede=True, value=2)
+        self.assertNotEqual(follow_up.pk, first.pk)
+        self.assertEqual(follow_up.key, "k:next")
+        # Otro clic mientras sigue en marcha: se actualiza el mismo seguimiento
+        self.assertEqual(jobs.enqueue(_job_ok, key="k", supersede=True, value=3).pk, follow_up.pk)
+        jobs.run(running)
+        self.assertEqual(jobs.drain(), 1)
+        self.assertEqual(Job.objects.get(pk=follow_up.pk).result, {"value": 3})
+
+    @override_settings(JOBS_RETRY_BASE_DELAY=0)
+    def test_failures_retry_with_backoff_then_fail(self):
+        job = jobs.enqueue(_job_boom, max_attempts=3)
+        self.assertEqual(jobs.drain(), 3)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertIn("RuntimeError: boom", job.last_error)
+
+    def test_retry_waits_for_backoff(self):
+        job = jobs.enqueue(_job_boom)
+        with patch("home.utils.jobs.backoff", return_value=60):
+            jobs.drain()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=50))
+        self.assertIsNone(jobs.claim())
+
+    def test_claim_is_exclusive_until_visibility_timeout(self):
+        job = jobs.enqueue(_job_ok, value=1)
+        claimed = jobs.claim(timeout=30)
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertIsNone(jobs.claim())
+
+        # El worker "muere": al vencer el plazo otro worker lo reclama...
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        reclaimed = jobs.claim()
+        self.assertEqual(reclaimed.pk, job.pk)
+        self.assertEqual(reclaimed.attempts, 2)
+        # ...y el resultado tardío del primero ya no se registra.
+        jobs.run(claimed)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.RUNNING)
+        jobs.run(reclaimed)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.DONE)
+
+    def test_queues_are_separate(self):
+        jobs.enqueue(_job_ok, queue="lento", value=1)
+        self.assertIsNone(jobs.claim())
+        self.assertIsNotNone(jobs.claim("lento"))
+
+    def test_run_worker_once(self):
+        jobs.enqueue(_job_ok, value=1)
+        jobs.enqueue(_job_ok, value=2)
+        out = StringIO()
+        call_command("run_worker", "--once", stdout=out)
+        self.assertIn("2 trabajos completados", out.getvalue())
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 2)
 
 
 # ===========================
@@ -121,7 +1179,7 @@ class ReservationViewInterfaceTests(TestCase):
         """Verificar que al enviar la reserva se crea un objeto en DB."""
         data = {
             "name": "Carlos",
-            "fecha": "2025-01-02",   # ← Cambiado de 'date' a 'fecha'
+            "fecha": "2030-01-03",   # ← Cambiado de 'date' a 'fecha'
             "hora": "15:00",         # ← Cambiado de 'time' a 'hora'
             "service": "Masaje"
         }
@@ -130,22 +1188,327 @@ class ReservationViewInterfaceTests(TestCase):
         self.assertEqual(Reservation.objects.count(), 1)
         r = Reservation.objects.first()
         self.assertEqual(r.nombre, "Carlos")
-        self.assertEqual(str(r.fecha), "2025-01-02")
+        self.assertEqual(str(r.fecha), "2030-01-03")
         self.assertEqual(str(r.hora), "15:00:00")
         self.assertEqual(r.servicio, "Masaje")
 
 
+class ReservationsCalendarApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        for fecha, hora in (("2025-03-04", "12:00"), ("2025-03-04", "10:00"), ("2025-03-31", "09:00"),
+                            ("2025-04-01", "11:00"), ("2025-02-28", "16:00")):
+            Reservation.objects.create(nombre="Ana", fecha=fecha, hora=hora)
+
+    def _get(self, **params):
+        return self.client.get(reverse("get_reservations"), params)
+
+    def test_month_is_grouped_by_day_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self._get(month="2025-03")
+        self.assertEqual(response.json(), {"2025-03-04": ["10:00", "12:00"], "2025-03-31": ["09:00"]})
+
+    def test_from_to_window_is_inclusive(self):
+        data = self._get(**{"from": "2025-02-28", "to": "2025-03-04"}).json()
+        self.assertEqual(sorted(data), ["2025-02-28", "2025-03-04"])
+
+    def test_default_window_is_the_current_month(self):
+        today = timezone.localdate()
+        Reservation.objects.create(nombre="Hoy", fecha=today, hora="13:00")
+        self.assertEqual(self._get().json(), {today.isoformat(): ["13:00"]})
+
+    def test_invalid_or_oversized_windows_are_rejected(self):
+        self.assertEqual(self._get(month="marzo").status_code, 400)
+        self.assertEqual(self._get(**{"from": "2025-03-10", "to": "2025-03-01"}).status_code, 400)
+        self.assertEqual(self._get(**{"from": "2020-01-01", "to": "2025-01-01"}).status_code, 400)
+
+    def test_window_query_uses_the_fecha_index(self):
+        plan = Reservation.objects.filter(fecha__range=("2025-03-01", "2025-03-31")).values("fecha").explain()
+        self.assertIn("reservation_fecha_hora_idx", plan)
+
+
+@override_settings(
+    RESERVATION_OPENING_HOURS={0: [("09:00", "13:00"), ("16:00", "18:00")], 1: [("09:00", "18:00")]},
+    RESERVATION_HOLIDAYS=["2025-03-11"],
+    RESERVATION_SERVICES={"Masaje relajante": 60, "Masaje terapéutico": 90},
+    RESERVATION_SLOT_STEP=60,
+    RESERVATION_CAPACITY=2,
+)
+class AvailabilityTests(TestCase):
+    # Lunes 3 de marzo de 2025, antes de abrir
+    NOW = datetime(2025, 3, 3, 8, 0)
+
+    def _slots(self, day, servicio="Masaje relajante", current=NOW):
+        fecha = date.fromisoformat(day)
+        return {s["hora"]: s["libres"] for s in availability.free_slots(fecha, fecha, servicio, current)[day]}
+
+    def test_opening_hours_holidays_and_past_times(self):
+        self.assertEqual(list(self._slots("2025-03-03")), ["09:00", "10:00", "11:00", "12:00", "16:00", "17:00"])
+        self.assertEqual(self._slots("2025-03-08"), {})  # sábado: cerrado
+        self.assertEqual(self._slots("2025-03-11"), {})  # festivo
+        self.assertEqual(self._slots("2025-03-02"), {})  # pasado
+        later = datetime(2025, 3, 3, 11, 30)
+        self.assertEqual(list(self._slots("2025-03-03", current=later)), ["12:00", "16:00", "17:00"])
+
+    def test_capacity_and_service_duration(self):
+        Reservation.objects.create(nombre="A", fecha="2025-03-04", hora="10:00", duracion=90)
+        Reservation.objects.create(nombre="B", fecha="2025-03-04", hora="11:00", duracion=60)
+        slots = self._slots("2025-03-04")
+        self.assertEqual((slots["09:00"], slots["10:00"], slots["11:00"], slots["12:00"]), (2, 1, 0, 2))
+        # 90 minutos a las 09:00 pisan el tramo de las 10:00 (un hueco libre) pero no el de las 11:00 (completo)
+        terapeutico = self._slots("2025-03-04", "Masaje terapéutico")
+        self.assertEqual((terapeutico["09:00"], terapeutico["10:00"]), (1, 0))
+        self.assertNotIn("17:00", terapeutico)  # acabaría después del cierre
+        self.assertNotIn("12:00", self._slots("2025-03-03", "Masaje terapéutico (90 min)"))
+
+    def test_occupancy_follows_bookings_moves_and_cancellations(self):
+        reserva = Reservation.objects.create(nombre="A", fecha="2025-03-04", hora="10:00")
+        self.assertEqual(DayOccupancy.objects.get(fecha="2025-03-04").counts,
+                         {"10:00": 1, "10:15": 1, "10:30": 1, "10:45": 1})
+        reserva.fecha = date(2025, 3, 5)
+        reserva.save()
+        self.assertFalse(DayOccupancy.objects.filter(fecha="2025-03-04").exists())
+        self.assertTrue(DayOccupancy.objects.filter(fecha="2025-03-05").exists())
+        reserva.delete()
+        self.assertFalse(DayOccupancy.objects.exists())
+
+    def test_rebuild_matches_incremental_updates(self):
+        Reservation.objects.create(nombre="A", fecha="2025-03-04", hora="10:00", duracion=90)
+        expected = dict(DayOccupancy.objects.values_list("fecha", "counts"))
+        Reservation.objects.bulk_create([Reservation(nombre="B", fecha="2025-03-06", hora="09:00")])
+        DayOccupancy.objects.filter(fecha="2025-03-04").delete()
+        self.assertEqual(availability.rebuild(), 2)
+        self.assertEqual(DayOccupancy.objects.get(fecha="2025-03-04").counts, expected[date(2025, 3, 4)])
+        self.assertIn("09:00", DayOccupancy.objects.get(fecha="2025-03-06").counts)
+
+    def test_month_api_is_a_single_query(self):
+        Reservation.objects.create(nombre="A", fecha="2025-03-04", hora="10:00")
+        url = reverse("available_slots") + "?month=2025-03&service=Masaje+terap%C3%A9utico"
+        with self.assertNumQueries(1):
+            data = self.client.get(url).json()
+        self.assertEqual((data["duration"], data["capacity"]), (90, 2))
+        self.assertEqual(len(data["days"]), 31)
+        self.assertEqual(self.client.get(reverse("available_slots") + "?date=ayer").status_code, 400)
+
+
+@override_settings(RESERVATION_SERVICES={"Masaje relajante": 60, "Masaje terapéutico": 90}, RESERVATION_CAPACITY=1)
+class BookingTests(TestCase):
+
+    def _book(self, hora="10:00", service="Masaje relajante", key=None, fecha="2030-03-04", **extra):
+        data = {"name": "Ana", "fecha": fecha, "hora": hora, "service": service}
+        headers = {"HTTP_IDEMPOTENCY_KEY": key} if key else {}
+        return self.client.post(reverse("reservations"), data, **headers, **extra)
+
+    def test_taken_slot_is_a_409(self):
+        self.assertEqual(self._book().status_code, 200)
+        response = self._book()
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()["success"])
+        # 90 minutos a las 09:00 pisan la reserva de las 10:00; a las 11:00 ya cabe
+        self.assertEqual(self._book("09:00", "Masaje terapéutico").status_code, 409)
+        self.assertEqual(self._book("11:00").status_code, 200)
+        self.assertEqual(Reservation.objects.count(), 2)
+
+    @override_settings(RESERVATION_CAPACITY=2)
+    def test_capacity_allows_parallel_bookings(self):
+        self.assertEqual([self._book().status_code for _ in range(3)], [200, 200, 409])
+
+    def test_retried_request_replays_the_original_response(self):
+        first = self._book(key="abc")
+        retry = self._book(key="abc")
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Reservation.objects.count(), 1)
+        # La misma clave con otra hora es un error, no otra reserva
+        self.assertEqual(self._book("12:00", key="abc").status_code, 422)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_conflicts_are_replayed_too(self):
+        self._book()
+        self.assertEqual(self._book(key="k2").status_code, 409)
+        Reservation.objects.all().delete()
+        self.assertEqual(self._book(key="k2").status_code, 409)  # el resultado original
+
+    def test_invalid_slot_is_a_400(self):
+        self.assertEqual(self._book(hora="10h").status_code, 400)
+        self.assertEqual(Reservation.objects.count(), 0)
+
+    def test_slot_not_offered_is_a_400(self):
+        cases = {
+            "antes de abrir": {"hora": "07:00"},
+            "termina tras el cierre": {"hora": "17:00", "service": "Masaje terapéutico"},
+            "fuera del paso": {"hora": "10:30"},
+            "día cerrado": {"fecha": "2030-03-09"},  # sábado
+            "pasado": {"fecha": "2020-03-04"},
+        }
+        for label, extra in cases.items():
+            with self.subTest(label):
+                response = self._book(**extra)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()["success"])
+        self.assertEqual(Reservation.objects.count(), 0)
+
+    def test_slot_already_started_today_is_a_400(self):
+        with patch("home.utils.availability.now", return_value=datetime(2030, 3, 4, 10, 5)):
+            self.assertEqual(self._book("10:00").status_code, 400)
+            self.assertEqual(self._book("11:00").status_code, 200)
+
+    def test_form_endpoint_refuses_taken_slot(self):
+        data = {"name": "Juan", "fecha": "2030-03-04", "hora": "10:00"}
+        self.assertEqual(self.client.post(reverse("crear_reserva"), data).status_code, 200)
+        response = self.client.post(reverse("crear_reserva"), data)
+        self.assertEqual(response.status_code, 409)
+        self.assertContains(response, "No se pudo crear la reserva", status_code=409)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+
+@override_settings(RESERVATION_CAPACITY=2)
+class ConcurrentBookingTests(TransactionTestCase):
+    """Many clients booking the same slot at once: never more than the capacity."""
+
+    def _hammer(self, clients, key=None):
+        barrier = threading.Barrier(clients)
+        statuses = []
+
+        def client():
+            try:
+                barrier.wait()
+                data = {"name": "Ana", "fecha": "2030-03-04", "hora": "10:00"}
+                headers = {"HTTP_IDEMPOTENCY_KEY": key} if key else {}
+                statuses.append(Client().post(reverse("reservations"), data, **headers).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return sorted(statuses)
+
+    def test_one_slot_is_never_overbooked(self):
+        self.assertEqual(self._hammer(12), [200] * 2 + [409] * 10)
+        self.assertEqual(Reservation.objects.count(), 2)
+        self.assertEqual(DayOccupancy.objects.get(fecha="2030-03-04").counts["10:00"], 2)
+
+    def test_concurrent_retries_book_once(self):
+        self.assertEqual(self._hammer(6, key="mismo-envio"), [200] * 6)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+
+class LiveSlotsTests(TestCase):
+    def test_signals_publish_taken_moved_and_freed(self):
+        with patch("home.utils.live.publish") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                reservation = Reservation.objects.create(nombre="Ana", fecha=date(2030, 3, 4), hora="10:00")
+            with self.captureOnCommitCallbacks(execute=True):
+                reservation.nombre = "Ana María"
+                reservation.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                reservation.hora = "11:00"
+                reservation.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                reservation.delete()
+        events = [(e["type"], e["fecha"], e["hora"]) for (e,), _ in publish.call_args_list]
+        self.assertEqual(events, [
+            ("slot_taken", "2030-03-04", "10:00"),
+            ("slot_freed", "2030-03-04", "10:00"),
+            ("slot_taken", "2030-03-04", "11:00"),
+            ("slot_freed", "2030-03-04", "11:00"),
+        ])
+
+    def test_nothing_published_for_rolled_back_bookings(self):
+        with patch("home.utils.live.publish") as publish:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                Reservation.objects.create(nombre="Ana", fecha=date(2030, 3, 4), hora="10:00")
+        publish.assert_not_called()
+        self.assertEqual(len(callbacks), 3)  # versión, calendario (mes) y evento en directo, solo al confirmar
+
+    async def _open_stream(self, query=""):
+        """Connect to /reservas/events/ through the ASGI app, as the server would."""
+        # Como el cliente de pruebas: que no cierre la conexión de la transacción del test
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+        incoming, sent = asyncio.Queue(), asyncio.Queue()
+        await incoming.put({"type": "http.request", "body": b""})
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/reservas/events/", "query_string": query.encode(),
+            "headers": [], "server": ("testserver", 80), "client": ("127.0.0.1", 50000),
+        }
+        task = asyncio.create_task(ASGIHandler()(scope, incoming.get, sent.put))
+        start = await asyncio.wait_for(sent.get(), 1)
+
+        async def read():
+            return (await asyncio.wait_for(sent.get(), 1))["body"].decode()
+
+        async def disconnect():
+            await incoming.put({"type": "http.disconnect"})
+            await asyncio.wait_for(task, 1)
+
+        return start, read, disconnect
+
+    async def test_stream_delivers_events_of_its_months(self):
+        start, read, disconnect = await self._open_stream("month=2030-03")
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"Content-Type", b"text/event-stream"), start["headers"])
+        self.assertEqual(await read(), "retry: 15000\n\n")
+        self.assertEqual(len(live.hub), 1)
+
+        live.publish(live.slot_event(live.SLOT_TAKEN, "2030-04-01", "10:00", 60))
+        live.publish(live.slot_event(live.SLOT_FREED, "2030-03-04", "10:00", 60))
+        chunk = await read()
+        self.assertTrue(chunk.startswith("event: slot_freed\n"))
+        self.assertEqual(json.loads(chunk.split("data: ")[1])["fecha"], "2030-03-04")
+
+        await disconnect()
+        self.assertEqual(len(live.hub), 0)
+
+    @override_settings(LIVE_HEARTBEAT=0.01)
+    async def test_idle_stream_sends_heartbeats(self):
+        start, read, disconnect = await self._open_stream()
+        await read()
+        self.assertEqual(await read(), ": ping\n\n")
+        await disconnect()
+
+    async def test_slow_subscriber_is_dropped_instead_of_buffering(self):
+        subscription = live.hub.subscribe(maxsize=2)
+        try:
+            for hora in ("10:00", "11:00", "12:00"):
+                live.hub.dispatch(live.slot_event(live.SLOT_TAKEN, "2030-03-04", hora, 60))
+            await asyncio.sleep(0)
+            self.assertEqual(subscription.queue.qsize(), 1)
+            self.assertIsNone(subscription.queue.get_nowait())
+        finally:
+            live.hub.unsubscribe(subscription)
+
+    async def test_invalid_month(self):
+        response = await self.async_client.get("/reservas/events/?month=marzo")
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_served_by_wsgi_workers(self):
+        self.assertEqual(self.client.get("/reservas/events/").status_code, 501)
+
+
+
+
 # ===========================
 # Tests de utilidad: scraping Herbalife
 # ===========================
 
 class HerbalifeScrapingTests(TestCase):
 
+    def setUp(self):
+        cache.clear()  # estado del circuit breaker
+
     @patch("home.utils.scraping.requests.get")
     def test_scrape_product_found(self, mock_get):
         """Verifica que se devuelve la URL cuando el producto existe."""
         html = '<html><body><a href="/product/123">Masaje</a></body></html>'
-        mock_resp = Mock(status_code=200, text=html)
+        mock_resp = Mock(status_code=200, text=html, content=html.encode(), headers={})
         mock_get.return_value = mock_resp
 
         url = scrape_herbalife_product("Masaje")
@@ -155,7 +1518,7 @@ class HerbalifeScrapingTests(TestCase):
     def test_scrape_product_not_found(self, mock_get):
         """Verifica que devuelve None si no encuentra el producto."""
         html = '<html><body>No products here</body></html>'
-        mock_resp = Mock(status_code=200, text=html)
+        mock_resp = Mock(status_code=200, text=html, content=html.encode(), headers={})
         mock_get.return_value = mock_resp
 
         url = scrape_herbalife_product("Masaje")
@@ -168,6 +1531,274 @@ class HerbalifeScrapingTests(TestCase):
         url = scrape_herbalife_product("Masaje")
         self.assertIsNone(url)
 
+    def test_link_match_ignores_case_whitespace_and_markup(self):
+        html = '<meta charset="utf-8"><nav><a href="/menu">Batidos</a></nav><a href="/es/f1"> Fórmula  1\n<b>BATIDO</b> vainilla</a>'
+        self.assertEqual(find_product_link(html.encode(), "fórmula 1 batido"), "/es/f1")
+        self.assertIsNone(find_product_link(html.encode(), "crema"))
+        self.assertIsNone(find_product_link(html.encode(), "   "))
+
+    def test_link_match_honours_declared_charset(self):
+        html = '<a href="/es/te">Té verde</a>'.encode("latin-1")
+        self.assertEqual(find_product_link(html, "té verde", encoding="ISO-8859-1"), "/es/te")
+        meta = '<meta charset="utf-8"><a href="/es/te">Té verde</a>'.encode()
+        self.assertEqual(find_product_link(meta, "TÉ VERDE"), "/es/te")
+
+    def test_link_match_stops_at_first_match(self):
+        page = b'<a href="/uno">Aloe</a>' + b'<p>' + b'x' * (200 * 1024) + b'</p><a href="/dos">Aloe</a>'
+        feeds = []
+        real_parser = etree.HTMLParser
+
+        class SpyParser:
+            def __init__(self, **kwargs):
+                self.parser = real_parser(**kwargs)
+
+            def feed(self, data):
+                feeds.append(len(data))
+                self.parser.feed(data)
+
+            def close(self):
+                return self.parser.close()
+
+        with patch("home.utils.scraping.etree.HTMLParser", SpyParser):
+            self.assertEqual(find_product_link(page, "aloe"), "/uno")
+        # La página ocupa varios trozos, pero basta con el primero
+        self.assertEqual(len(feeds), 1)
+
+class _FakeHerbalifeHandler(http.server.BaseHTTPRequestHandler):
+    """Mimics herbalife.com/search: ``server.catalog`` maps product names to paths."""
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        name = query.get("q", [""])[0]
+        server = self.server
+        with server.lock:
+            server.hits.append(name)
+            failures = server.failures.get(name, 0)
+            if failures:
+                server.failures[name] = failures - 1
+        if failures:
+            self.send_response(503)
+            self.end_headers()
+            return
+        path = server.catalog.get(name)
+        body = f'<html><body><a href="{path}">{name}</a></body></html>' if path else "<html><body>Sin resultados</body></html>"
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class ResolveHerbalifeUrlsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        server = _QuietHTTPServer(("127.0.0.1", 0), _FakeHerbalifeHandler)
+        server.lock = threading.Lock()
+        server.hits = []
+        server.failures = {}
+        server.catalog = {"Batido Vainilla": "/es/batido-vainilla", "Te Limon": "/es/te-limon"}
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        self.base_url = f"http://127.0.0.1:{server.server_port}"
+
+    def _run(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command(
+            "resolve_herbalife_urls", "--base-url", self.base_url, "--rate", "1000", "--retry-delay", "0",
+            *args, stdout=out, stderr=err,
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_resolves_catalog_concurrently(self):
+        vainilla = Articulo.objects.create(nombre="Batido Vainilla", descripcion="d")
+        te = Articulo.objects.create(nombre="Te Limon", descripcion="d")
+        otro = Articulo.objects.create(nombre="Crema Solar", descripcion="d")
+        ya = Articulo.objects.create(nombre="Aloe", descripcion="d", herbalife_url="https://herbalife.test/aloe")
+
+        out, _ = self._run("--workers", "3", "--batch-size", "1")
+
+        self.assertIn("2 encontrados, 1 no encontrados, 0 fallidos", out)
+        self.assertIn("acierto 67%", out)
+        for a in (vainilla, te, otro, ya):
+            a.refresh_from_db()
+        self.assertEqual(vainilla.herbalife_url, self.base_url + "/es/batido-vainilla")
+        self.assertEqual(te.herbalife_url, self.base_url + "/es/te-limon")
+        self.assertIsNone(otro.herbalife_url)
+        self.assertNotIn("Aloe", self.server.hits)
+
+    def test_retries_transient_errors(self):
+        a = Articulo.objects.create(nombre="Batido Vainilla", descripcion="d")
+        self.server.failures["Batido Vainilla"] = 2
+        out, _ = self._run("--retries", "3")
+        self.assertIn("1 encontrados", out)
+        self.assertIn("2 reintentos", out)
+        a.refresh_from_db()
+        self.assertTrue(a.herbalife_url)
+
+    def test_pending_lookups_are_bounded(self):
+        Articulo.objects.bulk_create([Articulo(nombre=f"Producto {i}", descripcion="d") for i in range(20)])
+        lock = threading.Lock()
+        counts = {"started": 0, "collected": 0, "max_pending": 0}
+        real_record = herbalife.record
+
+        def lookup(resolver, pk, nombre):
+            with lock:
+                counts["started"] += 1
+                counts["max_pending"] = max(counts["max_pending"], counts["started"] - counts["collected"])
+            return pk, None, None, 1
+
+        def record(articulo, **kwargs):
+            with lock:
+                counts["collected"] += 1
+            return real_record(articulo, **kwargs)
+
+        with patch("home.management.commands.resolve_herbalife_urls.IN_FLIGHT_PER_WORKER", 1), \
+                patch("home.management.commands.resolve_herbalife_urls.Resolver.__call__", lookup), \
+                patch("home.utils.herbalife.record", record):
+            out, _ = self._run("--workers", "2", "--batch-size", "5")
+        self.assertIn("20 productos", out)
+        self.assertEqual(counts["collected"], 20)
+        self.assertLessEqual(counts["max_pending"], 2)  # --workers × IN_FLIGHT_PER_WORKER
+
+    def test_gives_up_after_retries(self):
+        Articulo.objects.create(nombre="Batido Vainilla", descripcion="d")
+        self.server.failures["Batido Vainilla"] = 10
+        out, err = self._run("--retries", "1")
+        self.assertIn("1 fallidos", out)
+        self.assertIn("503", err)
+        self.assertEqual(self.server.hits.count("Batido Vainilla"), 2)
+
+    def test_filter_by_ids(self):
+        a = Articulo.objects.create(nombre="Batido Vainilla", descripcion="d")
+        Articulo.objects.create(nombre="Te Limon", descripcion="d")
+        self._run("--ids", str(a.id))
+        self.assertEqual(self.server.hits, ["Batido Vainilla"])
+
+    def test_rate_limiter_spaces_requests(self):
+        clock = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+
+        limiter = RateLimiter(rate=2, burst=1, clock=lambda: clock[0], sleep=sleep)
+        for _ in range(3):
+            limiter.acquire()
+        # 1ª inmediata; las siguientes reservan huecos a 0.5 s y 1 s
+        self.assertEqual(waits, [0.5, 1.0])
+        clock[0] = 10.0
+        self.assertEqual(limiter.acquire(), 0)
+
+
+@override_settings(CIRCUIT_BREAKERS={"test": {"threshold": 2, "cooldown": 30}})
+class ResilienceTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.breaker = CircuitBreaker("test")
+        self.addCleanup(resilience._breakers.pop, "test", None)
+
+    def _fail(self):
+        raise requests.ConnectionError("caído")
+
+    def test_breaker_opens_after_threshold_and_fails_fast(self):
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                self.breaker.call(self._fail)
+        self.assertEqual(self.breaker.state(), resilience.OPEN)
+        upstream = Mock()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(upstream)
+        upstream.assert_not_called()
+
+    def test_half_open_lets_one_probe_through(self):
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                self.breaker.call(self._fail)
+        with patch("home.utils.resilience.time.time", return_value=time.time() + 31):
+            self.assertEqual(self.breaker.state(), resilience.HALF_OPEN)
+            self.assertTrue(self.breaker.allow())
+            self.assertFalse(self.breaker.allow())
+            # La sonda falla: vuelve a abrirse
+            self.breaker.record_failure()
+            self.assertEqual(self.breaker.state(), resilience.OPEN)
+        with patch("home.utils.resilience.time.time", return_value=time.time() + 62):
+            self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+        self.assertEqual(self.breaker.state(), resilience.CLOSED)
+        self.assertEqual(self.breaker.snapshot()["consecutive_failures"], 0)
+
+    def test_health_endpoint_reports_breakers(self):
+        response = self.client.get(reverse("health"))
+        self.assertEqual(response.json()["status"], "ok")
+        self.assertEqual(response.json()["circuit_breakers"]["herbalife"]["state"], "closed")
+        for _ in range(2):
+            self.breaker.record_failure()
+        data = self.client.get(reverse("health")).json()
+        self.assertEqual(data["status"], "degraded")
+        self.assertEqual(data["circuit_breakers"]["test"]["state"], "open")
+        self.assertEqual(data["circuit_breakers"]["test"]["consecutive_failures"], 2)
+
+    def test_single_flight_coalesces_threads(self):
+        flight = SingleFlight("test")
+        calls = []
+        release = threading.Event()
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return "https://herbalife.test/p"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("aloe", slow))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["https://herbalife.test/p"] * 5)
+
+    def test_single_flight_waits_for_other_process(self):
+        flight = SingleFlight("test", poll_interval=0.01)
+        lock_key, result_prefix = flight._keys("aloe")
+        # Otro proceso tiene el lock y publica su resultado poco después
+        cache.add(lock_key, "otro", timeout=30)
+        publisher = threading.Timer(0.05, lambda: cache.set(result_prefix + "otro", {"value": "/p"}, 30))
+        publisher.start()
+        self.addCleanup(publisher.cancel)
+        upstream = Mock()
+        self.assertEqual(flight.do("aloe", upstream), "/p")
+        upstream.assert_not_called()
+
+    def test_single_flight_shares_errors(self):
+        flight = SingleFlight("test", poll_interval=0.01)
+        lock_key, result_prefix = flight._keys("aloe")
+        cache.add(lock_key, "otro", timeout=30)
+        cache.set(result_prefix + "otro", {"error": "timeout"}, 30)
+        with self.assertRaises(requests.RequestException):
+            flight.do("aloe", Mock())
+
+    def test_resolve_command_stops_calling_when_circuit_opens(self):
+        handler = Mock(side_effect=requests.ConnectionError("caído"))
+        for i in range(8):
+            Articulo.objects.create(nombre=f"Producto {i}", descripcion="d")
+        out, err = StringIO(), StringIO()
+        with override_settings(CIRCUIT_BREAKERS={"herbalife": {"threshold": 3, "cooldown": 30}}), \
+                patch("home.utils.scraping.find_herbalife_product", handler):
+            call_command("resolve_herbalife_urls", "--workers", "1", "--retries", "0", "--rate", "1000", stdout=out, stderr=err)
+        self.assertEqual(handler.call_count, 3)
+        self.assertIn("8 fallidos", out.getvalue())
+        self.assertIn("circuito abierto", err.getvalue())
+
+
 # ===========================
 # Tests de vistas adicionales
 # ===========================
@@ -204,16 +1835,489 @@ class AdditionalViewTests(TestCase):
         self.assertIn("10:00:00", data["booked"])
 
     def test_crear_reserva_post_creates_reservation(self):
-        data = {"name": "Juan", "fecha": "2025-02-02", "hora": "16:00"}
+        data = {"name": "Juan", "fecha": "2030-02-04", "hora": "16:00"}
         response = self.client.post(reverse("crear_reserva"), data)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(Reservation.objects.count(), 1)
         r = Reservation.objects.first()
         self.assertEqual(r.nombre, "Juan")
-        self.assertEqual(str(r.fecha), "2025-02-02")
+        self.assertEqual(str(r.fecha), "2030-02-04")
         self.assertEqual(str(r.hora), "16:00:00")
 
     def test_crear_reserva_get_redirects(self):
         response = self.client.get(reverse("crear_reserva"))
         self.assertEqual(response.status_code, 302)
-        self.assertIn(reverse("reservar"), response.url)
\ No newline at end of file
+        self.assertIn(reverse("reservar"), response.url)
+
+
+# ===========================
+# Tests de comandos: importación de catálogo
+# ===========================
+
+class ImportCatalogCommandTests(TestCase):
+
+    def _write(self, suffix, content):
+        tmp = tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False, encoding="utf-8")
+        tmp.write(content)
+        tmp.close()
+        self.addCleanup(os.remove, tmp.name)
+        return tmp.name
+
+    def _run(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command("import_catalog", *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_csv_in_batches(self):
+        rows = "\n".join(f"R{i},Prod {i},Desc,{i}.5" for i in range(7))
+        path = self._write(".csv", "referencia,nombre,descripcion,price\n" + rows + "\n")
+        out, _ = self._run(path, "--batch-size", "3")
+        self.assertEqual(Articulo.objects.count(), 7)
+        self.assertEqual(Articulo.objects.get(referencia="R3").price, Decimal("3.50"))
+        self.assertIn("registro 7", out)  # último lote reportado
+
+    def test_import_jsonl_upserts_existing_rows(self):
+        Articulo.objects.create(referencia="A1", nombre="Viejo", descripcion="d", price=1)
+        path = self._write(".jsonl", "\n".join([
+            json.dumps({"referencia": "A1", "nombre": "Nuevo", "descripcion": "d", "price": 2.1}),
+            json.dumps({"referencia": "A2", "nombre": "Otro", "price": "3", "image_url": "https://img.test/a.jpg"}),
+        ]))
+        self._run(path)
+        self.assertEqual(Articulo.objects.count(), 2)
+        a1 = Articulo.objects.get(referencia="A1")
+        self.assertEqual((a1.nombre, a1.price), ("Nuevo", Decimal("2.10")))
+        # el índice de búsqueda se mantiene también con bulk_create
+        self.assertEqual([p.referencia for p in search_articulos(Articulo.objects.all(), "nuevo")], ["A1"])
+
+    def test_changed_image_url_clears_derivatives(self):
+        Articulo.objects.create(referencia="F1", nombre="Igual", descripcion="d", price=1,
+                                image_url="https://img.test/f1.jpg", image_hash="a" * 64, image_width=800)
+        Articulo.objects.create(referencia="F2", nombre="Cambia", descripcion="d", price=1,
+                                image_url="https://img.test/f2.jpg", image_hash="b" * 64, image_width=800)
+        path = self._write(".csv", "referencia,nombre,descripcion,price,image_url\n"
+                                   "F1,Igual,d,2,https://img.test/f1.jpg\n"
+                                   "F2,Cambia,d,2,https://img.test/f2-nueva.jpg\n")
+        self._run(path)
+        self.assertEqual(
+            dict(Articulo.objects.values_list("referencia", "image_hash")),
+            {"F1": "a" * 64, "F2": None},
+        )
+        self.assertIsNone(Articulo.objects.get(referencia="F2").image_width)
+
+    def test_reimport_without_herbalife_column_keeps_lookup(self):
+        recheck = timezone.now() + timedelta(days=30)
+        Articulo.objects.create(referencia="H1", nombre="Batido", descripcion="d", price=1,
+                                herbalife_url="https://www.herbalife.com/es-es/u/p/batido",
+                                herbalife_status=Articulo.HERBALIFE_FOUND, herbalife_recheck_after=recheck)
+        path = self._write(".csv", "referencia,nombre,descripcion,price\nH1,Batido nuevo,d,2\n")
+        self._run(path)
+        a = Articulo.objects.get(referencia="H1")
+        self.assertEqual(a.nombre, "Batido nuevo")
+        self.assertEqual(a.herbalife_url, "https://www.herbalife.com/es-es/u/p/batido")
+        self.assertEqual((a.herbalife_status, a.herbalife_recheck_after), (Articulo.HERBALIFE_FOUND, recheck))
+
+    def test_changed_herbalife_url_resets_lookup(self):
+        recheck = timezone.now() + timedelta(days=30)
+        for ref in ("H2", "H3"):
+            Articulo.objects.create(referencia=ref, nombre=ref, descripcion="d", price=1,
+                                    herbalife_url=f"https://www.herbalife.com/es-es/u/p/{ref}",
+                                    herbalife_status=Articulo.HERBALIFE_FOUND, herbalife_recheck_after=recheck)
+        path = self._write(".csv", "referencia,nombre,descripcion,price,herbalife_url\n"
+                                   "H2,H2,d,1,https://www.herbalife.com/es-es/u/p/H2\n"
+                                   "H3,H3,d,1,\n")
+        self._run(path)
+        h2, h3 = Articulo.objects.get(referencia="H2"), Articulo.objects.get(referencia="H3")
+        self.assertEqual((h2.herbalife_status, h2.herbalife_recheck_after), (Articulo.HERBALIFE_FOUND, recheck))
+        self.assertIsNone(h3.herbalife_url)
+        self.assertEqual((h3.herbalife_status, h3.herbalife_recheck_after), ("", None))
+        self.assertTrue(herbalife.is_due(h3))
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        path = self._write(".csv", "referencia,nombre,descripcion,price,image_url\n"
+                                   "B1,Bueno,d,1,\n"
+                                   "B2,Malo,d,caro,\n"
+                                   "B3,URL,d,1,no-es-url\n"
+                                   ",Sin ref,d,1,\n")
+        out, err = self._run(path)
+        self.assertEqual(list(Articulo.objects.values_list("referencia", flat=True)), ["B1"])
+        self.assertIn("registro 2", err)
+        self.assertIn("3 errores", out)
+
+    def test_dry_run_writes_nothing(self):
+        path = self._write(".csv", "referencia,nombre,descripcion,price\nC1,Prod,d,1\n")
+        out, _ = self._run(path, "--dry-run")
+        self.assertEqual(Articulo.objects.count(), 0)
+        self.assertIn("dry-run", out)
+
+    def test_resume_from_skips_earlier_records(self):
+        rows = "\n".join(f"D{i},Prod {i},d,1" for i in range(1, 6))
+        path = self._write(".csv", "referencia,nombre,descripcion,price\n" + rows + "\n")
+        self._run(path, "--resume-from", "4")
+        self.assertEqual(sorted(Articulo.objects.values_list("referencia", flat=True)), ["D4", "D5"])
+
+    def test_import_invalidates_catalog_cache(self):
+        cache.clear()
+        self.client.get(reverse("products_api") + "?page=1")
+        path = self._write(".csv", "referencia,nombre,descripcion,price\nE1,Prod,d,1\n")
+        self._run(path)
+        data = self.client.get(reverse("products_api") + "?page=1").json()
+        self.assertEqual([p["nombre"] for p in data["products"]], ["Prod"])
+
+
+# ===========================
+# Tests de comandos: archivo de reservas
+# ===========================
+
+class ArchiveReservationsTests(TestCase):
+
+    def setUp(self):
+        self.old = [
+            Reservation.objects.create(nombre=f"Antigua {i}", fecha=date(2024, 1, 10 + i), hora="10:00")
+            for i in range(5)
+        ]
+        self.future = Reservation.objects.create(nombre="Futura", fecha=date(2030, 3, 4), hora="11:00")
+
+    def test_moves_past_rows_in_batches_keeping_ids(self):
+        with patch("home.utils.live.publish") as publish:
+            batches = list(archive.archive(date(2025, 1, 1), batch_size=2))
+        self.assertEqual(batches, [2, 2, 1])
+        self.assertEqual(list(Reservation.objects.values_list("id", flat=True)), [self.future.id])
+        self.assertEqual(
+            sorted(ReservationArchive.objects.values_list("id", "nombre")),
+            [(r.id, r.nombre) for r in self.old],
+        )
+        # Archivar no libera huecos: ni avisos en directo ni ocupación de días pasados
+        publish.assert_not_called()
+        self.assertFalse(DayOccupancy.objects.filter(fecha__lt=date(2025, 1, 1)).exists())
+        self.assertTrue(DayOccupancy.objects.filter(fecha=date(2030, 3, 4)).exists())
+
+    def test_reports_read_both_tables(self):
+        list(archive.archive(date(2025, 1, 1)))
+        rows = list(exports.reservation_rows())
+        self.assertEqual([row[1] for row in rows], [r.nombre for r in self.old] + ["Futura"])
+        block = calendar_feed.month_block(date(2024, 1, 1))
+        self.assertEqual(block.count("BEGIN:VEVENT"), 5)
+        self.assertIn(f"UID:reserva-{self.old[0].id}@", block)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("archive_reservations", "--before", "2024-01-12", "--dry-run", stdout=out)
+        self.assertIn("Se archivarían 2 reservas", out.getvalue())
+        self.assertEqual(ReservationArchive.objects.count(), 0)
+
+        call_command("archive_reservations", "--before", "2024-01-12", stdout=out)
+        self.assertIn("Archivadas 2 reservas", out.getvalue())
+        self.assertEqual(Reservation.objects.count(), 4)
+
+    def test_future_dates_are_refused(self):
+        with self.assertRaises(CommandError):
+            call_command("archive_reservations", "--before", "2999-01-01", stdout=StringIO())
+
+
+# ===========================
+# Tests de exportaciones en streaming
+# ===========================
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.staff = User.objects.create_user("staff", password="x", is_staff=True)
+        Articulo.objects.create(nombre="Aloe", descripcion="Bebida, vegana", price="9.50")
+        Articulo.objects.create(nombre="Crema", descripcion="Hidratante")
+        Reservation.objects.create(
+            nombre="Ana", fecha="2025-01-05", hora="10:00", servicio="Masaje; deportivo", duracion=90
+        )
+        Reservation.objects.create(nombre="Luis", fecha="2025-03-01", hora="12:00")
+
+    def _body(self, response):
+        body = b"".join(response.streaming_content)
+        if response.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return body.decode("utf-8")
+
+    def test_exports_require_staff(self):
+        response = self.client.get(reverse("export_data", args=["articulos", "csv"]))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("/admin/login/", response["Location"])
+
+    def test_articulos_csv_with_search(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("export_data", args=["articulos", "csv"]), {"search": "aloe"})
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(StringIO(self._body(response))))
+        self.assertEqual(rows[0][:3], ["id", "referencia", "nombre"])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][3], "Bebida, vegana")
+
+    def test_reservations_jsonl_gzip_and_date_range(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse("export_data", args=["reservations", "jsonl"]),
+            {"from": "2025-02-01"},
+            HTTP_ACCEPT_ENCODING="gzip, deflate",
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        lines = self._body(response).splitlines()
+        self.assertEqual([json.loads(line)["nombre"] for line in lines], ["Luis"])
+        self.assertEqual(json.loads(lines[0])["hora"], "12:00:00")
+        self.assertEqual(json.loads(lines[0])["duracion"], 60)
+
+    def test_reservations_ics(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("export_data", args=["reservations", "ics"]), {"to": "2025-01-31"})
+        body = self._body(response)
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertEqual(body.count("BEGIN:VEVENT"), 1)
+        self.assertIn("DTSTART;TZID=Europe/Madrid:20250105T100000", body)
+        self.assertIn("DTEND;TZID=Europe/Madrid:20250105T113000", body)  # su duración, no la por defecto
+        self.assertIn("Masaje\\; deportivo", body)
+
+    def test_unknown_format_is_404(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("export_data", args=["articulos", "ics"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_command_writes_gzip_file(self):
+        tmp = tempfile.NamedTemporaryFile(suffix=".csv.gz", delete=False)
+        tmp.close()
+        self.addCleanup(os.remove, tmp.name)
+        call_command("export_data", "articulos", "-o", tmp.name, "--gzip", stderr=StringIO())
+        with gzip.open(tmp.name, "rt", encoding="utf-8") as f:
+            self.assertEqual(len(list(csv.reader(f))), 3)
+
+
+# ===========================
+# Tests de la suscripción de calendario (ICS)
+# ===========================
+
+class CalendarFeedTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        staff = User.objects.create_user("staff", password="x", is_staff=True)
+        self.feed = CalendarFeed.objects.create(user=staff)
+        self.url = reverse("reservations_feed", args=[self.feed.token])
+        self.today = date.today()
+        self.next_month = (self.today.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+    def _reserve(self, fecha, hora="10:00", nombre="Ana"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Reservation.objects.create(nombre=nombre, fecha=fecha, hora=hora, duracion=90)
+
+    def _body(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_only_active_staff_tokens(self):
+        self.assertEqual(self.client.get(reverse("reservations_feed", args=["nope"])).status_code, 404)
+        client = User.objects.create_user("cliente", password="x")
+        other = CalendarFeed.objects.create(user=client)
+        self.assertEqual(self.client.get(reverse("reservations_feed", args=[other.token])).status_code, 404)
+
+    def test_feed_lists_reservations_and_revalidates(self):
+        self._reserve(self.today, nombre="Lucía")
+        response = self.client.get(self.url)
+        self.assertEqual(response["Content-Type"], "text/calendar; charset=utf-8")
+        self.assertIn("private", response["Cache-Control"])
+        body = self._body(response)
+        self.assertIn("SUMMARY:Masaje relajante - Lucía", body)
+        self.assertIn("REFRESH-INTERVAL;VALUE=DURATION:PT15M", body)
+        start = f"{self.today:%Y%m%d}T100000"
+        end = f"{self.today:%Y%m%d}T113000"  # duración de la reserva
+        self.assertIn(start, body)
+        self.assertIn(end, body)
+        with self.assertNumQueries(1):  # solo el token
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_polls_reuse_month_blocks_and_rebuild_only_touched_months(self):
+        self._reserve(self.today)
+        with self.assertNumQueries(1 + len(calendar_feed.feed_months())):  # el token + un mes por consulta
+            first = self.client.get(self.url)
+            self._body(first)
+        etag = first["ETag"]
+        with self.assertNumQueries(1):
+            self._body(self.client.get(self.url))
+
+        moved = self._reserve(self.next_month, nombre="Pablo")
+        with self.assertNumQueries(2):  # el token + el mes de la reserva nueva
+            response = self.client.get(self.url)
+            body = self._body(response)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("Pablo", body)
+
+        moved.fecha = self.today
+        with self.captureOnCommitCallbacks(execute=True):
+            moved.save()
+        with self.assertNumQueries(3):  # se reconstruyen los dos meses afectados
+            self._body(self.client.get(self.url))
+
+
+# ===========================
+# Tests de miniaturas de imágenes
+# ===========================
+
+def _png_bytes(width, height):
+    out = BytesIO()
+    Image.new("RGBA", (width, height), (200, 30, 30, 128)).save(out, format="PNG")
+    return out.getvalue()
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ImageDerivativeTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.store = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store, ignore_errors=True)
+        override = override_settings(
+            IMAGE_DERIVATIVES_ROOT=self.store,
+            CONTENT_ADDRESSED_STORES={"/media/img/": self.store},
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _serve_dir(self, directory):
+        handler = functools.partial(_QuietHandler, directory=directory)
+        server = _QuietHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def test_store_derivatives_is_content_addressed(self):
+        data = _png_bytes(800, 400)
+        digest, width = images.store_derivatives(data)
+        self.assertEqual(width, 800)
+        self.assertEqual(images.derivative_widths(800), [320, 640, 800])
+        for w in (320, 640, 800):
+            for fmt in ("webp", "jpeg"):
+                path = os.path.join(self.store, images.relative_path(digest, w, fmt))
+                with Image.open(path) as im:
+                    self.assertEqual(im.size[0], w)
+        self.assertEqual(images.store_derivatives(data), (digest, 800))
+
+    def test_invalid_image_raises(self):
+        with self.assertRaises(images.ImageError):
+            images.store_derivatives(b"esto no es una imagen")
+
+    def test_api_exposes_srcset_and_files_are_served_immutable(self):
+        digest, width = images.store_derivatives(_png_bytes(500, 500))
+        Articulo.objects.create(nombre="Foto", descripcion="d", image_url="https://x.test/a.png",
+                                image_hash=digest, image_width=width)
+        product = self.client.get(reverse("products_api")).json()["products"][0]
+        self.assertIn("320w", product["srcset"])
+        self.assertIn(".webp 500w", product["srcset_webp"])
+        self.assertTrue(product["image_url"].endswith("/500.jpg"))
+        self.assertContains(self.client.get(reverse("catalog")), 'type="image/webp"')
+
+        response = self.client.get(product["image_url"])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(self.client.get("/media/img/../settings.py").status_code, 404)
+
+    def test_backfill_command_uses_process_pool(self):
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        with open(os.path.join(source, "a.png"), "wb") as f:
+            f.write(_png_bytes(1200, 600))
+        base = self._serve_dir(source)
+        ok = Articulo.objects.create(nombre="A", descripcion="d", image_url=f"{base}/a.png")
+        broken = Articulo.objects.create(nombre="B", descripcion="d", image_url=f"{base}/missing.png")
+        Articulo.objects.create(nombre="C", descripcion="d")
+
+        out, err = StringIO(), StringIO()
+        call_command("build_image_derivatives", "--workers", "2", stdout=out, stderr=err)
+        ok.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual(ok.image_width, 1200)
+        self.assertIsNone(broken.image_hash)
+        self.assertIn("1 imágenes procesadas, 1 fallidas", out.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(self.store, images.relative_path(ok.image_hash, 960, "webp"))))
+
+
+class InstagramMirrorTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.store = tempfile.mkdtemp()
+        self.source = tempfile.mkdtemp()
+        for path in (self.store, self.source):
+            self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        for name, size in (("a.png", (1080, 1080)), ("b.png", (400, 500))):
+            with open(os.path.join(self.source, name), "wb") as f:
+                f.write(_png_bytes(*size))
+        handler = functools.partial(_QuietHandler, directory=self.source)
+        server = _QuietHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.cdn = f"http://127.0.0.1:{server.server_address[1]}"
+        override = override_settings(
+            INSTAGRAM_MEDIA_ROOT=self.store,
+            INSTAGRAM_MEDIA_MIRROR=True,
+            INSTAGRAM_MEDIA_GRACE=3600,
+            CONTENT_ADDRESSED_STORES={"/media/instagram/": self.store},
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _post(self, n, name):
+        return {"media_url": f"{self.cdn}/{name}?sig={n}", "permalink": f"https://instagram.test/p/{n}", "caption": ""}
+
+    def test_feed_points_at_local_webp_copies(self):
+        posts = [self._post(1, "a.png"), self._post(2, "b.png"), self._post(3, "missing.png")]
+        with patch("home.utils.instagram.fetch_posts", return_value=posts):
+            mirrored, _ = instagram.get_posts("token")
+        first, second, broken = mirrored
+        self.assertTrue(first["media_url"].startswith("/media/instagram/"))
+        self.assertTrue(first["media_url"].endswith("/640.webp"))
+        self.assertIn("320w", first["srcset"])
+        self.assertTrue(second["media_url"].endswith("/400.webp"))  # nunca se amplía
+        self.assertEqual(first["remote_url"], f"{self.cdn}/a.png?sig=1")
+        # Si la descarga falla se sigue enlazando el CDN y se reintenta en el siguiente refresco
+        self.assertEqual(broken["media_url"], f"{self.cdn}/missing.png?sig=3")
+        self.assertNotIn("image_hash", broken)
+
+        response = self.client.get(first["media_url"])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+
+    def test_known_posts_are_not_downloaded_again(self):
+        first = instagram.mirror_posts([self._post(1, "a.png")])
+        # El CDN firma de nuevo la URL en cada respuesta: se reconoce el post por su permalink
+        with patch("home.utils.images.fetch_source") as fetch:
+            again = instagram.mirror_posts([self._post(1, "a.png")], previous=first)
+        fetch.assert_not_called()
+        self.assertEqual(again[0]["media_url"], first[0]["media_url"])
+
+    def test_failed_downloads_are_not_retried_every_refresh(self):
+        broken = {"media_url": f"{self.cdn}/missing.png", "permalink": "https://instagram.test/p/9", "caption": ""}
+        first = instagram.mirror_posts([dict(broken)])
+        self.assertEqual(first[0]["media_url"], f"{self.cdn}/missing.png")
+        with patch("home.utils.images.fetch_source") as fetch:
+            again = instagram.mirror_posts([dict(broken)], previous=first)
+        fetch.assert_not_called()
+        self.assertEqual(again[0]["media_url"], f"{self.cdn}/missing.png")
+
+        cache.clear()  # pasado INSTAGRAM_MEDIA_RETRY_AFTER se vuelve a intentar
+        with patch("home.utils.images.fetch_source", side_effect=images.ImageError("404")) as fetch:
+            instagram.mirror_posts([dict(broken)])
+        fetch.assert_called_once()
+
+    def test_images_that_left_the_feed_are_collected_after_grace(self):
+        old = instagram.mirror_posts([self._post(1, "a.png")])[0]
+        old_dir = os.path.join(self.store, old["image_hash"][:2], old["image_hash"])
+        instagram.mirror_posts([self._post(2, "b.png")], previous=[old])
+        self.assertTrue(os.path.isdir(old_dir))  # aún dentro del periodo de gracia
+
+        past = time.time() - 7200
+        os.utime(old_dir, (past, past))
+        kept = instagram.mirror_posts([self._post(2, "b.png")])[0]
+        self.assertFalse(os.path.exists(old_dir))
+        self.assertTrue(os.path.isdir(os.path.join(self.store, kept["image_hash"][:2], kept["image_hash"])))
+        self.assertEqual(self.client.get(old["media_url"]).status_code, 404)
+
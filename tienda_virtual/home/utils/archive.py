@@ -0,0 +1,63 @@
+"""Hot/cold split of the reservations: past rows move to ``ReservationArchive``.
+
+The booking paths (availability, booking, the calendar API) only read
+``Reservation``, which after archiving holds little more than today onward, so
+their indexed range queries stay the same size however many years of history
+pile up. Reports (exports, the staff calendar feed) read both tables through
+``history()``.
+
+``archive(before)`` moves rows in batches, each in its own short transaction:
+copy to the archive, delete from the live table (plain SQL: archiving doesn't
+free a slot, so no signals, occupancy refreshes or live events per row) and
+drop the ``DayOccupancy`` of those past days. On PostgreSQL rows locked by a
+concurrent edit are skipped and left for the next run.
+"""
+from django.db import connection, transaction
+
+from ..models import DayOccupancy, Reservation, ReservationArchive
+from . import versioning
+
+FIELDS = ("id", "nombre", "fecha", "hora", "servicio", "duracion")
+
+
+def _delete_live(ids):
+    table = connection.ops.quote_name(Reservation._meta.db_table)
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", ids)
+
+
+def archive(before, batch_size=1000):
+    """Move the reservations dated before ``before``; yields the size of each batch."""
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Reservation.objects.select_for_update(skip_locked=True)
+                .filter(fecha__lt=before)
+                .order_by("fecha", "id")
+                .values_list(*FIELDS)[:batch_size]
+            )
+            if not rows:
+                return
+            ReservationArchive.objects.bulk_create(
+                [ReservationArchive(**dict(zip(FIELDS, row))) for row in rows], ignore_conflicts=True
+            )
+            _delete_live([row[0] for row in rows])
+            DayOccupancy.objects.filter(fecha__in={row[2] for row in rows}).delete()
+            transaction.on_commit(lambda: versioning.bump_version("reservations"))
+        yield len(rows)
+
+
+def history(fields, date_from=None, date_to=None):
+    """``values_list(*fields)`` of live and archived reservations as one UNION ALL query.
+
+    Order it by names in ``fields`` (``.order_by("fecha", "hora", "id")``).
+    """
+    def bounded(qs):
+        if date_from:
+            qs = qs.filter(fecha__gte=date_from)
+        if date_to:
+            qs = qs.filter(fecha__lte=date_to)
+        return qs.values_list(*fields)
+
+    return bounded(Reservation.objects.all()).union(bounded(ReservationArchive.objects.all()), all=True)
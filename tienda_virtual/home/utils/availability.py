@@ -0,0 +1,191 @@
+"""Free reservation slots from opening hours, service durations and capacity.
+
+Configuration (settings):
+
+- ``RESERVATION_OPENING_HOURS``: ``{weekday: [("09:00", "14:00"), ...]}`` with
+  0 = Monday; weekdays without an entry are closed. ``RESERVATION_HOLIDAYS``
+  lists closed dates ("AAAA-MM-DD").
+- ``RESERVATION_SERVICES``: ``{"Masaje relajante": 60, ...}`` duration in minutes
+  (``RESERVATION_DEFAULT_DURATION`` for unknown services).
+- ``RESERVATION_SLOT_STEP``: minutes between offered start times.
+- ``RESERVATION_CAPACITY``: reservations that can overlap (therapists).
+
+Occupancy is kept precomputed per day in ``DayOccupancy``: how many reservations
+cover each ``GRID_MINUTES`` cell. It is rebuilt for a day whenever one of its
+reservations is created, moved or deleted (home/signals.py), so computing the
+slots of any date range is one indexed query plus arithmetic.
+"""
+import re
+from datetime import datetime, timedelta
+from itertools import groupby
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+
+from ..models import DayOccupancy, Reservation
+
+GRID_MINUTES = 15
+_DURATION_SUFFIX = re.compile(r"\s*\((\d+)\s*min\)\s*$")
+
+
+def to_minutes(value):
+    """Minutes since midnight of a ``time`` or "HH:MM[:SS]" string."""
+    if isinstance(value, str):
+        hours, minutes = value.split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    return value.hour * 60 + value.minute
+
+
+def to_hhmm(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _round_up(minutes):
+    return -(-minutes // GRID_MINUTES) * GRID_MINUTES
+
+
+def services():
+    return getattr(settings, "RESERVATION_SERVICES", {})
+
+
+def service_duration(servicio):
+    """Duration in minutes of a service.
+
+    Accepts the names in ``RESERVATION_SERVICES`` and the older "Nombre (60 min)"
+    labels stored by previous versions of the booking form.
+    """
+    default = getattr(settings, "RESERVATION_DEFAULT_DURATION", 60)
+    if not servicio:
+        return default
+    suffix = _DURATION_SUFFIX.search(servicio)
+    name = _DURATION_SUFFIX.sub("", servicio)
+    if name in services():
+        return services()[name]
+    return int(suffix.group(1)) if suffix else default
+
+
+def capacity():
+    return getattr(settings, "RESERVATION_CAPACITY", 1)
+
+
+def time_zone():
+    return ZoneInfo(getattr(settings, "RESERVATION_TIME_ZONE", "Europe/Madrid"))
+
+
+def now():
+    """Current time in the business' time zone, as a naive datetime."""
+    return datetime.now(time_zone()).replace(tzinfo=None)
+
+
+def offer_changed_at(current=None):
+    """Aware datetime of the last time the passing of time changed the offered slots.
+
+    Start times drop out of :func:`day_slots` as they are reached and a whole day
+    at midnight, so this is the latest start time of today already reached (any
+    duration), or today's midnight. ``current`` defaults to :func:`now`.
+    """
+    current = current or now()
+    minute = current.hour * 60 + current.minute
+    step = getattr(settings, "RESERVATION_SLOT_STEP", 60)
+    reached = [
+        start
+        for opens, closes in opening_intervals(current.date())
+        for start in range(opens, min(closes, minute + 1), step)
+    ]
+    midnight = datetime.combine(current.date(), datetime.min.time())
+    return (midnight + timedelta(minutes=max(reached, default=0))).replace(tzinfo=time_zone())
+
+
+def opening_intervals(day):
+    """Opening hours of ``day`` as ``[(open_minute, close_minute), ...]``."""
+    if day.isoformat() in getattr(settings, "RESERVATION_HOLIDAYS", ()):
+        return []
+    hours = getattr(settings, "RESERVATION_OPENING_HOURS", {}).get(day.weekday(), ())
+    return [(to_minutes(start), to_minutes(end)) for start, end in hours]
+
+
+def occupancy_counts(reservations):
+    """``{"HH:MM": n}``: reservations covering each grid cell, from ``(hora, duracion)`` pairs."""
+    counts = {}
+    for hora, duracion in reservations:
+        start = to_minutes(hora)
+        start -= start % GRID_MINUTES
+        for cell in range(start, to_minutes(hora) + _round_up(duracion or 0), GRID_MINUTES):
+            key = to_hhmm(cell)
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def refresh_day(fecha):
+    """Recompute the stored occupancy of one day from its reservations."""
+    counts = occupancy_counts(Reservation.objects.filter(fecha=fecha).values_list("hora", "duracion"))
+    if counts:
+        DayOccupancy.objects.update_or_create(fecha=fecha, defaults={"counts": counts})
+    else:
+        DayOccupancy.objects.filter(fecha=fecha).delete()
+
+
+def rebuild(date_from=None, date_to=None):
+    """Recompute the occupancy of every day in the range (all days by default).
+
+    For reservations written without signals (``bulk_create``, ``update()``, raw SQL).
+    Returns the number of days with reservations.
+    """
+    reservations = Reservation.objects.all()
+    stale = DayOccupancy.objects.all()
+    if date_from:
+        reservations, stale = reservations.filter(fecha__gte=date_from), stale.filter(fecha__gte=date_from)
+    if date_to:
+        reservations, stale = reservations.filter(fecha__lte=date_to), stale.filter(fecha__lte=date_to)
+    rows = reservations.order_by("fecha").values_list("fecha", "hora", "duracion").iterator(chunk_size=2000)
+    days = [
+        DayOccupancy(fecha=fecha, counts=occupancy_counts((hora, duracion) for _, hora, duracion in group))
+        for fecha, group in groupby(rows, key=lambda row: row[0])
+    ]
+    stale.delete()
+    DayOccupancy.objects.bulk_create(days, batch_size=500)
+    return len(days)
+
+
+def free_places(counts, start, duration, cap):
+    """Reservations of ``duration`` minutes that still fit at minute ``start`` of a day with ``counts``."""
+    cells = range(start - start % GRID_MINUTES, start + _round_up(duration), GRID_MINUTES)
+    busy = max(counts.get(to_hhmm(cell), 0) for cell in cells)
+    return max(0, cap - busy)
+
+
+def day_slots(day, counts, duration, cap, current=None):
+    """``[{"hora": "09:00", "libres": n}, ...]`` for every start time offered on ``day``."""
+    step = getattr(settings, "RESERVATION_SLOT_STEP", 60)
+    earliest = None
+    if current is not None:
+        if day < current.date():
+            return []
+        if day == current.date():
+            earliest = current.hour * 60 + current.minute
+    slots = []
+    for opens, closes in opening_intervals(day):
+        for start in range(opens, closes - duration + 1, step):
+            if earliest is not None and start <= earliest:
+                continue
+            slots.append({"hora": to_hhmm(start), "libres": free_places(counts, start, duration, cap)})
+    return slots
+
+
+def free_slots(date_from, date_to, servicio=None, current=None):
+    """``{"AAAA-MM-DD": [{"hora", "libres"}, ...]}`` for each day of the inclusive range.
+
+    Closed and past days map to an empty list; start times already past today are
+    left out. ``current`` defaults to :func:`now`.
+    """
+    duration = service_duration(servicio)
+    cap = capacity()
+    current = current or now()
+    occupancy = dict(DayOccupancy.objects.filter(fecha__range=(date_from, date_to)).values_list("fecha", "counts"))
+    result = {}
+    day = date_from
+    while day <= date_to:
+        result[day.isoformat()] = day_slots(day, occupancy.get(day, {}), duration, cap, current)
+        day += timedelta(days=1)
+    return result
+
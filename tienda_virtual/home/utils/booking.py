@@ -0,0 +1,117 @@
+"""Race-free booking and idempotent booking requests.
+
+Bookings of the same day are serialised on that day's ``DayOccupancy`` row: it is
+inserted if missing (a write, so on SQLite the transaction takes the database
+write lock before reading anything) and locked with ``SELECT ... FOR UPDATE``
+(PostgreSQL). Only then is the occupancy read and, if the start time is one the
+availability API offers for that day and service (opening hours, slot step, not
+in the past) and still has room within ``RESERVATION_CAPACITY``, the reservation
+created; the ``post_save`` signal updates the occupancy in the same transaction.
+
+A client may send an ``Idempotency-Key`` header. The first response for a key is
+stored (``IdempotencyKey``) and replayed for retries of the same request for
+``BOOKING_IDEMPOTENCY_TTL`` seconds; reusing a key with different data is an error.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from ..models import DayOccupancy, IdempotencyKey, Reservation
+from . import availability
+
+
+class BookingError(Exception):
+    status = 400
+
+
+class SlotUnavailable(BookingError):
+    status = 409
+
+
+class IdempotencyKeyReused(BookingError):
+    status = 422
+
+
+def parse_slot(fecha, hora):
+    """``(date, time)`` from "AAAA-MM-DD" and "HH:MM[:SS]"; raises ``BookingError``."""
+    try:
+        day = datetime.strptime(fecha or "", "%Y-%m-%d").date()
+        start = datetime.strptime((hora or "")[:5], "%H:%M").time()
+    except ValueError:
+        raise BookingError("Fecha u hora inválida, usa AAAA-MM-DD y HH:MM")
+    return day, start
+
+
+def lock_day(fecha):
+    """Take the booking lock of ``fecha`` (inside a transaction) and return its occupancy."""
+    DayOccupancy.objects.bulk_create([DayOccupancy(fecha=fecha)], ignore_conflicts=True)
+    return DayOccupancy.objects.select_for_update().get(fecha=fecha)
+
+
+def book(nombre, fecha, hora, servicio):
+    """Create a reservation if its slot is offered and still has room.
+
+    Raises ``BookingError`` for a start time ``availability.day_slots`` doesn't
+    offer (closed, off the step, past) and ``SlotUnavailable`` for a full one.
+    """
+    day, start = parse_slot(fecha, hora)
+    duracion = availability.service_duration(servicio)
+    with transaction.atomic():
+        occupancy = lock_day(day)
+        slots = availability.day_slots(day, occupancy.counts, duracion, availability.capacity(), availability.now())
+        free = {slot["hora"]: slot["libres"] for slot in slots}
+        if f"{start:%H:%M}" not in free:
+            raise BookingError(f"No se reserva a las {start:%H:%M} del {day:%d/%m/%Y}, elige una hora disponible")
+        if free[f"{start:%H:%M}"] < 1:
+            raise SlotUnavailable(f"Las {start:%H:%M} del {day:%d/%m/%Y} ya no están disponibles, elige otra hora")
+        return Reservation.objects.create(nombre=nombre, fecha=day, hora=start, servicio=servicio, duracion=duracion)
+
+
+def fingerprint(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _ttl():
+    return getattr(settings, "BOOKING_IDEMPOTENCY_TTL", 86400)
+
+
+def stored_response(key, request_fingerprint):
+    """``(status, body)`` stored for ``key``, or None; raises ``IdempotencyKeyReused``."""
+    cutoff = timezone.now() - timedelta(seconds=_ttl())
+    stored = IdempotencyKey.objects.filter(key=key, created_at__gte=cutoff).first()
+    if stored is None:
+        return None
+    if stored.fingerprint != request_fingerprint:
+        raise IdempotencyKeyReused("Idempotency-Key ya usada con otros datos")
+    return stored.status_code, stored.body
+
+
+def idempotent(key, request_fingerprint, handler):
+    """Run ``handler() -> (status, body)`` at most once per ``key``; returns ``(status, body, replayed)``.
+
+    The handler runs in the same transaction as the stored response, so a crash
+    can't leave a reservation without its response (or the other way round); a
+    concurrent request with the same key waits on the key's unique index and then
+    replays the winner's response.
+    """
+    if not key:
+        status, body = handler()
+        return status, body, False
+    replay = stored_response(key, request_fingerprint)
+    if replay:
+        return (*replay, True)
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.filter(key=key, created_at__lt=timezone.now() - timedelta(seconds=_ttl())).delete()
+            status, body = handler()
+            IdempotencyKey.objects.create(key=key, fingerprint=request_fingerprint, status_code=status, body=body)
+    except IntegrityError:
+        replay = stored_response(key, request_fingerprint)
+        if replay is None:
+            raise
+        return (*replay, True)
+    return status, body, False
@@ -0,0 +1,75 @@
+"""Reservations calendar subscription (ICS) for staff, regenerated month by month.
+
+Each staff member has a secret URL (``CalendarFeed.token``) that calendar clients
+poll. The feed covers ``CALENDAR_FEED_PAST_MONTHS`` before and
+``CALENDAR_FEED_FUTURE_MONTHS`` after the current month; every month's VEVENT
+blocks are cached under that month's version (namespace ``reservations:AAAA-MM``,
+bumped by home/signals.py after the transaction that touched it commits). A poll
+therefore costs the token lookup plus cache reads: only months changed since
+their block was built are queried again, and an unchanged feed is a 304.
+"""
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import archive, ics, versioning
+from .reservations import month_window
+
+
+def _cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def month_namespace(first_day):
+    return f"reservations:{first_day:%Y-%m}"
+
+
+def bump_month(fecha):
+    """Mark the month of ``fecha`` (date or "AAAA-MM-DD") as changed."""
+    if isinstance(fecha, str):
+        fecha = date.fromisoformat(fecha)
+    versioning.bump_version(month_namespace(fecha.replace(day=1)))
+
+
+def feed_months(today=None):
+    """First day of every month the feed covers, oldest first."""
+    today = today or date.today()
+    past = getattr(settings, "CALENDAR_FEED_PAST_MONTHS", 2)
+    future = getattr(settings, "CALENDAR_FEED_FUTURE_MONTHS", 12)
+    index = today.year * 12 + today.month - 1
+    return [date(i // 12, i % 12 + 1, 1) for i in range(index - past, index + future + 1)]
+
+
+def etag(months):
+    """Quoted ETag of the feed: it changes when any of its months does."""
+    versions = versioning.get_versions([month_namespace(m) for m in months])
+    digest = hashlib.md5("|".join(f"{ns}={v}" for ns, v in versions.items()).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def month_block(first_day):
+    """The VEVENT blocks of one month, from the cache when its version hasn't changed."""
+    version = versioning.get_version(month_namespace(first_day))
+    key = f"ics:{first_day:%Y-%m}:{version}"
+    block = _cache().get(key)
+    if block is None:
+        stamp = datetime.now(timezone.utc)
+        date_from, date_to = month_window(first_day.year, first_day.month)
+        # Los meses pasados pueden estar ya en el archivo
+        rows = archive.history(archive.FIELDS, date_from, date_to).order_by("fecha", "hora", "id")
+        block = "".join(
+            ics.reservation_event(pk, nombre, fecha, hora, servicio, timedelta(minutes=duracion), stamp)
+            for pk, nombre, fecha, hora, servicio, duracion in rows
+        )
+        _cache().set(key, block, timeout=getattr(settings, "CALENDAR_FEED_CACHE_TTL", 30 * 86400))
+    return block
+
+
+def feed_lines(months):
+    """The feed, streamed one month at a time."""
+    yield ics.calendar_header(refresh=timedelta(seconds=getattr(settings, "CALENDAR_FEED_REFRESH", 900)))
+    for first_day in months:
+        yield month_block(first_day)
+    yield ics.calendar_footer()
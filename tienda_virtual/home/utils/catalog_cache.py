@@ -0,0 +1,93 @@
+"""Versioned cache for serialized catalog pages.
+
+Every cached page key embeds the current *catalog version*. Changing any
+``Articulo`` bumps the version (see ``home/signals.py``), which makes every
+previously cached page unreachable in O(1) without having to find and delete
+them; the stale entries simply age out of the cache backend.
+
+The cache backend is whatever ``CACHES[CATALOG_CACHE_ALIAS]`` points at
+(locmem in development, Redis/file/DB in production, see settings.py).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import versioning
+
+NAMESPACE = "catalog"
+VERSION_KEY = versioning.version_key(NAMESPACE)
+HITS_KEY = "catalog:stats:hits"
+MISSES_KEY = "catalog:stats:misses"
+
+
+def _cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def _ttl():
+    return getattr(settings, "CATALOG_CACHE_TTL", 3600)
+
+
+def get_version():
+    """Current catalog version (an opaque integer that only ever grows)."""
+    return versioning.get_version(NAMESPACE)
+
+
+def bump_version():
+    """Invalidate every cached catalog page. Call after any change to ``Articulo`` rows."""
+    return versioning.bump_version(NAMESPACE)
+
+
+def _incr(key):
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def page_key(version, *parts):
+    """Build a backend-safe key from the version and the request parameters."""
+    raw = "|".join(str(p) for p in parts)
+    digest = hashlib.md5(raw.encode("utf-8")).hexdigest()
+    return f"catalog:page:{version}:{digest}"
+
+
+def get_or_build(parts, builder):
+    """Return ``(payload, hit)`` for the page identified by ``parts``.
+
+    ``builder`` is only called on a miss; its (JSON-serializable) result is stored
+    under the current catalog version. A ``CATALOG_CACHE_TTL`` of 0 disables caching.
+    """
+    ttl = _ttl()
+    if not ttl:
+        return builder(), False
+
+    cache = _cache()
+    key = page_key(get_version(), *parts)
+    payload = cache.get(key)
+    if payload is not None:
+        _incr(HITS_KEY)
+        return payload, True
+
+    _incr(MISSES_KEY)
+    payload = builder()
+    cache.set(key, payload, timeout=ttl)
+    return payload, False
+
+
+def stats():
+    """Hit/miss counters shared by every worker using the same cache backend."""
+    cache = _cache()
+    values = cache.get_many([HITS_KEY, MISSES_KEY, VERSION_KEY])
+    hits = values.get(HITS_KEY, 0)
+    misses = values.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "version": values.get(VERSION_KEY),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else None,
+    }
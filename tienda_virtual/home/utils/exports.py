@@ -0,0 +1,124 @@
+"""Streaming exports of ``Articulo`` and ``Reservation``.
+
+Everything here is a generator: rows come from ``values_list().iterator()`` (a
+server-side cursor on PostgreSQL), are formatted one at a time and grouped into
+~64 KB text chunks, optionally gzip-compressed on the fly. Memory use is bounded
+by the chunk sizes, not by the size of the tables. The same generators back the
+staff-only download views and ``manage.py export_data``.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import timedelta
+
+from ..models import Articulo
+from . import archive, ics
+from .search import search_articulos
+
+ITERATOR_CHUNK_SIZE = 2000
+OUTPUT_CHUNK_SIZE = 64 * 1024
+
+ARTICULO_FIELDS = ["id", "referencia", "nombre", "descripcion", "price", "image_url", "herbalife_url"]
+RESERVATION_FIELDS = ["id", "nombre", "fecha", "hora", "servicio", "duracion"]
+
+FORMATS = {
+    "articulos": ("csv", "jsonl"),
+    "reservations": ("csv", "jsonl", "ics"),
+}
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+    "ics": "text/calendar; charset=utf-8",
+}
+
+
+def articulo_rows(search=None):
+    qs = Articulo.objects.all()
+    if search:
+        qs = search_articulos(qs, search)
+    return qs.order_by("id").values_list(*ARTICULO_FIELDS).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+def reservation_rows(date_from=None, date_to=None):
+    # Incluye las reservas archivadas (home/utils/archive.py)
+    return archive.history(RESERVATION_FIELDS, date_from, date_to).order_by("fecha", "hora", "id").iterator(
+        chunk_size=ITERATOR_CHUNK_SIZE
+    )
+
+
+def csv_lines(fields, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(values)
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    yield line(fields)
+    for row in rows:
+        yield line(["" if v is None else v for v in row])
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (int, str)):
+        return value
+    # Decimal, date, time: their str() is the canonical ISO/decimal form
+    return str(value)
+
+
+def jsonl_lines(fields, rows):
+    for row in rows:
+        yield json.dumps({f: _json_value(v) for f, v in zip(fields, row)}, ensure_ascii=False) + "\n"
+
+
+def ics_lines(rows):
+    yield ics.calendar_header()
+    for pk, nombre, fecha, hora, servicio, duracion in rows:
+        yield ics.reservation_event(pk, nombre, fecha, hora, servicio, timedelta(minutes=duracion))
+    yield ics.calendar_footer()
+
+
+def export_lines(kind, fmt, search=None, date_from=None, date_to=None):
+    """Text lines of an export; ``kind`` is "articulos" or "reservations"."""
+    if fmt not in FORMATS[kind]:
+        raise ValueError(f"format {fmt!r} not available for {kind}")
+    if kind == "articulos":
+        fields, rows = ARTICULO_FIELDS, articulo_rows(search)
+    else:
+        fields, rows = RESERVATION_FIELDS, reservation_rows(date_from, date_to)
+
+    if fmt == "csv":
+        return csv_lines(fields, rows)
+    if fmt == "jsonl":
+        return jsonl_lines(fields, rows)
+    return ics_lines(rows)
+
+
+def encoded_chunks(lines, chunk_size=OUTPUT_CHUNK_SIZE):
+    """Join text lines into UTF-8 byte chunks of roughly ``chunk_size``."""
+    pending = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        pending.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b"".join(pending)
+            pending = []
+            size = 0
+    if pending:
+        yield b"".join(pending)
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a byte stream into a gzip stream, chunk by chunk."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
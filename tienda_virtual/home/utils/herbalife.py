@@ -0,0 +1,77 @@
+"""Lookup state for ``Articulo.herbalife_url``: when to ask herbalife.com again.
+
+Every lookup records its outcome on the product together with a
+``herbalife_recheck_after`` deadline; until then the stored result is reused:
+
+- found: the URL is served; after ``HERBALIFE_FOUND_TTL`` it is re-verified in the background.
+- not_found: the product short-circuits to "not sold" for ``HERBALIFE_NOT_FOUND_TTL``.
+- error: retried after ``HERBALIFE_ERROR_TTL`` doubled per consecutive failure,
+  capped at ``HERBALIFE_ERROR_MAX_TTL``.
+
+A URL typed in by staff (``herbalife_url`` set with no recorded lookup) is
+never re-checked or overwritten automatically; staff can still force a lookup
+from the admin.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Articulo
+
+FOUND = Articulo.HERBALIFE_FOUND
+NOT_FOUND = Articulo.HERBALIFE_NOT_FOUND
+ERROR = Articulo.HERBALIFE_ERROR
+STATE_FIELDS = ["herbalife_url", "herbalife_status", "herbalife_checked_at", "herbalife_recheck_after", "herbalife_failures"]
+
+
+def ttl(status, failures=0):
+    """Seconds a lookup outcome stays valid."""
+    if status == FOUND:
+        return getattr(settings, "HERBALIFE_FOUND_TTL", 30 * 86400)
+    if status == NOT_FOUND:
+        return getattr(settings, "HERBALIFE_NOT_FOUND_TTL", 7 * 86400)
+    base = getattr(settings, "HERBALIFE_ERROR_TTL", 300)
+    cap = getattr(settings, "HERBALIFE_ERROR_MAX_TTL", 86400)
+    return min(cap, base * 2 ** max(0, failures - 1))
+
+
+def is_manual(articulo):
+    return bool(articulo.herbalife_url) and not articulo.herbalife_status
+
+
+def is_due(articulo, now=None):
+    """True if the product should be looked up (again)."""
+    if is_manual(articulo):
+        return False
+    recheck = articulo.herbalife_recheck_after
+    return recheck is None or recheck <= (now or timezone.now())
+
+
+def due_q(now=None):
+    """``is_due`` as a filter, for bulk selection."""
+    manual = Q(herbalife_url__gt="", herbalife_status="")
+    stale = Q(herbalife_recheck_after__isnull=True) | Q(herbalife_recheck_after__lte=now or timezone.now())
+    return ~manual & stale
+
+
+def record(articulo, url=None, error=False, now=None):
+    """Apply a lookup outcome to ``articulo`` (not saved; see ``STATE_FIELDS``).
+
+    On error a previously found URL is kept: a flaky upstream shouldn't break
+    links that worked.
+    """
+    now = now or timezone.now()
+    if error:
+        articulo.herbalife_failures += 1
+        status = ERROR
+    else:
+        articulo.herbalife_failures = 0
+        articulo.herbalife_url = url or None
+        status = FOUND if url else NOT_FOUND
+    articulo.herbalife_status = status
+    articulo.herbalife_checked_at = now
+    articulo.herbalife_recheck_after = now + timedelta(seconds=ttl(status, articulo.herbalife_failures))
+    return articulo
+
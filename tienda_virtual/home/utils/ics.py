@@ -0,0 +1,74 @@
+"""Minimal iCalendar (RFC 5545) helpers for reservation feeds and exports."""
+from datetime import datetime, timedelta, timezone
+
+PRODID = "-//Natursur//Reservas//ES"
+TZID = "Europe/Madrid"
+LOCATION = "Natursur, Av. Santa Lucía, 6241500 Alcalá de Guadaíra, Sevilla"
+DEFAULT_DURATION = timedelta(hours=1)
+
+
+def escape_text(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold(line):
+    """Fold a content line at 75 octets as required by RFC 5545 (UTF-8 safe)."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # never split a multi-byte UTF-8 sequence
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def calendar_header(name="Reservas Natursur", refresh=None):
+    """``refresh`` (a timedelta) suggests to subscribed clients how often to poll."""
+    header = (
+        "BEGIN:VCALENDAR\r\n"
+        "VERSION:2.0\r\n"
+        f"PRODID:{PRODID}\r\n"
+        "CALSCALE:GREGORIAN\r\n"
+        + fold(f"X-WR-CALNAME:{escape_text(name)}")
+        + f"X-WR-TIMEZONE:{TZID}\r\n"
+    )
+    if refresh:
+        minutes = max(1, int(refresh.total_seconds() // 60))
+        header += f"REFRESH-INTERVAL;VALUE=DURATION:PT{minutes}M\r\nX-PUBLISHED-TTL:PT{minutes}M\r\n"
+    return header
+
+
+def calendar_footer():
+    return "END:VCALENDAR\r\n"
+
+
+def reservation_event(pk, nombre, fecha, hora, servicio, duration=DEFAULT_DURATION, stamp=None):
+    """One VEVENT block for a reservation, as a string."""
+    start = datetime.combine(fecha, hora)
+    end = start + duration
+    stamp = (stamp or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:reserva-{pk}@natursur",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART;TZID={TZID}:{start.strftime('%Y%m%dT%H%M%S')}",
+        f"DTEND;TZID={TZID}:{end.strftime('%Y%m%dT%H%M%S')}",
+        f"SUMMARY:{escape_text(f'{servicio} - {nombre}')}",
+        f"LOCATION:{escape_text(LOCATION)}",
+        "END:VEVENT",
+    ]
+    return "".join(fold(line) for line in lines)
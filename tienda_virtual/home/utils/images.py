@@ -0,0 +1,179 @@
+"""Responsive image derivatives in a content-addressed on-disk store.
+
+An original image (downloaded from a URL or uploaded) is read once, hashed, and
+resized to ``IMAGE_WIDTHS`` in WebP and JPEG::
+
+    <IMAGE_DERIVATIVES_ROOT>/<hash[:2]>/<hash>/<width>.webp
+    <IMAGE_DERIVATIVES_ROOT>/<hash[:2]>/<hash>/<width>.jpg
+
+The hash is the SHA-256 of the original bytes, so a path never changes content
+and can be served with far-future cache headers (see ``home/middleware.py``).
+Only the hash and the original width are stored on the model; every URL and
+``srcset`` is derived from those two values.
+"""
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from PIL import Image, ImageOps
+
+IMAGE_WIDTHS = (320, 640, 960)
+FORMATS = {
+    # format -> (file extension, Pillow save options)
+    "webp": ("webp", {"format": "WEBP", "quality": 80, "method": 4}),
+    "jpeg": ("jpg", {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True}),
+}
+DOWNLOAD_TIMEOUT = 10
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+
+
+class ImageError(Exception):
+    pass
+
+
+def store_root():
+    return Path(getattr(settings, "IMAGE_DERIVATIVES_ROOT", Path(settings.BASE_DIR) / "media" / "img"))
+
+
+def store_url():
+    return getattr(settings, "IMAGE_DERIVATIVES_URL", "/media/img/")
+
+
+def derivative_widths(original_width, widths=IMAGE_WIDTHS):
+    """Widths generated for an original of ``original_width`` px (never upscaled)."""
+    return sorted({min(w, original_width) for w in widths})
+
+
+def relative_path(digest, width, fmt):
+    ext = FORMATS[fmt][0]
+    return f"{digest[:2]}/{digest}/{width}.{ext}"
+
+
+def derivative_url(digest, width, fmt, base_url=None):
+    return (base_url or store_url()) + relative_path(digest, width, fmt)
+
+
+def srcset(digest, original_width, fmt, base_url=None, widths=IMAGE_WIDTHS):
+    """``srcset`` attribute value, or "" when the image has no derivatives."""
+    if not digest or not original_width:
+        return ""
+    return ", ".join(
+        f"{derivative_url(digest, w, fmt, base_url)} {w}w" for w in derivative_widths(original_width, widths)
+    )
+
+
+def fallback_url(digest, original_width, fmt="jpeg", target=640, base_url=None, widths=IMAGE_WIDTHS):
+    """Single URL for clients that ignore ``srcset``: the largest width <= ``target``."""
+    if not digest or not original_width:
+        return ""
+    available = derivative_widths(original_width, widths)
+    best = max([w for w in available if w <= target] or available[:1])
+    return derivative_url(digest, best, fmt, base_url)
+
+
+def fetch_source(url, timeout=DOWNLOAD_TIMEOUT):
+    """Download an original image, refusing anything absurdly large."""
+    try:
+        with requests.get(url, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(64 * 1024):
+                size += len(chunk)
+                if size > MAX_SOURCE_BYTES:
+                    raise ImageError(f"{url}: más de {MAX_SOURCE_BYTES} bytes")
+                chunks.append(chunk)
+    except requests.RequestException as e:
+        raise ImageError(f"{url}: {e}") from e
+    return b"".join(chunks)
+
+
+def _atomic_write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def store_derivatives(data, root=None, widths=IMAGE_WIDTHS, formats=("webp", "jpeg")):
+    """Generate (or reuse) the derivatives of ``data``; returns ``(digest, original_width)``.
+
+    Already-present files are skipped, so re-ingesting the same image is cheap.
+    ``root`` defaults to ``IMAGE_DERIVATIVES_ROOT``; it is a parameter so worker
+    processes and other stores (e.g. the Instagram mirror) can pass it explicitly.
+    """
+    root = Path(root) if root else store_root()
+    digest = hashlib.sha256(data).hexdigest()
+    try:
+        with Image.open(io.BytesIO(data)) as original:
+            original = ImageOps.exif_transpose(original)
+            original_width, original_height = original.size
+            targets = derivative_widths(original_width, widths)
+            rgb = None
+            for width in targets:
+                pending = [f for f in formats if not (root / relative_path(digest, width, f)).exists()]
+                if not pending:
+                    continue
+                if rgb is None:
+                    # JPEG has no alpha channel: flatten transparent images on white.
+                    rgb = Image.new("RGB", original.size, "white")
+                    rgb.paste(original, mask=original.convert("RGBA").split()[-1])
+                height = max(1, round(original_height * width / original_width))
+                resized = rgb.resize((width, height), Image.LANCZOS) if width != original_width else rgb
+                for fmt in pending:
+                    out = io.BytesIO()
+                    resized.save(out, **FORMATS[fmt][1])
+                    _atomic_write(root / relative_path(digest, width, fmt), out.getvalue())
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ImageError(f"imagen no válida: {e}") from e
+    return digest, original_width
+
+
+def ingest_url(url, root=None):
+    return store_derivatives(fetch_source(url), root=root)
+
+
+def touch(digest, root=None):
+    """Mark an image as still in use (its directory mtime is what ``collect_garbage`` looks at)."""
+    path = (Path(root) if root else store_root()) / digest[:2] / digest
+    if path.is_dir():
+        os.utime(path)
+
+
+def collect_garbage(root, keep, older_than):
+    """Delete the images in ``root`` not listed in ``keep`` and untouched for ``older_than`` seconds.
+
+    The grace period covers pages (cached fragments, browsers) that may still
+    reference an image for a while after it stopped being used. Returns how many
+    images were removed.
+    """
+    root = Path(root)
+    if not root.is_dir():
+        return 0
+    cutoff = time.time() - older_than
+    removed = 0
+    for shard in root.iterdir():
+        if not shard.is_dir():
+            continue
+        for image_dir in shard.iterdir():
+            if image_dir.name in keep or image_dir.stat().st_mtime > cutoff:
+                continue
+            shutil.rmtree(image_dir, ignore_errors=True)
+            removed += 1
+        try:
+            shard.rmdir()  # only succeeds once the shard is empty
+        except OSError:
+            pass
+    return removed
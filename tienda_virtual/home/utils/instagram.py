@@ -0,0 +1,353 @@
+"""Instagram feed and profile for the home page, shared through the Django cache.
+
+Every worker reads the same cache entries (``{"value": ..., "ts": fetched_at}``),
+so the Graph API is called once per TTL for the whole deployment, not once per
+process. Entries follow stale-while-revalidate:
+
+- fresh (younger than the TTL): served as is.
+- stale: served immediately while one background thread refreshes it. A lock in
+  the cache makes that refresh happen once cluster-wide; if it fails the lock is
+  kept for ``INSTAGRAM_RETRY_AFTER`` seconds so a down API isn't hammered, and
+  the stale copy keeps being served for up to ``INSTAGRAM_STALE_TTL`` seconds.
+- missing (cold start): the request that wins the lock fetches synchronously;
+  concurrent ones get the empty default rather than piling onto the API.
+
+The posts use ``INSTAGRAM_FEED_TTL`` and the profile ``INSTAGRAM_PROFILE_TTL``,
+each with its own timestamp.
+
+``aget_posts``/``aget_profile`` are the same for async views, with a deadline:
+a fresh entry is read without leaving the event loop; otherwise the blocking
+path runs in a thread and, if it isn't done in time, the caller gets the stale
+copy (or the default) while the thread finishes and fills the cache.
+
+Instagram's CDN URLs are signed and expire, so (with ``INSTAGRAM_MEDIA_MIRROR``)
+each new post's image is downloaded once, while refreshing, into the
+content-addressed store at ``INSTAGRAM_MEDIA_ROOT`` as WebP (see
+home/utils/images.py) and the cached posts point at those local copies. The page
+never waits for, or breaks with, the CDN; images that left the feed are deleted
+after ``INSTAGRAM_MEDIA_GRACE`` seconds. A URL that can't be mirrored is not
+downloaded again for ``INSTAGRAM_MEDIA_RETRY_AFTER`` seconds.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import images
+
+GRAPH_URL = "https://graph.instagram.com"
+# children{...}: field expansion, so carousels bring their first image in the same request.
+MEDIA_FIELDS = "id,caption,media_type,media_url,permalink,thumbnail_url,timestamp,children{media_type,media_url,thumbnail_url}"
+CHILD_FIELDS = "children{id,media_type,media_url,thumbnail_url}"
+CHILD_WORKERS = 4
+POSTS_KEY = "instagram:posts"
+PROFILE_KEY = "instagram:profile"
+REFRESH_LOCK_TIMEOUT = 60
+# The grid shows three posts per row: two widths cover phones and retina desktops.
+MEDIA_WIDTHS = (320, 640)
+MEDIA_FORMAT = "webp"
+MEDIA_WORKERS = 4
+FAILED_MEDIA_KEY = "instagram:media-failed"
+
+
+class InstagramError(Exception):
+    pass
+
+
+def _cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def _graph_url():
+    return getattr(settings, "INSTAGRAM_GRAPH_URL", GRAPH_URL).rstrip("/")
+
+
+def _remaining(deadline):
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise InstagramError("sin tiempo: presupuesto de la petición agotado")
+    return left
+
+
+def _get_json(path, params, timeout):
+    url = f"{_graph_url()}/{path}?{urllib.parse.urlencode(params)}"
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        try:
+            detail = e.read().decode()
+        except Exception:
+            detail = str(e)
+        raise InstagramError(detail) from e
+    except (OSError, ValueError) as e:
+        raise InstagramError(str(e)) from e
+
+
+def _image_url(media):
+    """URL of a still image for ``media``: for videos ``media_url`` is the mp4 itself."""
+    if media.get("media_type") == "VIDEO":
+        return media.get("thumbnail_url")
+    return media.get("media_url") or media.get("thumbnail_url")
+
+
+def _first_child_media(children):
+    for child in children:
+        media_url = _image_url(child)
+        if media_url:
+            return media_url
+    return None
+
+
+def _fetch_child_media(media_id, access_token, deadline):
+    data = _get_json(media_id, {"fields": CHILD_FIELDS, "access_token": access_token}, _remaining(deadline))
+    return _first_child_media(data.get("children", {}).get("data", []))
+
+
+def fetch_posts(access_token, limit=6, budget=None):
+    """Fetch recent media from the Graph API (no caching; raises ``InstagramError``).
+
+    Returns a list of dicts: {media_url, permalink, caption, media_type, timestamp}.
+    ``media_url`` is always a still image (the thumbnail for videos).
+
+    Carousel children come in the same request through field expansion. Only if a
+    carousel still has no image are its children fetched, concurrently, and the
+    whole call never takes longer than ``budget`` seconds (``INSTAGRAM_FETCH_BUDGET``):
+    posts whose children don't arrive in time are returned without ``media_url``.
+    """
+    deadline = time.monotonic() + (budget or getattr(settings, "INSTAGRAM_FETCH_BUDGET", 8))
+    params = {"fields": MEDIA_FIELDS, "limit": limit, "access_token": access_token}
+    media = _get_json("me/media", params, _remaining(deadline)).get("data", [])[:limit]
+
+    items = []
+    for m in media:
+        media_url = _image_url(m)
+        if not media_url and m.get("media_type") == "CAROUSEL_ALBUM":
+            media_url = _first_child_media(m.get("children", {}).get("data", []))
+        items.append({
+            "media_url": media_url,
+            "permalink": m.get("permalink"),
+            "caption": (m.get("caption") or "")[:300],
+            "media_type": m.get("media_type"),
+            "timestamp": m.get("timestamp"),
+        })
+
+    missing = [i for i, m in enumerate(media) if m.get("media_type") == "CAROUSEL_ALBUM" and not items[i]["media_url"]]
+    if missing and deadline > time.monotonic():
+        pool = ThreadPoolExecutor(max_workers=min(CHILD_WORKERS, len(missing)))
+        futures = {pool.submit(_fetch_child_media, media[i].get("id"), access_token, deadline): i for i in missing}
+        done, _ = wait(futures, timeout=max(0, deadline - time.monotonic()))
+        # Don't wait for stragglers: their own timeouts end them at the deadline anyway.
+        pool.shutdown(wait=False, cancel_futures=True)
+        for future in done:
+            try:
+                items[futures[future]]["media_url"] = future.result()
+            except InstagramError:
+                # ignore child fetch errors, keep media_url None
+                pass
+    return items
+
+
+def fetch_profile(access_token):
+    """Fetch simple profile info (id, username); raises ``InstagramError``."""
+    data = _get_json("me", {"fields": "id,username", "access_token": access_token}, timeout=6)
+    return {"id": data.get("id"), "username": data.get("username")}
+
+
+def _media_root():
+    return Path(getattr(settings, "INSTAGRAM_MEDIA_ROOT", Path(settings.BASE_DIR) / "media" / "instagram"))
+
+
+def _download(url):
+    data = images.fetch_source(url, timeout=getattr(settings, "INSTAGRAM_FETCH_BUDGET", 8))
+    return images.store_derivatives(data, root=_media_root(), widths=MEDIA_WIDTHS, formats=(MEDIA_FORMAT,))
+
+
+def _try_download(url):
+    try:
+        return _download(url)
+    except images.ImageError as e:
+        print(f"Instagram media mirror error: {e}")
+        return None
+
+
+def _failed_key(url):
+    return f"{FAILED_MEDIA_KEY}:{hashlib.sha256(url.encode()).hexdigest()}"
+
+
+def _point_to_local(post, digest, width):
+    base_url = getattr(settings, "INSTAGRAM_MEDIA_URL", "/media/instagram/")
+    post["image_hash"], post["image_width"] = digest, width
+    post["media_url"] = images.fallback_url(digest, width, MEDIA_FORMAT, base_url=base_url, widths=MEDIA_WIDTHS)
+    post["srcset"] = images.srcset(digest, width, MEDIA_FORMAT, base_url=base_url, widths=MEDIA_WIDTHS)
+
+
+def mirror_posts(posts, previous=()):
+    """Rewrite ``posts`` in place to use local copies of their images; returns them.
+
+    Posts already mirrored in ``previous`` (the feed being replaced) reuse their
+    copy without downloading anything. New ones are downloaded concurrently; a
+    post whose download fails keeps the remote URL, and that URL is skipped for
+    ``INSTAGRAM_MEDIA_RETRY_AFTER`` seconds instead of being fetched on every
+    refresh. Afterwards, images no longer in the feed are garbage-collected.
+    """
+    mirrored = {p.get("permalink"): p for p in previous if p.get("image_hash")}
+    pending = []
+    for post in posts:
+        post["remote_url"] = post.get("media_url")
+        known = mirrored.get(post.get("permalink"))
+        if known and (_media_root() / known["image_hash"][:2] / known["image_hash"]).is_dir():
+            _point_to_local(post, known["image_hash"], known["image_width"])
+        elif post["remote_url"]:
+            pending.append(post)
+
+    failed = _cache().get_many([_failed_key(p["remote_url"]) for p in pending])
+    pending = [p for p in pending if _failed_key(p["remote_url"]) not in failed]
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(MEDIA_WORKERS, len(pending))) as pool:
+            outcomes = list(pool.map(_try_download, [p["remote_url"] for p in pending]))
+        new_failures = {}
+        for post, outcome in zip(pending, outcomes):
+            if outcome:
+                _point_to_local(post, *outcome)
+            else:
+                new_failures[_failed_key(post["remote_url"])] = 1
+        if new_failures:
+            _cache().set_many(new_failures, timeout=getattr(settings, "INSTAGRAM_MEDIA_RETRY_AFTER", 86400))
+
+    keep = {p["image_hash"] for p in posts if p.get("image_hash")}
+    for digest in keep:
+        images.touch(digest, root=_media_root())
+    images.collect_garbage(_media_root(), keep, getattr(settings, "INSTAGRAM_MEDIA_GRACE", 7 * 86400))
+    return posts
+
+
+def _load_posts(access_token, limit):
+    posts = fetch_posts(access_token, limit)
+    if getattr(settings, "INSTAGRAM_MEDIA_MIRROR", False):
+        previous = _cache().get(f"{POSTS_KEY}:{limit}") or {}
+        posts = mirror_posts(posts, previous.get("value", []))
+    return posts
+
+
+def _spawn(func):
+    threading.Thread(target=func, daemon=True).start()
+
+
+def _refresh(key, loader, ttl):
+    """Run ``loader`` and store its result; the caller holds the refresh lock."""
+    cache = _cache()
+    lock_key = f"{key}:refresh"
+    try:
+        value = loader()
+    except Exception as e:
+        print(f"Instagram refresh error ({key}): {e}")
+        # Keep the lock a while longer: it doubles as the retry back-off.
+        cache.set(lock_key, 1, timeout=getattr(settings, "INSTAGRAM_RETRY_AFTER", 30))
+        return None
+    entry = {"value": value, "ts": time.time()}
+    cache.set(key, entry, timeout=ttl + getattr(settings, "INSTAGRAM_STALE_TTL", 86400))
+    cache.delete(lock_key)
+    return entry
+
+
+def cached(key, ttl, loader, default):
+    """Return ``(value, fetched_at)`` for ``key`` with stale-while-revalidate semantics.
+
+    ``fetched_at`` is 0 when nothing has been fetched yet.
+    """
+    cache = _cache()
+    entry = cache.get(key)
+    if entry is not None and time.time() - entry["ts"] < ttl:
+        return entry["value"], entry["ts"]
+
+    got_lock = cache.add(f"{key}:refresh", 1, timeout=REFRESH_LOCK_TIMEOUT)
+    if entry is not None:
+        if got_lock:
+            _spawn(lambda: _refresh(key, loader, ttl))
+        return entry["value"], entry["ts"]
+
+    if got_lock:
+        entry = _refresh(key, loader, ttl)
+        if entry is not None:
+            return entry["value"], entry["ts"]
+    return default, 0
+
+
+def _in_thread(func):
+    """Run blocking ``func`` in a daemon thread; returns a future for its result.
+
+    Unlike an executor, nothing ever waits for the thread: when the caller gives up
+    (deadline) or its loop ends with the request, the thread still completes.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(setter, value):
+        if not future.done():
+            setter(value)
+
+    def run():
+        try:
+            outcome = (future.set_result, func())
+        except Exception as e:
+            outcome = (future.set_exception, e)
+        try:
+            loop.call_soon_threadsafe(settle, *outcome)
+        except RuntimeError:
+            pass  # la petición (y su bucle) ya terminó
+
+    _spawn(run)
+    return future
+
+
+async def acached(key, ttl, loader, default, timeout):
+    """``cached`` for async callers, giving up after ``timeout`` seconds."""
+    entry = await _cache().aget(key)
+    if entry is not None and time.time() - entry["ts"] < ttl:
+        return entry["value"], entry["ts"]
+    try:
+        return await asyncio.wait_for(_in_thread(lambda: cached(key, ttl, loader, default)), timeout)
+    except asyncio.TimeoutError:
+        return (entry["value"], entry["ts"]) if entry is not None else (default, 0)
+
+
+def get_posts(access_token, limit=6):
+    """``(posts, fetched_at)``; an empty list if no token is configured."""
+    if not access_token:
+        return [], 0
+    ttl = getattr(settings, "INSTAGRAM_FEED_TTL", 300)
+    return cached(f"{POSTS_KEY}:{limit}", ttl, lambda: _load_posts(access_token, limit), [])
+
+
+def get_profile(access_token):
+    """``(profile, fetched_at)``; None if no token is configured."""
+    if not access_token:
+        return None, 0
+    ttl = getattr(settings, "INSTAGRAM_PROFILE_TTL", 86400)
+    return cached(PROFILE_KEY, ttl, lambda: fetch_profile(access_token), None)
+
+
+async def aget_posts(access_token, limit=6, timeout=None):
+    """Async ``get_posts``: at most ``timeout`` seconds, then the cached or empty feed."""
+    if not access_token:
+        return [], 0
+    ttl = getattr(settings, "INSTAGRAM_FEED_TTL", 300)
+    return await acached(f"{POSTS_KEY}:{limit}", ttl, lambda: _load_posts(access_token, limit), [], timeout)
+
+
+async def aget_profile(access_token, timeout=None):
+    """Async ``get_profile``: at most ``timeout`` seconds, then the cached profile or None."""
+    if not access_token:
+        return None, 0
+    ttl = getattr(settings, "INSTAGRAM_PROFILE_TTL", 86400)
+    return await acached(PROFILE_KEY, ttl, lambda: fetch_profile(access_token), None, timeout)
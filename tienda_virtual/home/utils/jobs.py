@@ -0,0 +1,185 @@
+"""Minimal database-backed job queue.
+
+A job is a row in ``home_job`` naming an importable function and its keyword
+arguments. ``enqueue()`` inserts it; ``manage.py run_worker`` claims and runs it.
+
+- **Claiming** is a conditional ``UPDATE`` (only succeeds if the row is still
+  claimable), so any number of worker processes/threads can poll the same table
+  without double-running a job, on PostgreSQL and SQLite alike.
+- **Visibility timeout**: a claimed job is locked until ``locked_until``. If the
+  worker dies, the lock expires and another worker picks the job up again.
+- **Retries**: a task that raises is rescheduled with exponential backoff plus
+  jitter until ``max_attempts``; after that it stays ``failed`` with its error.
+- **Deduplication**: jobs enqueued with a ``key`` are unique while queued or
+  running, so a page hit a thousand times enqueues one lookup, not a thousand.
+  A request that must not be swallowed by the active job (``supersede=True``,
+  e.g. a forced re-check) updates it while queued or follows it if running.
+
+Tasks are plain functions taking JSON-serializable keyword arguments; their
+return value (also JSON-serializable) is stored in ``Job.result``.
+"""
+import random
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from ..models import Job
+
+ACTIVE = (Job.QUEUED, Job.RUNNING)
+
+
+def visibility_timeout():
+    return getattr(settings, "JOBS_VISIBILITY_TIMEOUT", 300)
+
+
+def backoff(attempt, base=None, cap=3600):
+    """Delay in seconds before retry number ``attempt`` (1-based): full-jitter exponential."""
+    base = base if base is not None else getattr(settings, "JOBS_RETRY_BASE_DELAY", 5)
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def _task_path(task):
+    return task if isinstance(task, str) else f"{task.__module__}.{task.__qualname__}"
+
+
+def enqueue(task, key=None, queue="default", max_attempts=5, delay=0, supersede=False, **kwargs):
+    """Queue ``task(**kwargs)`` and return its ``Job``.
+
+    If ``key`` is given and a job with that key is already queued or running,
+    that job is returned instead of creating a new one. With ``supersede`` these
+    ``kwargs`` still take effect: see :func:`_supersede`.
+    """
+    options = {"queue": queue, "max_attempts": max_attempts, "delay": delay}
+    if key:
+        existing = active_job(key)
+        if existing and supersede:
+            return _supersede(existing, task, kwargs, options)
+        if existing:
+            return existing
+    job = Job(
+        task=_task_path(task),
+        kwargs=kwargs,
+        queue=queue,
+        key=key,
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        # Another request enqueued the same key between our check and the insert.
+        existing = active_job(key) if key else None
+        if existing is None:
+            raise
+        if supersede:
+            return _supersede(existing, task, kwargs, options)
+        return existing
+    return job
+
+
+def _supersede(job, task, kwargs, options):
+    """Make the active ``job`` run with ``kwargs`` after all.
+
+    Still queued: its arguments and ``run_after`` are replaced in place (only if no
+    worker claims it meanwhile). Already running: it has read its old arguments, so
+    a follow-up job is queued under ``<key>:next``, itself deduplicated the same way.
+    """
+    run_after = timezone.now() + timedelta(seconds=options["delay"])
+    if Job.objects.filter(id=job.id, status=Job.QUEUED).update(kwargs=kwargs, run_after=run_after):
+        job.refresh_from_db()
+        return job
+    return enqueue(task, key=f"{job.key}:next", supersede=True, **options, **kwargs)
+
+
+def active_job(key):
+    return Job.objects.filter(key=key, status__in=ACTIVE).first()
+
+
+def latest_job(key):
+    return Job.objects.filter(key=key).order_by("-created_at", "-id").first()
+
+
+def _claimable(now):
+    ready = Q(status=Job.QUEUED, run_after__lte=now)
+    # Running but its worker missed the visibility deadline: presumed dead.
+    abandoned = Q(status=Job.RUNNING, locked_until__lt=now)
+    return ready | abandoned
+
+
+def claim(queue="default", timeout=None, candidates=10):
+    """Atomically take one runnable job from ``queue``; returns it or None."""
+    timeout = timeout or visibility_timeout()
+    now = timezone.now()
+    ids = list(
+        Job.objects.filter(_claimable(now), queue=queue)
+        .order_by("run_after", "id")
+        .values_list("id", flat=True)[:candidates]
+    )
+    # Several workers may see the same candidates; the conditional UPDATE lets only one win each.
+    for job_id in ids:
+        token = uuid.uuid4().hex
+        won = Job.objects.filter(_claimable(now), id=job_id).update(
+            status=Job.RUNNING,
+            attempts=F("attempts") + 1,
+            locked_until=now + timedelta(seconds=timeout),
+            lock_token=token,
+        )
+        if won:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def _finish(job, **fields):
+    # Only the holder of the lock may record the outcome: if our visibility window
+    # expired and another worker re-claimed the job, this update matches nothing.
+    return Job.objects.filter(id=job.id, lock_token=job.lock_token).update(**fields)
+
+
+def run(job):
+    """Execute a claimed job and record the outcome; returns True on success."""
+    try:
+        func = import_string(job.task)
+        result = func(**job.kwargs)
+    except Exception as e:
+        error = "".join(traceback.format_exception_only(type(e), e)).strip()
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            _finish(job, status=Job.FAILED, last_error=error, locked_until=None, finished_at=now)
+        else:
+            _finish(
+                job,
+                status=Job.QUEUED,
+                last_error=error,
+                locked_until=None,
+                run_after=now + timedelta(seconds=backoff(job.attempts)),
+            )
+        return False
+
+    _finish(job, status=Job.DONE, result=result, last_error="", locked_until=None, finished_at=timezone.now())
+    return True
+
+
+def work_once(queue="default", timeout=None):
+    """Claim and run a single job. Returns None if the queue had nothing runnable."""
+    job = claim(queue, timeout)
+    if job is None:
+        return None
+    run(job)
+    return job
+
+
+def drain(queue="default", limit=None):
+    """Run jobs until none is runnable (or ``limit`` is reached); returns how many ran."""
+    count = 0
+    while limit is None or count < limit:
+        if work_once(queue) is None:
+            break
+        count += 1
+    return count
@@ -0,0 +1,191 @@
+"""Live slot updates pushed to the booking page (server-sent events over ASGI).
+
+When a reservation is created, moved or deleted, home/signals.py publishes a
+delta after the transaction commits::
+
+    {"type": "slot_taken" | "slot_freed", "fecha": "AAAA-MM-DD", "hora": "HH:MM", "duracion": 60}
+
+Delivery has two layers:
+
+- ``hub``: the in-process fan-out. Each open ``/reservas/events/`` stream is a
+  ``Subscription`` with a bounded queue, filtered by the months the page shows.
+  A client that falls ``LIVE_QUEUE_SIZE`` events behind is disconnected (its
+  browser reconnects and reloads availability), so an idle or slow connection
+  costs a fixed amount of memory.
+- the backend (``LIVE_SLOTS_BACKEND``) carries events between processes:
+  ``MemoryBackend`` hands them straight to this process' hub (tests, a single
+  server process); ``PostgresBackend`` sends ``NOTIFY`` and every process runs a
+  thread that ``LISTEN``s and feeds its own hub.
+"""
+import asyncio
+import json
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+SLOT_TAKEN = "slot_taken"
+SLOT_FREED = "slot_freed"
+CHANNEL = "natursur_slots"
+
+
+class Subscription:
+    """One open event stream: a bounded queue that any thread can feed."""
+
+    __slots__ = ("loop", "queue", "months")
+
+    def __init__(self, loop, months, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.months = frozenset(months)
+
+    def wants(self, event):
+        return not self.months or event["fecha"][:7] in self.months
+
+    def offer(self, event):
+        """Queue ``event`` (runs on the subscription's loop); False if the client is too far behind."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Drop what's pending and tell the stream to end (None): the client reloads on reconnect.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+        return True
+
+
+class Hub:
+    """In-process fan-out of slot events to the subscribed streams."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def subscribe(self, months=(), maxsize=None):
+        """New subscription bound to the running event loop."""
+        subscription = Subscription(
+            asyncio.get_running_loop(), months, maxsize or getattr(settings, "LIVE_QUEUE_SIZE", 64)
+        )
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def dispatch(self, event):
+        """Deliver ``event`` to the interested subscriptions; callable from any thread."""
+        with self._lock:
+            subscriptions = [s for s in self._subscriptions if s.wants(event)]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(self._offer, subscription, event)
+            except RuntimeError:
+                # Its loop is gone (server shutting down): nothing left to deliver to.
+                self.unsubscribe(subscription)
+
+    def _offer(self, subscription, event):
+        if not subscription.offer(event):
+            # Nothing more for it, even if its stream is stuck sending to a client that stopped reading.
+            self.unsubscribe(subscription)
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+
+hub = Hub()
+
+
+class MemoryBackend:
+    """Events only reach streams served by this process."""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, event):
+        self.hub.dispatch(event)
+
+
+class PostgresBackend:
+    """Events reach every process through PostgreSQL ``LISTEN``/``NOTIFY`` (psycopg2)."""
+
+    def __init__(self, hub, alias="default", reconnect_delay=5):
+        self.hub = hub
+        self.alias = alias
+        self.reconnect_delay = reconnect_delay
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._listen, name="live-slots-listener", daemon=True)
+            self._thread.start()
+
+    def publish(self, event):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, json.dumps(event)])
+
+    def _listen(self):
+        while True:
+            # Its own connection, outside Django's per-thread handling: it lives as long as the process.
+            wrapper = connections.create_connection(self.alias)
+            try:
+                wrapper.ensure_connection()
+                wrapper.set_autocommit(True)
+                raw = wrapper.connection
+                with raw.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                while True:
+                    if select.select([raw], [], [], 60) == ([], [], []):
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        self.hub.dispatch(json.loads(raw.notifies.pop(0).payload))
+            except Exception as e:
+                print(f"Live slots listener error: {e}")
+            finally:
+                wrapper.close()
+            time.sleep(self.reconnect_delay)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """The configured backend, created and started once per process."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            path = getattr(settings, "LIVE_SLOTS_BACKEND", "home.utils.live.MemoryBackend")
+            _backend = import_string(path)(hub)
+            _backend.start()
+        return _backend
+
+
+def slot_event(kind, fecha, hora, duracion):
+    return {"type": kind, "fecha": str(fecha), "hora": str(hora)[:5], "duracion": duracion}
+
+
+def publish(event):
+    try:
+        get_backend().publish(event)
+    except Exception as e:
+        # Live updates are best effort: a booking must never fail because of them.
+        print(f"Live slots publish error: {e}")
+
+
+def format_event(event):
+    """``event`` as a server-sent events message.
+
+    Without ``id``: nothing is replayed on reconnect, the page reloads the
+    availability instead.
+    """
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
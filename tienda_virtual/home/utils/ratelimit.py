@@ -0,0 +1,56 @@
+"""Thread-safe token-bucket rate limiting for outbound HTTP calls."""
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class RateLimiter:
+    """At most ``rate`` acquisitions per second on average, in bursts of up to ``burst``.
+
+    ``acquire()`` reserves a slot under the lock and sleeps outside it, so waiting
+    threads queue up in order instead of spinning.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a slot is available; returns the seconds waited."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Going negative reserves a future slot for this caller.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+class HostRateLimiter:
+    """One ``RateLimiter`` per host, created on first use."""
+
+    def __init__(self, rate, burst=1, **kwargs):
+        self._args = (rate, burst)
+        self._kwargs = kwargs
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def for_host(self, host):
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = self._limiters[host] = RateLimiter(*self._args, **self._kwargs)
+            return limiter
+
+    def acquire(self, url):
+        return self.for_host(urlsplit(url).netloc).acquire()
@@ -0,0 +1,89 @@
+"""Reservation calendar queries.
+
+The calendar only ever shows a date window (a month), so reads are bounded by
+``fecha`` (indexed together with ``hora``) and grouped by day in the database:
+one row per day with its booked hours aggregated, instead of one row per
+reservation ever made.
+"""
+import calendar
+from datetime import date, datetime, timedelta
+
+from django.db import connection
+from django.db.models import Aggregate, CharField
+from django.utils import timezone
+
+from ..models import Reservation
+
+MAX_WINDOW_DAYS = 366
+
+
+class WindowError(ValueError):
+    pass
+
+
+class GroupConcat(Aggregate):
+    """``GROUP_CONCAT(expr)`` (SQLite, MySQL): comma-separated values of the group."""
+
+    function = "GROUP_CONCAT"
+    output_field = CharField()
+
+
+def month_window(year, month):
+    """First and last day of a month."""
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def parse_window(params, today=None):
+    """Inclusive ``(from, to)`` dates from ``month=AAAA-MM`` or ``from=``/``to=`` (AAAA-MM-DD).
+
+    Without parameters it is the current month; with only one of ``from``/``to``
+    the other end is a month away. Raises ``WindowError`` for malformed dates or
+    windows that are reversed or longer than ``MAX_WINDOW_DAYS``.
+    """
+    today = today or timezone.localdate()
+    month = params.get("month")
+    raw_from, raw_to = params.get("from"), params.get("to")
+    try:
+        if month:
+            parsed = datetime.strptime(month, "%Y-%m")
+            return month_window(parsed.year, parsed.month)
+        date_from = datetime.strptime(raw_from, "%Y-%m-%d").date() if raw_from else None
+        date_to = datetime.strptime(raw_to, "%Y-%m-%d").date() if raw_to else None
+    except ValueError:
+        raise WindowError("Fechas inválidas, usa month=AAAA-MM o from/to=AAAA-MM-DD")
+
+    if date_from is None and date_to is None:
+        return month_window(today.year, today.month)
+    if date_from is None:
+        date_from = date_to - timedelta(days=31)
+    if date_to is None:
+        date_to = date_from + timedelta(days=31)
+    if date_to < date_from:
+        raise WindowError("'to' no puede ser anterior a 'from'")
+    if (date_to - date_from).days >= MAX_WINDOW_DAYS:
+        raise WindowError(f"El intervalo no puede superar {MAX_WINDOW_DAYS} días")
+    return date_from, date_to
+
+
+def booked_by_day(date_from, date_to):
+    """``{"AAAA-MM-DD": ["HH:MM", ...]}`` for the days in the window that have reservations."""
+    days = (
+        Reservation.objects.filter(fecha__range=(date_from, date_to))
+        .values("fecha")
+        .order_by("fecha")
+    )
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.aggregates import ArrayAgg
+
+        rows = days.annotate(horas=ArrayAgg("hora", ordering="hora"))
+        return {
+            row["fecha"].isoformat(): [h.strftime("%H:%M") for h in row["horas"]]
+            for row in rows
+        }
+
+    # SQLite / MySQL keep TIME as "HH:MM:SS" text in the concatenation.
+    rows = days.annotate(horas=GroupConcat("hora"))
+    return {
+        row["fecha"].isoformat(): sorted(h[:5] for h in row["horas"].split(","))
+        for row in rows
+    }
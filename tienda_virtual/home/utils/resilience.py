@@ -0,0 +1,198 @@
+"""Protection for calls to slow or flaky external services.
+
+- ``SingleFlight``: concurrent calls for the same key share one execution. Threads
+  of a process wait on an in-memory event; other processes wait on a lock in the
+  Django cache and pick up the result the winner publishes there. Across
+  processes this needs a shared cache backend (Redis, DB...); with locmem each
+  process coalesces on its own.
+- ``CircuitBreaker``: after ``threshold`` consecutive failures every call fails
+  fast with ``CircuitOpenError`` for ``cooldown`` seconds; then a single probe is
+  let through and its outcome closes or re-opens the circuit. State lives in the
+  cache too, so all workers share it and ``/health/`` can report it.
+
+Per-service settings come from ``CIRCUIT_BREAKERS = {"name": {"threshold": 5, "cooldown": 60}}``.
+"""
+import hashlib
+import threading
+import time
+import uuid
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_breakers = {}
+
+
+def _cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling a service whose circuit is open."""
+
+
+class CircuitBreaker:
+
+    def __init__(self, name, failure_exceptions=(requests.RequestException,)):
+        self.name = name
+        self.failure_exceptions = failure_exceptions
+        self._failures_key = f"breaker:{name}:failures"
+        self._open_until_key = f"breaker:{name}:open_until"
+        self._probe_key = f"breaker:{name}:probe"
+        _breakers[name] = self
+
+    def _config(self, option, default):
+        return getattr(settings, "CIRCUIT_BREAKERS", {}).get(self.name, {}).get(option, default)
+
+    @property
+    def threshold(self):
+        return self._config("threshold", 5)
+
+    @property
+    def cooldown(self):
+        return self._config("cooldown", 60)
+
+    def state(self):
+        open_until = _cache().get(self._open_until_key)
+        if open_until is None:
+            return CLOSED
+        return OPEN if time.time() < open_until else HALF_OPEN
+
+    def allow(self):
+        """True if a call may go out now (always when closed; one probe when half-open)."""
+        state = self.state()
+        if state == CLOSED:
+            return True
+        if state == OPEN:
+            return False
+        return _cache().add(self._probe_key, 1, timeout=self.cooldown)
+
+    def record_success(self):
+        _cache().delete_many([self._failures_key, self._open_until_key, self._probe_key])
+
+    def record_failure(self):
+        cache = _cache()
+        try:
+            failures = cache.incr(self._failures_key)
+        except ValueError:
+            cache.add(self._failures_key, 0, timeout=None)
+            failures = cache.incr(self._failures_key)
+        if failures >= self.threshold or self.state() == HALF_OPEN:
+            cache.set(self._open_until_key, time.time() + self.cooldown, timeout=None)
+            cache.delete(self._probe_key)
+
+    def call(self, func, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name}: circuito abierto, reintento en {self.cooldown}s como mucho")
+        try:
+            result = func(*args, **kwargs)
+        except self.failure_exceptions:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self):
+        values = _cache().get_many([self._failures_key, self._open_until_key])
+        open_until = values.get(self._open_until_key)
+        return {
+            "state": self.state(),
+            "consecutive_failures": values.get(self._failures_key, 0),
+            "open_until": open_until,
+            "threshold": self.threshold,
+            "cooldown": self.cooldown,
+        }
+
+
+def breakers():
+    """Every breaker created in this process, by name."""
+    return dict(_breakers)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into a single execution."""
+
+    def __init__(self, name, lock_timeout=30, poll_interval=0.05):
+        self.name = name
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, func):
+        """Return ``func()``, or the result of an identical call already in flight."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._do_shared(key, func)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def _keys(self, key):
+        digest = hashlib.md5(key.encode("utf-8")).hexdigest()
+        base = f"singleflight:{self.name}:{digest}"
+        return f"{base}:lock", f"{base}:result:"
+
+    def _do_shared(self, key, func):
+        cache = _cache()
+        lock_key, result_prefix = self._keys(key)
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            token = uuid.uuid4().hex
+            if cache.add(lock_key, token, timeout=self.lock_timeout):
+                return self._lead(cache, lock_key, result_prefix + token, func)
+            # Another process is running it: wait for the result it publishes under its token.
+            holder = cache.get(lock_key)
+            while holder is not None and time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                released = cache.get(lock_key) != holder
+                # Checked after the lock too: the leader publishes first and releases second.
+                outcome = cache.get(result_prefix + holder)
+                if outcome is not None:
+                    if "error" in outcome:
+                        raise requests.RequestException(outcome["error"])
+                    return outcome["value"]
+                if released:
+                    break
+            if time.monotonic() >= deadline:
+                # The holder seems stuck; don't wait forever, just run it ourselves.
+                return func()
+
+    def _lead(self, cache, lock_key, result_key, func):
+        try:
+            value = func()
+        except requests.RequestException as e:
+            cache.set(result_key, {"error": str(e) or type(e).__name__}, timeout=self.lock_timeout)
+            raise
+        else:
+            cache.set(result_key, {"value": value}, timeout=self.lock_timeout)
+            return value
+        finally:
+            cache.delete(lock_key)
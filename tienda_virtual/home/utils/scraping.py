@@ -1,5 +1,115 @@
+from urllib.parse import urljoin
+
 import requests
-from bs4 import BeautifulSoup
+from lxml import etree
+
+from .resilience import CircuitBreaker, SingleFlight
+
+BASE_URL = "https://www.herbalife.com"
+FEED_CHUNK_SIZE = 64 * 1024
+
+herbalife_breaker = CircuitBreaker("herbalife")
+_lookups = SingleFlight("herbalife", lock_timeout=15)
+
+
+def normalize_name(text):
+    """Case- and whitespace-insensitive form used to compare product names."""
+    return " ".join(text.split()).casefold()
+
+
+class _AnchorMatcher:
+    """lxml parser target that looks for the first ``<a href>`` whose text contains ``needle``.
+
+    No tree is built: the parser calls ``start``/``data``/``end`` and only the text
+    inside the current anchor is kept, so memory doesn't grow with the page.
+    """
+
+    def __init__(self, needle):
+        self.needle = needle
+        self.href = None
+        self.text = []
+        self.found = None
+
+    def start(self, tag, attrib):
+        if tag == "a" and self.found is None:
+            self.href = attrib.get("href")
+            self.text = []
+
+    def data(self, data):
+        if self.href is not None:
+            self.text.append(data)
+
+    def end(self, tag):
+        if tag == "a" and self.href is not None:
+            if self.needle in normalize_name("".join(self.text)):
+                self.found = self.href
+            self.href = None
+
+    def close(self):
+        return self.found
+
+
+def find_product_link(content, product_name, encoding=None):
+    """Return the ``href`` of the first link whose text contains ``product_name``, or None.
+
+    ``content`` is the raw page (bytes); it is fed to libxml2 in chunks and parsing
+    stops as soon as a match is found.
+    """
+    needle = normalize_name(product_name)
+    if not needle:
+        return None
+    matcher = _AnchorMatcher(needle)
+    parser = etree.HTMLParser(target=matcher, encoding=encoding)
+    for start in range(0, len(content), FEED_CHUNK_SIZE):
+        parser.feed(content[start:start + FEED_CHUNK_SIZE])
+        if matcher.found is not None:
+            return matcher.found
+    if not content:
+        return None
+    return parser.close()
+
+
+def _declared_encoding(response):
+    # Only trust the header's charset; otherwise let libxml2 read <meta charset>
+    # (requests would default text/html to ISO-8859-1).
+    content_type = response.headers.get("Content-Type", "")
+    return response.encoding if "charset" in content_type.lower() else None
+
+
+def search_url(product_name, base_url=BASE_URL):
+    return f"{base_url}/search?q={product_name}"
+
+
+def find_herbalife_product(product_name, base_url=BASE_URL, session=None):
+    """
+    Looks the product up on Herbalife's website.
+
+    Unlike ``scrape_herbalife_product`` network errors are raised, so the caller
+    (e.g. the background job, which retries) can tell "not sold" from "couldn't check".
+    ``session`` lets bulk callers reuse connections.
+
+    Returns:
+        str: The URL of the product if found, None otherwise.
+    """
+    response = (session or requests).get(search_url(product_name, base_url), timeout=10)
+    response.raise_for_status()
+
+    href = find_product_link(response.content, product_name, _declared_encoding(response))
+    if href:
+        return urljoin(base_url, href)
+    return None
+
+
+def lookup_herbalife_product(product_name, base_url=BASE_URL, session=None):
+    """
+    ``find_herbalife_product`` as every caller should use it: concurrent lookups of
+    the same (normalized) name share one request, and while herbalife.com keeps
+    failing the circuit breaker raises ``CircuitOpenError`` instead of waiting out
+    the timeout.
+    """
+    key = f"{base_url}|{normalize_name(product_name)}"
+    return _lookups.do(key, lambda: herbalife_breaker.call(find_herbalife_product, product_name, base_url, session))
+
 
 def scrape_herbalife_product(product_name):
     """
@@ -11,24 +121,11 @@ def scrape_herbalife_product(product_name):
     Returns:
         str: The URL of the product if found, None otherwise.
     """
-    base_url = "https://www.herbalife.com"
-    search_url = f"{base_url}/search?q={product_name}"
-
     try:
-        response = requests.get(search_url, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        # Attempt to find product links more flexibly
-        product_link = soup.find('a', href=True, text=lambda t: t and product_name.lower() in t.lower())
-
-        if product_link:
-            return base_url + product_link['href']
-        else:
-            return None
+        return lookup_herbalife_product(product_name)
     except requests.RequestException as e:
         print(f"Error during scraping: {e}")
         return None
     except Exception as e:
         print(f"Unexpected error: {e}")
-        return None
\ No newline at end of file
+        return None
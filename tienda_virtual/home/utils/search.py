@@ -0,0 +1,168 @@
+"""Full-text product search over ``Articulo.nombre`` + ``Articulo.descripcion``.
+
+The index itself is created by migration ``0004_articulo_search_index`` and is kept
+up to date by the database (expression index on PostgreSQL, triggers on SQLite), so
+bulk imports and admin edits are both covered without any Python-side hooks.
+
+- PostgreSQL: GIN index on ``to_tsvector('spanish', unaccent(nombre || descripcion))``
+  plus a trigram GIN index on ``unaccent(lower(nombre))`` for substring matches.
+- SQLite: FTS5 external-content table ``home_articulo_fts`` with the ``unicode61``
+  tokenizer and ``remove_diacritics 2``.
+- Any other backend falls back to ``icontains`` over both columns.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "home_articulo_fts"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# --- PostgreSQL ---------------------------------------------------------------
+
+# unaccent() is only STABLE, so it cannot be used in an index expression directly.
+# The IMMUTABLE wrapper pins the dictionary, which is what makes it safe to index.
+PG_INSTALL_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION natursur_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS home_articulo_search_gin ON home_articulo
+    USING GIN (to_tsvector('spanish', natursur_unaccent(nombre || ' ' || descripcion)))
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS home_articulo_nombre_trgm ON home_articulo
+    USING GIN (natursur_unaccent(lower(nombre)) gin_trgm_ops)
+    """,
+]
+
+PG_UNINSTALL_SQL = [
+    "DROP INDEX IF EXISTS home_articulo_nombre_trgm",
+    "DROP INDEX IF EXISTS home_articulo_search_gin",
+    "DROP FUNCTION IF EXISTS natursur_unaccent(text)",
+]
+
+# Must match the indexed expression character for character or the planner won't use it.
+_PG_VECTOR = "to_tsvector('spanish', natursur_unaccent(\"home_articulo\".\"nombre\" || ' ' || \"home_articulo\".\"descripcion\"))"
+_PG_QUERY = "to_tsquery('spanish', natursur_unaccent(%s))"
+_PG_TRGM = "natursur_unaccent(lower(\"home_articulo\".\"nombre\")) LIKE ('%%' || natursur_unaccent(lower(%s)) || '%%')"
+
+# --- SQLite -------------------------------------------------------------------
+
+# "CREATE ... IF NOT EXISTS" everywhere: SQLite drops triggers when Django remakes
+# the table during a migration, so any such migration must run them again (from its
+# own copy of these statements, like 0005/0009: migrations never import this module).
+SQLITE_INSTALL_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        nombre, descripcion,
+        content='home_articulo', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON home_articulo BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON home_articulo BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, nombre, descripcion) VALUES ('delete', old.id, old.nombre, old.descripcion);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON home_articulo BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, nombre, descripcion) VALUES ('delete', old.id, old.nombre, old.descripcion);
+        INSERT INTO {FTS_TABLE}(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def install_search_index(schema_editor):
+    """Create (or re-create) the search index for the current database vendor."""
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        statements = PG_INSTALL_SQL
+    elif vendor == "sqlite":
+        statements = SQLITE_INSTALL_SQL
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def uninstall_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        statements = PG_UNINSTALL_SQL
+    elif vendor == "sqlite":
+        statements = SQLITE_UNINSTALL_SQL
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def tokenize(term):
+    """Split a user query into lowercase word tokens (accents are handled by the DB)."""
+    return [t.lower() for t in _TOKEN_RE.findall(term or "")]
+
+
+def search_articulos(qs, term):
+    """Filter an ``Articulo`` queryset to rows matching ``term``.
+
+    Every token is matched as a prefix (so results update sensibly while typing).
+    The queryset is annotated with ``search_rank`` (higher is more relevant); order
+    by ``('-search_rank', 'id')`` for ranked results.
+    """
+    tokens = tokenize(term)
+    if not tokens:
+        return qs.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    vendor = connection.vendor
+    if vendor == "postgresql":
+        tsquery = " & ".join(f"{t}:*" for t in tokens)
+        like = " ".join(tokens)
+        match = RawSQL(
+            f"({_PG_VECTOR} @@ {_PG_QUERY} OR {_PG_TRGM})",
+            [tsquery, _escape_like(like)],
+            output_field=BooleanField(),
+        )
+        rank = RawSQL(f"ts_rank({_PG_VECTOR}, {_PG_QUERY})", [tsquery], output_field=FloatField())
+        return qs.filter(match).annotate(search_rank=rank)
+
+    if vendor == "sqlite":
+        # Each token quoted (so FTS5 operators in user input are inert) and prefix-matched.
+        fts_query = " ".join('"{}"*'.format(t.replace('"', '""')) for t in tokens)
+        # Joined (not an IN/correlated subquery) so the FTS match drives the query and
+        # FTS5's rank (bm25, lower is better) is computed once per matching row.
+        return qs.extra(
+            select={"search_rank": f"-{FTS_TABLE}.rank"},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = "home_articulo"."id"', f"{FTS_TABLE} MATCH %s"],
+            params=[fts_query],
+        )
+
+    q = Q()
+    for t in tokens:
+        q &= Q(nombre__icontains=t) | Q(descripcion__icontains=t)
+    return qs.filter(q).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,74 @@
+"""Home page showcase: the active ``Escaparate`` products, capped and cached.
+
+At most ``SHOWCASE_SIZE`` products, by ``posicion``, whose optional window
+(``activo_desde``/``activo_hasta``) contains now; with no active showcase the
+first products of the catalog stand in, so the carousel is never empty. Either
+way one bounded query (``select_related``) builds it, whatever the catalog size.
+
+The list is cached under the catalog and showcase versions (bumped by
+home/signals.py when ``Articulo`` or ``Escaparate`` rows change) for
+``SHOWCASE_CACHE_TTL`` seconds, or less: the entry expires when the next window
+starts or ends, so scheduled products appear and disappear on time.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from ..models import Articulo, Escaparate
+from . import catalog_cache, versioning
+
+NAMESPACE = "showcase"
+
+
+def _cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def size():
+    return getattr(settings, "SHOWCASE_SIZE", 8)
+
+
+def bump_version():
+    """Invalidate the cached showcase. Call after any change to ``Escaparate`` rows."""
+    return versioning.bump_version(NAMESPACE)
+
+
+def build(now=None):
+    """``(articulos, seconds_valid)``: the showcase now and how long until a window changes it."""
+    now = now or timezone.now()
+    in_window = (Q(activo_desde__isnull=True) | Q(activo_desde__lte=now)) & (
+        Q(activo_hasta__isnull=True) | Q(activo_hasta__gt=now)
+    )
+    entries = Escaparate.objects.filter(in_window).select_related("articulo").order_by("posicion", "id")[:size()]
+    articulos = [entry.articulo for entry in entries]
+    if not articulos:
+        articulos = list(Articulo.objects.order_by("id")[:size()])
+
+    bounds = Escaparate.objects.aggregate(
+        starts=Min("activo_desde", filter=Q(activo_desde__gt=now)),
+        ends=Min("activo_hasta", filter=Q(activo_hasta__gt=now)),
+    )
+    upcoming = [b for b in bounds.values() if b is not None]
+    seconds_valid = min(upcoming).timestamp() - now.timestamp() if upcoming else None
+    return articulos, seconds_valid
+
+
+def get_items():
+    """``(articulos, stamp)`` from the cache; ``stamp`` changes whenever the list may have.
+
+    The stamp keys the carousel's template fragment.
+    """
+    versions = versioning.get_versions([catalog_cache.NAMESPACE, NAMESPACE])
+    key = "showcase:" + ":".join(str(v) for v in versions.values())
+    entry = _cache().get(key)
+    if entry is None:
+        articulos, seconds_valid = build()
+        ttl = getattr(settings, "SHOWCASE_CACHE_TTL", 3600)
+        if seconds_valid is not None:
+            ttl = max(1, min(ttl, int(seconds_valid) + 1))
+        entry = {"items": articulos, "stamp": f"{key}:{time.time_ns()}"}
+        _cache().set(key, entry, timeout=ttl)
+    return entry["items"], entry["stamp"]
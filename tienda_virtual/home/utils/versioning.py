@@ -0,0 +1,141 @@
+"""Cheap data-version counters kept in the Django cache.
+
+A *namespace* ("catalog", "reservations", ...) has an integer version that is
+bumped by model signals once the transaction that changed its rows commits, plus
+the time of the last bump.
+Reading them never touches the database, which is what lets cached pages be keyed
+by version and conditional GETs be answered before any queryset runs.
+"""
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+
+# Backends whose data lives inside one process: a bump made by the worker or a
+# management command never reaches the web workers.
+PER_PROCESS_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def _alias():
+    return getattr(settings, "CATALOG_CACHE_ALIAS", "default")
+
+
+def _cache():
+    return caches[_alias()]
+
+
+def is_shared():
+    """Whether every process sees the same counters (or a single process is all there is)."""
+    if getattr(settings, "CACHE_LOCAL_ALLOWED", False):
+        return True
+    return settings.CACHES[_alias()]["BACKEND"] not in PER_PROCESS_BACKENDS
+
+
+def version_key(namespace):
+    return f"{namespace}:version"
+
+
+def changed_at_key(namespace):
+    return f"{namespace}:changed_at"
+
+
+def _initial_version():
+    # Seeded from the clock rather than 1: if the version key is ever evicted,
+    # restarting from 1 could resurrect pages/ETags issued under an old version 1.
+    return time.time_ns() // 1000
+
+
+def get_version(namespace):
+    """Current version of ``namespace`` (an opaque integer that only ever grows)."""
+    cache = _cache()
+    key = version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(namespaces):
+    """``{namespace: version}`` for several namespaces in one cache round trip."""
+    cache = _cache()
+    keys = {version_key(ns): ns for ns in namespaces}
+    found = cache.get_many(list(keys))
+    versions = {ns: found.get(key) for key, ns in keys.items()}
+    for ns, version in versions.items():
+        if version is None:
+            versions[ns] = get_version(ns)
+    return versions
+
+
+def bump_version(namespace):
+    """Mark ``namespace`` as changed; returns the new version."""
+    cache = _cache()
+    key = version_key(namespace)
+    cache.set(changed_at_key(namespace), time.time(), timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key missing (first run or evicted): start a fresh, never-used-before version.
+        cache.add(key, _initial_version(), timeout=None)
+        return cache.get(key)
+
+
+def changed_at(namespace):
+    """Unix time of the last bump of ``namespace``, or None if unknown."""
+    return _cache().get(changed_at_key(namespace))
+
+
+def conditional_on(*namespaces, clock=None):
+    """View decorator adding ETag / Last-Modified and ``304 Not Modified`` support.
+
+    The ETag is the version of each namespace the view depends on (ETags are per
+    URL, so query parameters don't need to be part of it). Django's ``condition``
+    evaluates it before calling the view, so a matching ``If-None-Match`` returns
+    304 without running a single query. ``Cache-Control: no-cache`` makes browsers
+    keep the body but revalidate on every use.
+
+    For views whose output also changes with the time of day, ``clock()`` returns
+    the aware datetime of the last such change; it is part of the ETag and the
+    lower bound of Last-Modified.
+
+    The counters are stored without expiry, so if they are not shared (see
+    ``is_shared``) a bump made by another process would never change this
+    process's ETag; in that case no validators are sent and every request gets
+    the full response.
+    """
+    def etag(request, *args, **kwargs):
+        parts = [str(get_version(ns)) for ns in namespaces]
+        if clock:
+            parts.append(str(int(clock().timestamp())))
+        return "-".join(parts)
+
+    def last_modified(request, *args, **kwargs):
+        stamps = [ts for ts in (changed_at(ns) for ns in namespaces) if ts]
+        if clock:
+            stamps.append(clock().timestamp())
+        if not stamps:
+            return None
+        return datetime.fromtimestamp(max(stamps), tz=timezone.utc)
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if is_shared():
+                response = conditional_view(request, *args, **kwargs)
+            else:
+                response = view(request, *args, **kwargs)
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapped
+    return decorator
@@ -1,157 +1,90 @@
 from django.shortcuts import redirect, render, get_object_or_404
+from django.db.models import Q
 from django.conf import settings
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, Http404
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+from asgiref.sync import sync_to_async
 from datetime import datetime, timedelta
+import asyncio
 import urllib.parse
+import base64
+import binascii
+from decimal import Decimal, InvalidOperation
 
-from .models import Escaparate, Articulo, Reservation
+from .models import CalendarFeed, Escaparate, Articulo, Reservation
 from django.core.paginator import Paginator, EmptyPage
+from django.core.handlers.asgi import ASGIRequest
 from django.urls import reverse
-from .utils.scraping import scrape_herbalife_product
+from .utils.search import search_articulos
+from .utils import (
+    availability, booking, calendar_feed, catalog_cache, exports, herbalife, instagram, jobs, live, resilience,
+    showcase,
+)
+from .utils import reservations as reservations_utils
+from . import tasks
+from .utils.versioning import conditional_on
 
-import time
 import json
-import urllib.request
-import urllib.error
-
-# Simple in-memory cache for Instagram feed to avoid hitting the API on every request
-_INSTAGRAM_CACHE = {
-    "ts": 0,
-    "data": [],
-    "profile": None,
-}
 
 
-def _fetch_instagram_posts(access_token, limit=6):
-    """Fetch recent Instagram media using the Basic Display API access token.
+async def index(request):
+    """Home page: show featured article and a carousel of articles.
 
-    Returns a list of dicts: {media_url, permalink, caption, media_type}
-    If the access_token is missing or the request fails, returns an empty list.
+    The carousel shows the showcase (``Escaparate``, at most ``SHOWCASE_SIZE``
+    products, cached; see home/utils/showcase.py) and, like the Instagram grid, is
+    a cached template fragment keyed by its cache stamp or the Instagram refresh
+    timestamp. The Instagram feed and profile come from the shared cache; when
+    they have to be fetched (cold cache) they run concurrently with the showcase
+    and the page waits at most ``HOME_DEADLINE`` seconds for them, rendering the
+    cached or empty feed past it. Works under ASGI and, run by Django in its own
+    event loop, under WSGI.
     """
-    if not access_token:
-        return []
-
-    ttl = getattr(settings, "INSTAGRAM_FEED_TTL", 300)
-    now = time.time()
-    # use cached data when fresh
-    if now - _INSTAGRAM_CACHE["ts"] < ttl and _INSTAGRAM_CACHE["data"]:
-        return _INSTAGRAM_CACHE["data"]
-
-    url = (
-        "https://graph.instagram.com/me/media?fields=id,caption,media_type,media_url,permalink,thumbnail_url,timestamp"
-        f"&access_token={access_token}"
-    )
-    try:
-        with urllib.request.urlopen(url, timeout=8) as resp:
-            body = resp.read()
-            data = json.loads(body.decode("utf-8"))
-            items = []
-            for m in data.get("data", [])[:limit]:
-                media_url = m.get("media_url") or m.get("thumbnail_url")
-                # If carousel and no direct media_url, fetch first child's media
-                if m.get("media_type") == "CAROUSEL_ALBUM" and not media_url:
-                    try:
-                        child_url = (
-                            f"https://graph.instagram.com/{m.get('id')}?fields=children{{id,media_type,media_url,thumbnail_url}}&access_token={access_token}"
-                        )
-                        with urllib.request.urlopen(child_url, timeout=6) as creq:
-                            cbody = creq.read()
-                            cdata = json.loads(cbody.decode("utf-8"))
-                            children = cdata.get("children", {}).get("data", [])
-                            if children:
-                                child = children[0]
-                                media_url = child.get("media_url") or child.get("thumbnail_url")
-                    except Exception:
-                        # ignore child fetch errors, keep media_url None
-                        media_url = media_url
-
-                items.append({
-                    "media_url": media_url,
-                    "permalink": m.get("permalink"),
-                    "caption": (m.get("caption") or "")[:300],
-                    "media_type": m.get("media_type"),
-                    "timestamp": m.get("timestamp"),
-                })
-            _INSTAGRAM_CACHE["ts"] = now
-            _INSTAGRAM_CACHE["data"] = items
-            return items
-    except urllib.error.HTTPError as e:
-        # log and return empty
-        try:
-            err = e.read().decode()
-        except Exception:
-            err = str(e)
-        print("Instagram fetch error:", err)
-        return []
-    except Exception as e:
-        print("Instagram fetch exception:", e)
-        return []
-
-
-def _fetch_instagram_profile(access_token):
-    """Fetch simple profile info (username) for the configured Instagram account."""
-    if not access_token:
-        return None
-
-    # Use cached profile when fresh
-    ttl = getattr(settings, "INSTAGRAM_FEED_TTL", 300)
-    now = time.time()
-    if _INSTAGRAM_CACHE.get("profile") and (now - _INSTAGRAM_CACHE["ts"] < ttl):
-        return _INSTAGRAM_CACHE.get("profile")
-
-    url = f"https://graph.instagram.com/me?fields=id,username&access_token={access_token}"
-    try:
-        with urllib.request.urlopen(url, timeout=6) as resp:
-            body = resp.read()
-            data = json.loads(body.decode("utf-8"))
-            profile = {"id": data.get("id"), "username": data.get("username")}
-            _INSTAGRAM_CACHE["profile"] = profile
-            return profile
-    except Exception as e:
-        print("Instagram profile fetch error:", e)
-        return None
-
-
-def index(request):
-    """Home page: show featured article and a carousel of articles."""
-    articulos = Articulo.objects.all()
-    articulo = articulos.first()
-
-    # Attempt to load Instagram posts server-side if configured
     access_token = getattr(settings, "INSTAGRAM_ACCESS_TOKEN", None)
-    instagram_posts = _fetch_instagram_posts(access_token, limit=6) if access_token else []
-    instagram_profile = _fetch_instagram_profile(access_token) if access_token else None
+    deadline = getattr(settings, "HOME_DEADLINE", 1.5)
+
+    (instagram_posts, instagram_ts), (instagram_profile, _), (articulos, showcase_stamp) = await asyncio.gather(
+        instagram.aget_posts(access_token, limit=6, timeout=deadline),
+        instagram.aget_profile(access_token, timeout=deadline),
+        sync_to_async(showcase.get_items)(),
+    )
 
     contexto = {
-        "nombre_articulo": articulo.nombre if articulo else "Artículo",
+        "nombre_articulo": articulos[0].nombre if articulos else "Artículo",
         "articulos": articulos,
-    "instagram_posts": instagram_posts,
-    "instagram_profile": instagram_profile,
+        "instagram_posts": instagram_posts,
+        "instagram_profile": instagram_profile,
+        "showcase_stamp": showcase_stamp,
+        "instagram_ts": instagram_ts,
+        "fragment_ttl": getattr(settings, "FRAGMENT_CACHE_TTL", 3600),
     }
-    return render(request, "index.html", contexto)
-
+    # En un hilo: la caché de fragmentos puede ser de base de datos (no se usa desde el bucle)
+    return await sync_to_async(render)(request, "index.html", contexto)
 
 
 def reservations(request):
-    """Reservation page for massages. Saves reservation to database."""
-    message = None
+    """Reservation page for massages. Saves reservation to database.
+
+    Bookings are atomic: if the slot filled up in the meantime the answer is a 409.
+    Sending an ``Idempotency-Key`` header makes retries and double submissions
+    return the original response instead of booking again.
+    """
     if request.method == "POST":
-        nombre = request.POST.get("name")
+        nombre = request.POST.get("name") or "Cliente"
         fecha = request.POST.get("fecha")
         hora = request.POST.get("hora")
-        servicio = request.POST.get("service")
-        
-        try:
-            Reservation.objects.create(
-                nombre=nombre or "Cliente",
-                fecha=fecha,
-                hora=hora,
-                servicio=servicio or "Masaje relajante"
-            )
-            
+        servicio = request.POST.get("service") or "Masaje relajante"
+
+        def book():
+            try:
+                reservation = booking.book(nombre, fecha, hora, servicio)
+            except booking.BookingError as e:
+                return e.status, {"success": False, "message": f"No se pudo crear la reserva: {e}"}
+
             # Generate Google Calendar link
-            start_dt = datetime.strptime(f"{fecha} {hora}", "%Y-%m-%d %H:%M")
-            end_dt = start_dt + timedelta(hours=1)
+            start_dt = datetime.combine(reservation.fecha, reservation.hora)
+            end_dt = start_dt + timedelta(minutes=reservation.duracion)
             
             start_str = start_dt.strftime("%Y%m%dT%H%M%S")
             end_str = end_dt.strftime("%Y%m%dT%H%M%S")
@@ -168,31 +101,40 @@ def reservations(request):
             
             google_link = f"{base_url}?{urllib.parse.urlencode(params)}"
             
-            return JsonResponse({
+            return 200, {
                 "success": True, 
                 "message": f"Reserva confirmada para {nombre} - {servicio} el {fecha} a las {hora}",
-                "calendarUrl": google_link
-            })
-        except Exception as e:
-            return JsonResponse({"success": False, "message": f"No se pudo crear la reserva: {e}"})
+                "calendarUrl": google_link,
+                "id": reservation.id,
+            }
+
+        try:
+            status, body, replayed = booking.idempotent(
+                request.headers.get("Idempotency-Key"),
+                booking.fingerprint(request.path, nombre, fecha, hora, servicio),
+                book,
+            )
+        except booking.BookingError as e:
+            return JsonResponse({"success": False, "message": str(e)}, status=e.status)
+        response = JsonResponse(body, status=status)
+        if replayed:
+            response["Idempotent-Replayed"] = "true"
+        return response
     
-    return render(request, "reservations.html")
+    return render(request, "reservations.html", {"services": availability.services()})
 
+@conditional_on("reservations")
 def get_reservations(request):
-    """API endpoint to get all reservations for the calendar."""
-    reservations = Reservation.objects.all().values('fecha', 'hora')
-    
-    # Group reservations by date
-    reservas_dict = {}
-    for res in reservations:
-        fecha_str = res['fecha'].strftime('%Y-%m-%d')
-        hora_str = res['hora'].strftime('%H:%M')
-        
-        if fecha_str not in reservas_dict:
-            reservas_dict[fecha_str] = []
-        reservas_dict[fecha_str].append(hora_str)
-    
-    return JsonResponse(reservas_dict)
+    """API endpoint for the calendar: booked hours per day within a date window.
+
+    ``?month=2025-03`` or ``?from=2025-03-01&to=2025-03-31`` (inclusive); the current
+    month by default. Returns ``{"2025-03-04": ["10:00", "12:00"], ...}``.
+    """
+    try:
+        date_from, date_to = reservations_utils.parse_window(request.GET)
+    except reservations_utils.WindowError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(reservations_utils.booked_by_day(date_from, date_to))
 
 
 
@@ -212,66 +154,325 @@ def contact(request):
 
 
 
+def _herbalife_status(product):
+    """Return ``(status, url)`` for the product's Herbalife page, never blocking on Herbalife.
+
+    The outcome of the last lookup is reused while fresh (see home/utils/herbalife.py).
+    Otherwise a background lookup is enqueued (once: the job key dedupes concurrent
+    visits) and the status is "pending" until a worker records the result. A known
+    URL is served straight away even when it is due for re-verification.
+    """
+    if herbalife.is_due(product):
+        jobs.enqueue(tasks.lookup_herbalife, key=tasks.herbalife_lookup_key(product.id), articulo_id=product.id)
+        if not product.herbalife_url:
+            return "pending", None
+    if product.herbalife_url:
+        return "found", product.herbalife_url
+    if product.herbalife_status == Articulo.HERBALIFE_ERROR:
+        return "error", None
+    return "not_found", None
+
+
 def product_detail(request, product_id):
     """
     View to handle product details. Redirects to Herbalife if the product exists there.
+
+    The Herbalife lookup runs in the job queue; until it finishes the product page
+    is shown and polls ``herbalife_status`` to redirect once the answer arrives.
     """
     product = get_object_or_404(Articulo, id=product_id)
 
-    # Check if the product exists on Herbalife
-    if not product.herbalife_url:
-        product.herbalife_url = scrape_herbalife_product(product.nombre)
-        product.save()
+    status, url = _herbalife_status(product)
+    if status == "found":
+        return redirect(url)
+    if status == "not_found":
+        return HttpResponse("<h1>Oops, este Herbalife no vende este producto...</h1>")
+    if status == "error":
+        return HttpResponse("<h1>Ahora mismo no podemos comprobar este producto en Herbalife, inténtalo más tarde.</h1>", status=503)
+    return render(request, "product_detail.html", {
+        "product": product,
+        "status_url": reverse("herbalife_status", args=[product.id]),
+    })
 
-    if product.herbalife_url:
-        return redirect(product.herbalife_url)
+
+def herbalife_status(request, product_id):
+    """JSON polling endpoint for the background Herbalife lookup of a product."""
+    product = get_object_or_404(Articulo, id=product_id)
+    status, url = _herbalife_status(product)
+    response = JsonResponse({"status": status, "herbalife_url": url})
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+def health(request):
+    """Health report for monitoring: state of the circuit breakers to external services.
+
+    Always 200 (the site itself is up); ``status`` is "degraded" while any circuit
+    is open or half-open.
+    """
+    breakers = {name: b.snapshot() for name, b in sorted(resilience.breakers().items())}
+    degraded = any(b["state"] != resilience.CLOSED for b in breakers.values())
+    response = JsonResponse({"status": "degraded" if degraded else "ok", "circuit_breakers": breakers})
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+# Orden admitido por products_api (?sort=...). El id final desempata y hace el orden total,
+# que es lo que permite paginar por clave; los índices (campo, id) de Articulo cubren cada caso.
+PRODUCT_SORTS = {
+    "id": ("id",),
+    "price": ("price", "id"),
+    "-price": ("-price", "-id"),
+    "nombre": ("nombre", "id"),
+}
+# Tope de ?per_page=: cada página se serializa y se guarda entera en la caché del catálogo.
+MAX_PER_PAGE = 100
+
+
+def _encode_cursor(last, sort="id"):
+    """Opaque keyset cursor for products_api.
+
+    For the default id order it is the urlsafe base64 of the last seen id; for other
+    sorts it also carries the sort name and the last sort key: ``[sort, key, id]``.
+    """
+    if sort == "id":
+        raw = str(last.id)
     else:
-        return HttpResponse("<h1>Oops, este Herbalife no vende este producto...</h1>")
+        raw = json.dumps([sort, str(_sort_key(last, sort)), last.id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token, sort="id"):
+    """Inverse of _encode_cursor: returns ``(key, last_id)``. Raises ValueError on malformed tokens."""
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        if sort == "id":
+            key, last_id = None, int(raw)
+        else:
+            cursor_sort, key, last_id = json.loads(raw)
+            if cursor_sort != sort or not isinstance(last_id, int):
+                raise ValueError(f"cursor is not for sort={sort!r}")
+            if sort in ("price", "-price"):
+                key = Decimal(key)
+    except (binascii.Error, UnicodeError, json.JSONDecodeError, InvalidOperation, TypeError) as e:
+        raise ValueError(f"invalid cursor: {token!r}") from e
+    if last_id < 0:
+        raise ValueError(f"invalid cursor: {token!r}")
+    return key, last_id
+
+
+def _sort_key(row, sort):
+    return getattr(row, PRODUCT_SORTS[sort][0].lstrip("-"))
+
+
+def _seek(sort, key, last_id):
+    """Rows strictly after ``(key, last_id)`` in ``PRODUCT_SORTS[sort]`` order."""
+    if sort == "id":
+        return Q(id__gt=last_id)
+    # "key >= k AND (key > k OR id > last)": equivalent to the row comparison, but the
+    # leading "key >= k" is what lets the planner turn it into an index range scan.
+    field = PRODUCT_SORTS[sort][0]
+    if field.startswith("-"):
+        field = field[1:]
+        return Q(**{f"{field}__lte": key}) & (Q(**{f"{field}__lt": key}) | Q(id__lt=last_id))
+    return Q(**{f"{field}__gte": key}) & (Q(**{f"{field}__gt": key}) | Q(id__gt=last_id))
+
+
+def _keyset_page(qs, after, per_page, sort="id"):
+    """Seek instead of OFFSET: ``WHERE (key, id) > after ORDER BY key, id LIMIT per_page + 1``.
+
+    ``after`` is a ``(key, last_id)`` pair from _decode_cursor, or None for the first page.
+    The extra row tells us whether there is a next page without a COUNT(*) query.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if after and after[1]:
+        qs = qs.filter(_seek(sort, *after))
+    rows = list(qs.order_by(*PRODUCT_SORTS[sort])[:per_page + 1])
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        return rows, _encode_cursor(rows[-1], sort)
+    return rows, None
+
+
+NO_FILTERS = (None, None, None, None)
 
 
 def catalog(request):
     """Catalog page: initial page render includes first page of products. Infinite scroll uses products_api."""
-    qs = Articulo.objects.all().order_by('id')
-    paginator = Paginator(qs, 12)
-    page1 = paginator.get_page(1)
-    contexto = {"products": page1, "has_next": page1.has_next(), "next_page": 2}
+    # Misma clave de caché que la primera página de products_api en modo cursor.
+    # Perezoso: si el fragmento del grid está en caché ni siquiera se consulta.
+    page = SimpleLazyObject(lambda: catalog_cache.get_or_build(
+        ("cursor", None, 12, "", NO_FILTERS), lambda: _products_cursor_payload("", NO_FILTERS, None, 12)
+    )[0])
+    contexto = {
+        "page": page,
+        "next_page": 2,
+        "catalog_version": catalog_cache.get_version(),
+        "fragment_ttl": getattr(settings, "FRAGMENT_CACHE_TTL", 3600),
+    }
     return render(request, "catalog.html", contexto)
 
 
-def products_api(request):
-    """API endpoint returning JSON list of products for infinite scroll, supports search."""
-    page = int(request.GET.get('page', '1'))
-    per_page = int(request.GET.get('per_page', '12'))
-    search = request.GET.get('search', '').strip()  # Tomamos la búsqueda
+def _parse_price(value):
+    if value in (None, ""):
+        return None
+    price = Decimal(value)
+    if not price.is_finite():
+        raise InvalidOperation(value)
+    return price
+
+
+def _parse_int(params, name, default, low, high=None):
+    """``params[name]`` as an int clamped to ``low..high``; ValueError if it isn't an integer."""
+    try:
+        value = int(params.get(name) or default)
+    except ValueError:
+        raise ValueError(f"{name} debe ser un número entero")
+    value = max(low, value)
+    return min(high, value) if high is not None else value
+
+
+def _parse_product_filters(params):
+    """Validated ``(min_price, max_price, herbalife, sort)`` from the query string.
 
-    # Filtrado: si hay texto en search, filtramos por nombre que contenga la cadena (case-insensitive)
+    Raises ValueError with a message suitable for the client.
+    """
+    try:
+        min_price = _parse_price(params.get('min_price'))
+        max_price = _parse_price(params.get('max_price'))
+    except InvalidOperation:
+        raise ValueError("Precio inválido")
+
+    herbalife = params.get('herbalife', '')
+    if herbalife not in ('', '0', '1'):
+        raise ValueError("herbalife debe ser 0 o 1")
+
+    sort = params.get('sort') or None
+    if sort is not None and sort not in PRODUCT_SORTS:
+        raise ValueError(f"sort debe ser uno de: {', '.join(PRODUCT_SORTS)}")
+    return (min_price, max_price, herbalife or None, sort)
+
+
+def _products_queryset(search, filters=NO_FILTERS):
+    min_price, max_price, herbalife, sort = filters
+    qs = Articulo.objects.all()
+    # Filtrado: si hay texto en search, usamos el índice de texto completo (nombre + descripción)
+    # y, salvo que se pida otro orden, ordenamos por relevancia.
     if search:
-        qs = Articulo.objects.filter(nombre__icontains=search).order_by('id')
-    else:
-        qs = Articulo.objects.all().order_by('id')
+        qs = search_articulos(qs, search)
+    if min_price is not None:
+        qs = qs.filter(price__gte=min_price)
+    if max_price is not None:
+        qs = qs.filter(price__lte=max_price)
+    if herbalife == '1':
+        # "> ''" excluye NULL y cadena vacía en un solo predicado, el mismo que usa el índice parcial.
+        qs = qs.filter(herbalife_url__gt="")
+    elif herbalife == '0':
+        qs = qs.filter(Q(herbalife_url__isnull=True) | Q(herbalife_url=""))
+
+    if sort:
+        return qs.order_by(*PRODUCT_SORTS[sort])
+    if search:
+        return qs.order_by('-search_rank', 'id')
+    return qs.order_by('id')
+
+
+def _products_cursor_payload(search, filters, after, per_page):
+    # El modo cursor pagina por clave, así que sin sort explícito el orden es por id.
+    sort = filters[3] or "id"
+    rows, next_cursor = _keyset_page(_products_queryset(search, filters), after, per_page, sort)
+    return {
+        "products": [_serialize_product(p) for p in rows],
+        "has_next": next_cursor is not None,
+        "next_cursor": next_cursor,
+    }
+
 
-    paginator = Paginator(qs, per_page)
+def _products_page_payload(search, filters, page, per_page):
+    paginator = Paginator(_products_queryset(search, filters), per_page)
     try:
         pg = paginator.get_page(page)
     except EmptyPage:
-        return JsonResponse({"products": [], "has_next": False})
-
-    products = []
-    for p in pg:
-        products.append({
-            "id": p.id,
-            "nombre": p.nombre,
-            "descripcion": p.descripcion,
-            "price": str(p.price),
-            "image_url": p.image_url or "",
-            "detail_url": reverse('product_detail', args=[p.id]),
-        })
-
-    return JsonResponse({
-        "products": products,
+        return {"products": [], "has_next": False}
+
+    return {
+        "products": [_serialize_product(p) for p in pg],
         "has_next": pg.has_next(),
         "next_page": pg.next_page_number() if pg.has_next() else None
-    })
+    }
+
+
+@conditional_on("catalog")
+def products_api(request):
+    """API endpoint returning JSON list of products for infinite scroll, supports search.
+
+    Two pagination modes:
+    - ``?page=N`` (default): classic Paginator, returns ``next_page``.
+    - ``?cursor=<token>`` or ``?after_id=<id>``: keyset pagination on the sort key,
+      no COUNT(*) and constant cost regardless of depth, returns ``next_cursor``.
+      An empty ``cursor=`` starts from the beginning.
+
+    Filters and sorting: ``min_price``, ``max_price``, ``herbalife=1|0`` (has a
+    Herbalife URL or not) and ``sort=price|-price|nombre`` (default: relevance when
+    searching, id otherwise). Index-backed shapes are listed in ``Articulo.Meta``;
+    a price range is only fast with ``sort=price|-price``.
+
+    ``per_page`` (default 12) is clamped to 1..``MAX_PER_PAGE`` and ``page`` to 1
+    or more; a non-integer value in either is a 400.
+
+    Serialized pages are cached per catalog version (see utils/catalog_cache.py);
+    the ``X-Cache`` header says whether this response was a HIT or a MISS.
+    """
+    search = request.GET.get('search', '').strip()  # Tomamos la búsqueda
+    try:
+        per_page = _parse_int(request.GET, 'per_page', 12, 1, MAX_PER_PAGE)
+        page = _parse_int(request.GET, 'page', 1, 1)
+        filters = _parse_product_filters(request.GET)
+    except ValueError as e:
+        return JsonResponse({"products": [], "has_next": False, "error": str(e)}, status=400)
+
+    if 'cursor' in request.GET or 'after_id' in request.GET:
+        sort = filters[3] or "id"
+        try:
+            cursor = request.GET.get('cursor', '').strip()
+            if cursor:
+                after = _decode_cursor(cursor, sort)
+            elif request.GET.get('after_id'):
+                if sort != "id":
+                    raise ValueError("after_id solo admite el orden por id")
+                after = (None, int(request.GET['after_id']))
+            else:
+                after = None
+        except ValueError:
+            return JsonResponse({"products": [], "has_next": False, "error": "Cursor inválido"}, status=400)
+
+        payload, hit = catalog_cache.get_or_build(
+            ("cursor", after, per_page, search, filters),
+            lambda: _products_cursor_payload(search, filters, after, per_page),
+        )
+    else:
+        payload, hit = catalog_cache.get_or_build(
+            ("page", page, per_page, search, filters),
+            lambda: _products_page_payload(search, filters, page, per_page),
+        )
+
+    response = JsonResponse(payload)
+    response["X-Cache"] = "HIT" if hit else "MISS"
+    return response
+
+
+def _serialize_product(p):
+    return {
+        "id": p.id,
+        "nombre": p.nombre,
+        "descripcion": p.descripcion,
+        "price": str(p.price),
+        "image_url": p.image_src,
+        "srcset": p.image_srcset,
+        "srcset_webp": p.image_srcset_webp,
+        "detail_url": reverse('product_detail', args=[p.id]),
+    }
 
 
 def reservar(request):
@@ -282,11 +483,147 @@ def crear_reserva(request):
         nombre = request.POST["name"]
         fecha = request.POST["fecha"]
         hora = request.POST["hora"]
-        Reservation.objects.create(nombre=nombre, fecha=fecha, hora=hora)
-        return render(request, "reservations.html", {"message": "¡Reserva creada con éxito!"})
+        context = {"services": availability.services()}
+        try:
+            booking.book(nombre, fecha, hora, request.POST.get("service") or "Masaje relajante")
+        except booking.BookingError as e:
+            context["message"] = f"No se pudo crear la reserva: {e}"
+            return render(request, "reservations.html", context, status=e.status)
+        context["message"] = "¡Reserva creada con éxito!"
+        return render(request, "reservations.html", context)
     return redirect("reservar")
 
+@conditional_on("reservations", clock=availability.offer_changed_at)
 def available_slots(request):
+    """Start times for a service with the free places left at each one.
+
+    ``?date=2025-03-04`` for one day (also lists its ``booked`` hours, as before) or
+    the calendar window of ``get_reservations`` (``month``, ``from``/``to``), plus
+    ``&service=Masaje relajante``. Closed and past days have no slots, so the
+    ETag also changes as each start time of today is reached.
+    """
     date = request.GET.get("date")
-    booked = list(Reservation.objects.filter(fecha=date).values_list("hora", flat=True))
-    return JsonResponse({"booked": booked})
\ No newline at end of file
+    try:
+        if date:
+            date_from = date_to = datetime.strptime(date, "%Y-%m-%d").date()
+        else:
+            date_from, date_to = reservations_utils.parse_window(request.GET)
+    except (ValueError, reservations_utils.WindowError) as e:
+        message = str(e) if isinstance(e, reservations_utils.WindowError) else "Fecha inválida, usa AAAA-MM-DD"
+        return JsonResponse({"error": message}, status=400)
+
+    servicio = request.GET.get("service")
+    data = {
+        "service": servicio,
+        "duration": availability.service_duration(servicio),
+        "capacity": availability.capacity(),
+        "days": availability.free_slots(date_from, date_to, servicio),
+    }
+    if date:
+        data["booked"] = list(Reservation.objects.filter(fecha=date_from).values_list("hora", flat=True))
+    return JsonResponse(data)
+
+
+async def slot_events(request):
+    """Server-sent events with the slots taken and freed in the given months.
+
+    ``/reservas/events/?month=2025-03&month=2025-04`` (no ``month``: every date).
+    Replaces polling ``available_slots``: each ``slot_taken``/``slot_freed`` event
+    carries ``fecha``, ``hora`` and ``duracion`` and the page reloads that month.
+    Needs the ASGI server: a WSGI worker would be held by the stream forever.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse("Eventos en directo solo disponibles con el servidor ASGI", status=501)
+    months = request.GET.getlist("month")
+    try:
+        for month in months:
+            datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        return JsonResponse({"error": "Mes inválido, usa AAAA-MM"}, status=400)
+
+    live.get_backend()  # arranca el listener entre procesos la primera vez
+    subscription = live.hub.subscribe(months)
+    heartbeat = getattr(settings, "LIVE_HEARTBEAT", 15)
+
+    async def stream():
+        try:
+            yield f"retry: {heartbeat * 1000}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ": ping\n\n"
+                    continue
+                if event is None:
+                    return
+                yield live.format_event(event)
+        finally:
+            live.hub.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date() if value else None
+
+
+def reservations_feed(request, token):
+    """Staff calendar subscription (``/calendar/<token>.ics``) with the reservations.
+
+    Built from per-month cached blocks and streamed; ``If-None-Match`` with the
+    current ETag gets a 304 without touching the reservations table.
+    """
+    feed = CalendarFeed.objects.filter(token=token, user__is_active=True, user__is_staff=True).first()
+    if feed is None:
+        raise Http404("Calendario no encontrado")
+    months = calendar_feed.feed_months()
+    etag = calendar_feed.etag(months)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = StreamingHttpResponse(
+            calendar_feed.feed_lines(months), content_type=exports.CONTENT_TYPES["ics"]
+        )
+        response["Content-Disposition"] = 'inline; filename="reservas.ics"'
+    response["ETag"] = etag
+    # La URL lleva un secreto: que no la guarden cachés compartidas
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@staff_member_required
+def export_data(request, kind, fmt):
+    """Staff-only streaming download of the catalog or the reservations.
+
+    ``/exports/articulos.csv?search=aloe``, ``/exports/reservations.ics?from=2025-01-01&to=2025-12-31``.
+    The body is gzip-compressed on the fly when the client accepts it.
+    """
+    if kind not in exports.FORMATS or fmt not in exports.FORMATS[kind]:
+        raise Http404("Formato de exportación no disponible")
+    try:
+        date_from = _parse_date(request.GET.get("from"))
+        date_to = _parse_date(request.GET.get("to"))
+    except ValueError:
+        return JsonResponse({"success": False, "message": "Fechas inválidas, usa AAAA-MM-DD"}, status=400)
+
+    lines = exports.export_lines(
+        kind, fmt,
+        search=request.GET.get("search", "").strip(),
+        date_from=date_from,
+        date_to=date_to,
+    )
+    chunks = exports.encoded_chunks(lines)
+    gzip_ok = "gzip" in request.headers.get("Accept-Encoding", "")
+    if gzip_ok:
+        chunks = exports.gzip_chunks(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=exports.CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{kind}.{fmt}"'
+    if gzip_ok:
+        response["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
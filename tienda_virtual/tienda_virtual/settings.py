@@ -55,7 +55,8 @@ COMPANY_EMAIL = os.environ.get("COMPANY_EMAIL", "owner@example.com")
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     # 💡 MODIFICACIÓN: Añadir WhiteNoise justo después de SecurityMiddleware
-    "whitenoise.middleware.WhiteNoiseMiddleware", 
+    # WhiteNoise + almacenes de contenido direccionado por hash (miniaturas de imágenes)
+    "home.middleware.ContentAddressedWhiteNoiseMiddleware", 
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -89,13 +90,89 @@ WSGI_APPLICATION = "tienda_virtual.tienda_virtual.wsgi.application"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 # 💡 MODIFICACIÓN: Configuración dinámica para PostgreSQL en producción (DATABASE_URL de Render)
+# Conexiones persistentes desactivadas por defecto: con el servidor ASGI (Procfile, dockerfile) las vistas
+# síncronas corren en hilos que no se reutilizan entre peticiones, y cada conexión persistente se
+# quedaría abierta en su hilo hasta agotar las de PostgreSQL. El worker (run_worker) es un proceso
+# síncrono normal y puede reutilizarlas con DB_CONN_MAX_AGE=600.
 DATABASES = {
     "default": dj_database_url.config(
         default="sqlite:///db.sqlite3", # Fallback para desarrollo local
-        conn_max_age=600 # Para mantener la conexión viva
+        conn_max_age=int(os.environ.get("DB_CONN_MAX_AGE", "0")),
     )
 }
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    # Tests con SQLite en un fichero: en la BD en memoria compartida las escrituras concurrentes
+    # fallan con "table is locked" en vez de esperar, y hay tests de reservas simultáneas.
+    DATABASES["default"]["TEST"] = {"NAME": BASE_DIR / "test_db.sqlite3"}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# 💡 Los contadores de versión (home/utils/versioning.py) viven en esta caché y los incrementan
+# también el worker y los comandos (import_catalog, build_image_derivatives, ...): tiene que ser
+# compartida por todos los procesos. LocMemCache (una por proceso) solo sirve en desarrollo; en
+# producción por defecto se usa la tabla de caché de la BD ("python manage.py createcachetable").
+# Para otra caché compartida basta con definir CACHE_BACKEND/CACHE_LOCATION, p.ej.
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://host:6379/1
+#   CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache CACHE_LOCATION=/var/tmp/natursur_cache
+#     (solo si todos los procesos comparten disco)
+if os.environ.get("CACHE_BACKEND"):
+    DEFAULT_CACHE = {
+        "BACKEND": os.environ["CACHE_BACKEND"],
+        "LOCATION": os.environ.get("CACHE_LOCATION", "natursur"),
+    }
+elif DEBUG:
+    DEFAULT_CACHE = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "natursur"}
+else:
+    DEFAULT_CACHE = {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": os.environ.get("CACHE_LOCATION", "natursur_cache"),
+        # Con el límite por defecto (300 entradas) las páginas cacheadas desalojarían a los contadores
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", "20000"))},
+    }
+CACHES = {"default": DEFAULT_CACHE}
+# Una caché por proceso solo vale con un único proceso (runserver, tests); fuera de eso los
+# contadores de versión no se ven entre procesos (ver home/utils/versioning.py y el check home.W001)
+CACHE_LOCAL_ALLOWED = DEBUG
+
+# Caché de fragmentos de plantilla ({% cache ... using="fragments" %}). Para depurar
+# plantillas, FRAGMENT_CACHE=0 la sustituye por DummyCache (nunca guarda nada).
+FRAGMENT_CACHE_ENABLED = os.environ.get("FRAGMENT_CACHE", "1") == "1"
+FRAGMENT_CACHE_TTL = int(os.environ.get("FRAGMENT_CACHE_TTL", "3600"))
+CACHES["fragments"] = (
+    dict(CACHES["default"], KEY_PREFIX="fragments")
+    if FRAGMENT_CACHE_ENABLED
+    else {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+)
 
+# Cache of serialized catalog pages (home/utils/catalog_cache.py). 0 disables it.
+CATALOG_CACHE_ALIAS = "default"
+CATALOG_CACHE_TTL = int(os.environ.get("CATALOG_CACHE_TTL", "3600"))
+# Escaparate de la portada: productos como máximo y segundos en caché (home/utils/showcase.py)
+SHOWCASE_SIZE = int(os.environ.get("SHOWCASE_SIZE", "8"))
+SHOWCASE_CACHE_TTL = int(os.environ.get("SHOWCASE_CACHE_TTL", "3600"))
+
+# Cola de trabajos en segundo plano (home/utils/jobs.py, manage.py run_worker).
+# Un trabajo sin terminar tras JOBS_VISIBILITY_TIMEOUT segundos se da por abandonado y se reintenta.
+JOBS_VISIBILITY_TIMEOUT = int(os.environ.get("JOBS_VISIBILITY_TIMEOUT", "300"))
+JOBS_RETRY_BASE_DELAY = int(os.environ.get("JOBS_RETRY_BASE_DELAY", "5"))
+
+# Vigencia de cada resultado de búsqueda en Herbalife (home/utils/herbalife.py), en segundos.
+# Los errores se reintentan tras HERBALIFE_ERROR_TTL, duplicándolo en cada fallo seguido.
+HERBALIFE_FOUND_TTL = int(os.environ.get("HERBALIFE_FOUND_TTL", str(30 * 86400)))
+HERBALIFE_NOT_FOUND_TTL = int(os.environ.get("HERBALIFE_NOT_FOUND_TTL", str(7 * 86400)))
+HERBALIFE_ERROR_TTL = int(os.environ.get("HERBALIFE_ERROR_TTL", "300"))
+HERBALIFE_ERROR_MAX_TTL = int(os.environ.get("HERBALIFE_ERROR_MAX_TTL", "86400"))
+
+# Circuit breakers de servicios externos (home/utils/resilience.py): tras `threshold` fallos
+# seguidos se deja de llamar durante `cooldown` segundos. Estado visible en /health/.
+CIRCUIT_BREAKERS = {
+    "herbalife": {
+        "threshold": int(os.environ.get("HERBALIFE_BREAKER_THRESHOLD", "5")),
+        "cooldown": int(os.environ.get("HERBALIFE_BREAKER_COOLDOWN", "60")),
+    },
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -137,6 +214,18 @@ STATIC_URL = "static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# Miniaturas responsive de Articulo.image_url (home/utils/images.py). Se sirven con
+# WhiteNoise desde IMAGE_DERIVATIVES_ROOT; los nombres son hashes, así que se cachean "para siempre".
+IMAGE_DERIVATIVES_ROOT = Path(os.environ.get("IMAGE_DERIVATIVES_ROOT", BASE_DIR / "media" / "img"))
+IMAGE_DERIVATIVES_URL = "/media/img/"
+# Copias locales (WebP) de las imágenes del feed de Instagram: las URLs de su CDN caducan.
+INSTAGRAM_MEDIA_ROOT = Path(os.environ.get("INSTAGRAM_MEDIA_ROOT", BASE_DIR / "media" / "instagram"))
+INSTAGRAM_MEDIA_URL = "/media/instagram/"
+CONTENT_ADDRESSED_STORES = {
+    IMAGE_DERIVATIVES_URL: IMAGE_DERIVATIVES_ROOT,
+    INSTAGRAM_MEDIA_URL: INSTAGRAM_MEDIA_ROOT,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -146,4 +235,56 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Set INSTAGRAM_ACCESS_TOKEN to a valid Instagram Basic Display access token.
 INSTAGRAM_ACCESS_TOKEN = os.environ.get("INSTAGRAM_ACCESS_TOKEN")
 # How long to cache Instagram feed (seconds)
-INSTAGRAM_FEED_TTL = int(os.environ.get("INSTAGRAM_FEED_TTL", "300"))
\ No newline at end of file
+INSTAGRAM_FEED_TTL = int(os.environ.get("INSTAGRAM_FEED_TTL", "300"))
+# El perfil cambia mucho menos que las publicaciones: caché propia (home/utils/instagram.py)
+INSTAGRAM_PROFILE_TTL = int(os.environ.get("INSTAGRAM_PROFILE_TTL", "86400"))
+# Pasado el TTL se sigue sirviendo la copia caducada (mientras se refresca en segundo plano) hasta este límite
+INSTAGRAM_STALE_TTL = int(os.environ.get("INSTAGRAM_STALE_TTL", "86400"))
+# Espera antes de reintentar un refresco fallido
+INSTAGRAM_RETRY_AFTER = int(os.environ.get("INSTAGRAM_RETRY_AFTER", "30"))
+# Tiempo máximo total (segundos) para traer el feed, incluidos los hijos de los carruseles
+INSTAGRAM_FETCH_BUDGET = float(os.environ.get("INSTAGRAM_FETCH_BUDGET", "8"))
+INSTAGRAM_GRAPH_URL = os.environ.get("INSTAGRAM_GRAPH_URL", "https://graph.instagram.com")
+# Máximo (segundos) que la portada espera por Instagram con la caché vacía; después sale sin el feed
+HOME_DEADLINE = float(os.environ.get("HOME_DEADLINE", "1.5"))
+# Descargar las imágenes de cada post nuevo a INSTAGRAM_MEDIA_ROOT en vez de enlazar el CDN.
+INSTAGRAM_MEDIA_MIRROR = os.environ.get("INSTAGRAM_MEDIA_MIRROR", "1") == "1"
+# Segundos que se conserva una imagen que ya no sale en el feed (páginas cacheadas, navegadores).
+INSTAGRAM_MEDIA_GRACE = int(os.environ.get("INSTAGRAM_MEDIA_GRACE", str(7 * 86400)))
+# Segundos sin volver a descargar una imagen que no se pudo copiar (URL rota, formato no soportado).
+INSTAGRAM_MEDIA_RETRY_AFTER = int(os.environ.get("INSTAGRAM_MEDIA_RETRY_AFTER", "86400"))
+# Reservas: horario, servicios y capacidad (home/utils/availability.py)
+RESERVATION_TIME_ZONE = "Europe/Madrid"
+# 0 = lunes ... 6 = domingo; los días sin entrada están cerrados
+RESERVATION_OPENING_HOURS = {day: [("09:00", "18:00")] for day in range(5)}
+# Días cerrados ("AAAA-MM-DD")
+RESERVATION_HOLIDAYS = []
+# Servicio -> duración en minutos
+RESERVATION_SERVICES = {
+    "Masaje relajante": 60,
+    "Masaje deportivo": 60,
+    "Masaje terapéutico": 60,
+}
+RESERVATION_DEFAULT_DURATION = 60
+# Minutos entre las horas de inicio que se ofrecen
+RESERVATION_SLOT_STEP = int(os.environ.get("RESERVATION_SLOT_STEP", "60"))
+# Reservas simultáneas posibles (terapeutas)
+RESERVATION_CAPACITY = int(os.environ.get("RESERVATION_CAPACITY", "1"))
+# Segundos durante los que una petición de reserva con Idempotency-Key devuelve la respuesta original
+BOOKING_IDEMPOTENCY_TTL = int(os.environ.get("BOOKING_IDEMPOTENCY_TTL", "86400"))
+
+# Suscripción de calendario (ICS) del personal: meses incluidos antes y después del actual
+CALENDAR_FEED_PAST_MONTHS = int(os.environ.get("CALENDAR_FEED_PAST_MONTHS", "2"))
+CALENDAR_FEED_FUTURE_MONTHS = int(os.environ.get("CALENDAR_FEED_FUTURE_MONTHS", "12"))
+# Cada cuánto se sugiere a los clientes de calendario que vuelvan a consultar (segundos)
+CALENDAR_FEED_REFRESH = int(os.environ.get("CALENDAR_FEED_REFRESH", "900"))
+
+# Huecos en directo (SSE, /reservas/events/). Con varios procesos usar
+# "home.utils.live.PostgresBackend" (LISTEN/NOTIFY); el de memoria solo avisa al propio proceso
+LIVE_SLOTS_BACKEND = os.environ.get(
+    "LIVE_SLOTS_BACKEND",
+    "home.utils.live.PostgresBackend" if DATABASES["default"]["ENGINE"].endswith("postgresql") else "home.utils.live.MemoryBackend",
+)
+# Segundos entre latidos de una conexión sin eventos, y eventos pendientes antes de cortar a un cliente lento
+LIVE_HEARTBEAT = int(os.environ.get("LIVE_HEARTBEAT", "15"))
+LIVE_QUEUE_SIZE = int(os.environ.get("LIVE_QUEUE_SIZE", "64"))
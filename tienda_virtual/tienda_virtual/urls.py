@@ -13,13 +13,18 @@ urlpatterns = [
     path("", views.index, name="home"),
     path("catalog/", views.catalog, name="catalog"),
     path("product/<int:product_id>/", views.product_detail, name="product_detail"),
+    path("api/products/<int:product_id>/herbalife/", views.herbalife_status, name="herbalife_status"),
     path("api/products/", views.products_api, name="products_api"),
     path("contact/", views.contact, name="contact"),
     path("reservations/", views.reservations, name="reservations"),
     path("reservar/", views.reservar, name="reservar"),
     path("reservas/crear/", views.crear_reserva, name="crear_reserva"),
     path("reservas/available_slots/", views.available_slots, name="available_slots"),
+    path("reservas/events/", views.slot_events, name="slot_events"),
     path("admin/", admin.site.urls),
     path("api/reservations/", views.get_reservations, name="get_reservations"),
+    path("exports/<slug:kind>.<slug:fmt>", views.export_data, name="export_data"),
+    path("calendar/<str:token>.ics", views.reservations_feed, name="reservations_feed"),
+    path("health/", views.health, name="health"),
 
 ]